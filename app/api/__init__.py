@@ -1,5 +1,6 @@
 from sanic import Blueprint
 from .content import content
 from .info import info
+from .metrics import metrics
 
-api = Blueprint.group(content, info, url_prefix="/api")
\ No newline at end of file
+api = Blueprint.group(content, info, metrics, url_prefix="/api")
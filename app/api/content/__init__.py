@@ -2,4 +2,4 @@ from sanic import Blueprint
 from .static import static
 from .authors import authors
 
-content = Blueprint.group(static, authors, url_prefix="/content")
\ No newline at end of file
+content = Blueprint.group(static, authors, url_prefix="/content")
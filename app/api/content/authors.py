@@ -1,3 +1,133 @@
-from sanic import Blueprint
+import asyncio
+import base64
+import binascii
+import json as jsonlib
+
+from sanic import Blueprint, Request, HTTPResponse
+from sanic.exceptions import BadRequest, NotFound
+from sanic.response import json
+
+from .storage import AuthorStore, SQLitePool
 
 authors = Blueprint("content_authors", url_prefix="/authors")
+
+MAX_PAGE_SIZE = 1000
+MAX_BATCH = 5000
+
+
+def encode_cursor(key: list) -> str:
+    return base64.urlsafe_b64encode(jsonlib.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        key = jsonlib.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise BadRequest("Invalid cursor")
+    if not isinstance(key, list):
+        raise BadRequest("Invalid cursor")
+    return key
+
+
+def _int_arg(request: Request, name: str, default: int, maximum: int) -> int:
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    return min(max(value, 1), maximum)
+
+
+def cursor_of(author, prefix: str | None) -> list:
+    return [author.name_key, author.author_id] if prefix else [author.author_id]
+
+
+@authors.before_server_start
+async def open_author_store(app):
+    config = app.config
+    store = app.ctx.author_store = AuthorStore(
+        SQLitePool(config.get("AUTHORS_DB", "authors.db"), config.get("AUTHORS_POOL_SIZE", 4))
+    )
+    await store.open()
+
+
+@authors.after_server_start
+async def sync_author_store(app):
+    interval = app.config.get("AUTHORS_SYNC_INTERVAL", 1.0)
+
+    async def sync():
+        while True:
+            await asyncio.sleep(interval)
+            await app.ctx.author_store.sync()
+
+    app.add_task(sync(), name="authors-sync")
+
+
+@authors.after_server_stop
+async def close_author_store(app):
+    await app.ctx.author_store.close()
+
+
+@authors.get("/")
+async def list_authors(request: Request) -> HTTPResponse:
+    """键集分页：``?limit=&after=<cursor>``，可选 ``prefix`` 按姓名前缀筛选"""
+    store: AuthorStore = request.app.ctx.author_store
+    limit = _int_arg(request, "limit", 100, MAX_PAGE_SIZE)
+    after = request.args.get("after")
+    prefix = request.args.get("prefix")
+    try:
+        if prefix:
+            key = None
+            if after:
+                name_key, author_id = decode_cursor(after)
+                key = (str(name_key), int(author_id))
+            page = await store.prefix_page(prefix, key, limit + 1)
+        else:
+            page = await store.page(int(decode_cursor(after)[0]) if after else None, limit + 1)
+    except (IndexError, TypeError, ValueError):
+        raise BadRequest("Invalid cursor")
+    has_next = len(page) > limit
+    page = page[:limit]
+    return json({"authors": [a.to_dict() for a in page],
+                 "next": encode_cursor(cursor_of(page[-1], prefix)) if has_next else None})
+
+
+@authors.get("/<author_id:int>")
+async def get_author(request: Request, author_id: int) -> HTTPResponse:
+    (author,) = await request.app.ctx.author_store.get_many([author_id])
+    if author is None:
+        raise NotFound(f"Author {author_id} not found")
+    return json(author.to_dict())
+
+
+@authors.post("/")
+async def create_authors(request: Request) -> HTTPResponse:
+    """创建作者；请求体为单个对象或对象数组（批量，一次一个事务）"""
+    body = request.json
+    items = body if isinstance(body, list) else [body]
+    if not items or len(items) > MAX_BATCH:
+        raise BadRequest(f"Expected 1 to {MAX_BATCH} authors")
+    rows = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("name"), str) or not item["name"].strip():
+            raise BadRequest("Each author needs a non-empty name")
+        rows.append((item["name"].strip(), str(item.get("bio", ""))))
+    created = await request.app.ctx.author_store.create_many(rows)
+    if isinstance(body, list):
+        return json({"authors": [a.to_dict() for a in created]}, status=201)
+    return json(created[0].to_dict(), status=201)
+
+
+@authors.post("/batch")
+async def fetch_authors(request: Request) -> HTTPResponse:
+    """批量获取：``{"ids": [...]}``，按请求顺序返回，找不到的 ID 列在 missing 中"""
+    body = request.json
+    ids = body.get("ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list) or len(ids) > MAX_BATCH:
+        raise BadRequest(f"ids must be a list of at most {MAX_BATCH} integers")
+    try:
+        ids = [int(i) for i in ids]
+    except (TypeError, ValueError):
+        raise BadRequest("ids must be integers")
+    found = await request.app.ctx.author_store.get_many(ids)
+    return json({"authors": [a.to_dict() for a in found if a is not None],
+                 "missing": [i for i, a in zip(ids, found) if a is None]})
@@ -1,3 +1,22 @@
-from sanic import Blueprint
+from sanic import Blueprint, Request, HTTPResponse
+from utils.static import StaticFiles
 
 static = Blueprint("content_static", url_prefix="/static")
+
+
+@static.before_server_start
+async def build_static_index(app):
+    """启动时建立静态文件元数据索引"""
+    config = app.config
+    files = app.ctx.static_files = StaticFiles(
+        config.get("STATIC_ROOT", "./_static"),
+        check_interval=config.get("STATIC_CHECK_INTERVAL", 5.0),
+        cache_bytes=config.get("STATIC_CACHE_BYTES", 16 << 20),
+        cache_file_max=config.get("STATIC_CACHE_FILE_MAX", 256 << 10),
+    )
+    await files.build_index()
+
+
+@static.route("/<path:path>", methods=["GET", "HEAD"])
+async def serve(request: Request, path: str) -> HTTPResponse | None:
+    return await request.app.ctx.static_files.respond(request, path)
@@ -0,0 +1,215 @@
+"""作者数据：内存索引 + SQLite 持久化
+
+读请求只查内存索引（主键、按 ID 排序的键集、按姓名前缀的有序索引），
+写请求先在 SQLite 中提交再更新索引。SQLite 调用通过连接池在线程池中执行；
+WAL 模式下读连接可以并发，写操作串行。作者只增不改，其他 worker 新增的作者
+由 :meth:`AuthorStore.sync` 按 ``author_id`` 增量拉取。
+"""
+import asyncio
+import bisect
+import datetime
+import itertools
+import sqlite3
+from collections.abc import Iterable, Sequence
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+@dataclass(slots=True)
+class Author:
+    author_id: int
+    name: str
+    bio: str
+    created_at: str
+
+    @property
+    def name_key(self) -> str:
+        return self.name.casefold()
+
+    def to_dict(self) -> dict:
+        return {"author_id": self.author_id, "name": self.name,
+                "bio": self.bio, "created_at": self.created_at}
+
+
+class AuthorIndex:
+    def __init__(self):
+        self._by_id: dict[int, Author] = {}
+        self._ids: list[int] = []  # 升序
+        self._names: list[tuple[str, int]] = []  # (name_key, author_id) 升序
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    @property
+    def last_id(self) -> int:
+        return self._ids[-1] if self._ids else 0
+
+    def add_many(self, authors: Iterable[Author]) -> None:
+        for author in authors:
+            old = self._by_id.get(author.author_id)
+            if old is not None:
+                del self._names[bisect.bisect_left(self._names, (old.name_key, old.author_id))]
+            elif not self._ids or author.author_id > self._ids[-1]:
+                self._ids.append(author.author_id)  # 新 ID 递增，通常直接追加
+            else:
+                bisect.insort(self._ids, author.author_id)
+            self._by_id[author.author_id] = author
+            bisect.insort(self._names, (author.name_key, author.author_id))
+
+    def get_many(self, ids: Sequence[int]) -> list[Author | None]:
+        get = self._by_id.get
+        return [get(author_id) for author_id in ids]
+
+    def page(self, after: int | None, limit: int) -> list[Author]:
+        start = 0 if after is None else bisect.bisect_right(self._ids, after)
+        return [self._by_id[i] for i in self._ids[start:start + limit]]
+
+    def prefix_page(self, prefix: str, after: tuple[str, int] | None,
+                    limit: int) -> list[Author]:
+        prefix = prefix.casefold()
+        names = self._names
+        start = bisect.bisect_left(names, (prefix, 0))
+        if after is not None:
+            start = max(start, bisect.bisect_right(names, after))
+        result = []
+        for key, author_id in itertools.islice(names, start, None):
+            if not key.startswith(prefix) or len(result) >= limit:
+                break
+            result.append(self._by_id[author_id])
+        return result
+
+
+class SQLitePool:
+    """固定大小的 SQLite 连接池，连接在线程池中使用"""
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self.size = size
+        self._idle: asyncio.Queue[sqlite3.Connection] = asyncio.Queue()
+        self._connections: list[sqlite3.Connection] = []
+        self._write_lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.path == ":memory:":
+            # 池中各连接需共享同一个内存数据库
+            conn = sqlite3.connect(f"file:authors-{id(self)}?mode=memory&cache=shared",
+                                   uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    async def open(self) -> None:
+        for _ in range(self.size):
+            conn = await asyncio.to_thread(self._connect)
+            self._connections.append(conn)
+            self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def read(self, fn, *args):
+        async with self.connection() as conn:
+            return await asyncio.to_thread(fn, conn, *args)
+
+    async def write(self, fn, *args):
+        # SQLite 同时只允许一个写事务，本进程内先排队，跨进程由 busy_timeout 等待
+        async with self._write_lock:
+            return await self.read(fn, *args)
+
+    async def close(self) -> None:
+        for conn in self._connections:
+            await asyncio.to_thread(conn.close)
+        self._connections.clear()
+
+
+class AuthorStore:
+    COLUMNS = "author_id, name, bio, created_at"
+
+    def __init__(self, pool: SQLitePool):
+        self.pool = pool
+        self.index = AuthorIndex()
+
+    @staticmethod
+    def _schema(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS authors ("
+                "author_id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                "bio TEXT NOT NULL DEFAULT '', created_at TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS authors_name ON authors (name COLLATE NOCASE)")
+
+    def _load(self, conn: sqlite3.Connection, after: int) -> list[Author]:
+        rows = conn.execute(
+            f"SELECT {self.COLUMNS} FROM authors WHERE author_id > ? ORDER BY author_id",
+            (after,),
+        )
+        return [Author(*row) for row in rows]
+
+    async def open(self) -> None:
+        await self.pool.open()
+        await self.pool.write(self._schema)
+        await self.sync()
+
+    async def sync(self) -> int:
+        """拉取其他进程新增的作者，返回新增条数"""
+        authors = await self.pool.read(self._load, self.index.last_id)
+        self.index.add_many(authors)
+        return len(authors)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, items: list[tuple[str, str]]) -> list[Author]:
+        created_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        # IMMEDIATE 事务内分配连续 ID，多个 worker 同时写也不会冲突
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (last,) = conn.execute("SELECT COALESCE(MAX(author_id), 0) FROM authors").fetchone()
+            authors = [Author(last + i, name, bio, created_at)
+                       for i, (name, bio) in enumerate(items, 1)]
+            conn.executemany(
+                "INSERT INTO authors (author_id, name, bio, created_at) VALUES (?, ?, ?, ?)",
+                [(a.author_id, a.name, a.bio, a.created_at) for a in authors],
+            )
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return authors
+
+    async def create_many(self, items: Sequence[tuple[str, str]]) -> list[Author]:
+        authors = await self.pool.write(self._insert, list(items))
+        await self.sync()  # 同时补上其他 worker 在此之前写入的作者
+        return authors
+
+    async def get_many(self, ids: Sequence[int]) -> list[Author | None]:
+        """按 ids 的顺序返回作者，不存在的位置为 None"""
+        found = self.index.get_many(ids)
+        last_id = self.index.last_id
+        # 比已知最大 ID 还大的可能是其他 worker 刚写入的，增量同步一次
+        if any(a is None and i > last_id for i, a in zip(ids, found)) and await self.sync():
+            found = self.index.get_many(ids)
+        return found
+
+    async def page(self, after: int | None, limit: int) -> list[Author]:
+        authors = self.index.page(after, limit)
+        # 翻到末页时先增量同步，避免漏掉其他 worker 刚写入的作者
+        if len(authors) < limit and await self.sync():
+            authors = self.index.page(after, limit)
+        return authors
+
+    async def prefix_page(self, prefix: str, after: tuple[str, int] | None,
+                          limit: int) -> list[Author]:
+        authors = self.index.prefix_page(prefix, after, limit)
+        if len(authors) < limit and await self.sync():
+            authors = self.index.prefix_page(prefix, after, limit)
+        return authors
+
+    async def close(self) -> None:
+        await self.pool.close()
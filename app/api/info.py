@@ -1,8 +1,10 @@
 from sanic.response import html, text, json
 from sanic import Blueprint
+from sanic_book.cache import cached
 
 info = Blueprint("info", url_prefix="/info")
 
 @info.route("/")
+@cached(ttl=60)
 async def bp_root(request):
     return text(info.name)
@@ -0,0 +1,15 @@
+from sanic import Blueprint
+from sanic.response import text
+from sanic_book.clients import render_clients
+from sanic_book.metrics import CONTENT_TYPE, render_metrics
+from sanic_book.offload import render_offload
+from sanic_book.watchdog import render_watchdog
+
+metrics = Blueprint("metrics", url_prefix="/metrics")
+
+
+@metrics.get("/")
+async def export(request):
+    body = (render_metrics(request.app) + render_watchdog(request.app)
+            + render_offload(request.app) + render_clients(request.app))
+    return text(body, content_type=CONTENT_TYPE)
@@ -1,31 +1,126 @@
+import hashlib
+import time
+from collections import OrderedDict
 from functools import wraps
+from typing import Any
 
 import jwt
 from sanic import text
+from sanic_book.admission import client_ip
+from sanic_book.tracing import span
 
 
-def check_token(request):
+class TokenCache:
+    """已验证 token 的有界 TTL 缓存
+
+    键为 token 的摘要，缓存项在 TTL 与 token 自身 ``exp`` 二者中较早者过期，
+    ``nbf`` 未到的 token 不会命中。
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[bytes, tuple[float, float, dict[str, Any]]] = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str, now: float | None = None) -> dict[str, Any] | None:
+        key = self.key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.time() if now is None else now
+        not_before, expires, claims = entry
+        if now >= expires:
+            del self._entries[key]
+            return None
+        if now < not_before:
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def put(self, token: str, claims: dict[str, Any], now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        expires = now + self.ttl
+        if "exp" in claims:
+            expires = min(expires, float(claims["exp"]))
+        not_before = float(claims.get("nbf", 0))
+        key = self.key(token)
+        self._entries[key] = (not_before, expires, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def get_token_cache(app) -> TokenCache | None:
+    if not hasattr(app.ctx, "token_cache"):
+        maxsize = app.config.get("TOKEN_CACHE_SIZE", 4096)
+        app.ctx.token_cache = TokenCache(
+            maxsize, app.config.get("TOKEN_CACHE_TTL", 300.0)
+        ) if maxsize else None
+    return app.ctx.token_cache
+
+
+def verify_token(request) -> dict[str, Any] | None:
+    """返回 token 的 claims，无效时返回 None"""
     if not request.token:
-        return False
+        return None
+
+    with span("jwt.verify") as verify_span:
+        cache = get_token_cache(request.app)
+        if cache is not None and (claims := cache.get(request.token)) is not None:
+            verify_span.set(cached=True)
+            return claims
+
+        try:
+            claims = jwt.decode(
+                request.token, request.app.config.SECRET, algorithms=["HS256"]
+            )
+        except jwt.exceptions.InvalidTokenError:
+            verify_span.set(valid=False)
+            return None
+
+        if cache is not None:
+            cache.put(request.token, claims)
+        return claims
+
+
+def check_token(request):
+    claims = verify_token(request)
+    request.ctx.claims = claims
+    return claims is not None
+
 
-    try:
-        jwt.decode(
-            request.token, request.app.config.SECRET, algorithms=["HS256"]
-        )
-    except jwt.exceptions.InvalidTokenError:
-        return False
-    else:
-        return True
+def token_subject(request) -> str:
+    """限流用的 token 主体：优先 ``sub``，否则为 token 摘要"""
+    claims = request.ctx.claims or {}
+    return str(claims.get("sub") or TokenCache.key(request.token).hex())
 
 
 def protected(wrapped):
     def decorator(f):
         @wraps(f)
         async def decorated_function(request, *args, **kwargs):
+            # 准入控制（setup_admission）：先按 IP 限流，认证后按 token 主体限流并占用并发名额
+            admission = getattr(request.app.ctx, "admission", None)
+            if admission is not None:
+                admission.check("ip", client_ip(request))
             is_authenticated = check_token(request)
 
             if is_authenticated:
-                response = await f(request, *args, **kwargs)
+                if admission is None:
+                    return await f(request, *args, **kwargs)
+                admission.check("subject", token_subject(request))
+                async with admission.slot():
+                    response = await f(request, *args, **kwargs)
                 return response
             else:
                 return text("You are unauthorized.", 401)
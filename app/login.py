@@ -1,10 +1,19 @@
 import jwt
 from sanic import Blueprint, text
+from sanic_book.admission import client_ip
+from sanic_book.offload import offload
 
 login = Blueprint("login", url_prefix="/login")
 
 
+@offload("cpu")
+def sign_token(payload: dict, secret: str) -> str:
+    return jwt.encode(payload, secret)
+
+
 @login.post("/")
 async def do_login(request):
-    token = jwt.encode({}, request.app.config.SECRET)
+    if (admission := getattr(request.app.ctx, "admission", None)) is not None:
+        admission.check("login", client_ip(request))
+    token = await sign_token({}, request.app.config.SECRET)
     return text(token)
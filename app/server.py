@@ -1,27 +1,56 @@
-import time
+# 启动剖析：python server.py --profile-startup 或 SANIC_BOOK_PROFILE_STARTUP=1
+from utils.profiler import enabled as profile_startup, startup_profiler
+if profile_startup():
+    startup_profiler.install()
+    startup_profiler.time_blueprints()
+
+import os
 from uuid import UUID
 from sanic import Sanic, Request, HTTPResponse
 from sanic.response import html, text, json
-from utils.config import TomlConfig
+from utils.config import TomlConfig, setup_config_reload
 from api import api
-
-
-class NanoSecondRequest(Request):
-    @classmethod
-    def generate_id(*_):
-        return time.time_ns()
+from sanic_book.cache import cached, setup_response_cache
+from sanic_book.clients import setup_clients
+from sanic_book.metrics import setup_metrics
+from sanic_book.serialization import Precoded, dumps, loads
+from sanic_book.offload import setup_offload
+from sanic_book.tracing import NanoSecondRequest, setup_tracing
+from sanic_book.watchdog import setup_watchdog
 
 # =================== 配置 ======================================
 toml_config = TomlConfig(path="./configs/main.toml") # 定义配置
-app = Sanic(toml_config.APP_NAME, config=toml_config) # 注册应用
+app = Sanic(toml_config.APP_NAME, config=toml_config,
+            request_class=NanoSecondRequest, # 请求 ID 即纳秒时间戳
+            dumps=dumps, loads=loads) # 注册应用，json() 响应使用更快的编码器
+setup_config_reload(app) # 配置文件变化时热更新各 worker
+if profile_startup():
+    startup_profiler.attach(app)
+if os.environ.get("SANIC_BOOK_METRICS", "1") != "0":
+    setup_metrics(app) # 按路由统计延迟，见 /api/metrics
+setup_tracing(app, sample_rate=toml_config.TRACE_SAMPLE_RATE,
+              directory=toml_config.TRACE_DIR, fmt=toml_config.TRACE_FORMAT,
+              trusted_proxies=toml_config.TRACE_TRUSTED_PROXIES,
+              max_bytes=toml_config.TRACE_MAX_BYTES, backups=toml_config.TRACE_BACKUPS) # 采样追踪
+setup_watchdog(app, threshold=toml_config.WATCHDOG_THRESHOLD) # 事件循环延迟与阻塞调用检测
+setup_offload(app, {"cpu": ("process", toml_config.OFFLOAD_PROCESSES)}) # CPU 密集的函数移出事件循环
+setup_clients(app, toml_config.UPSTREAMS) # 出站 HTTP 客户端，见 app.ctx.http
+
+setup_response_cache(app, max_bytes=toml_config.RESPONSE_CACHE_BYTES,
+                     max_item=toml_config.RESPONSE_CACHE_ITEM_MAX,
+                     shared_slots=toml_config.RESPONSE_CACHE_SHARED_SLOTS,
+                     shared_slot_size=toml_config.RESPONSE_CACHE_SLOT_SIZE) # GET 响应缓存，见 @cached
 
 # =================== 蓝图 ======================================
 app.blueprint(api) # 注册蓝图
 
 # =================== 应用 ======================================
+FOO = Precoded({"foo": "bar"}) # 常量响应只编码一次
+
 @app.get("/")
+@cached(ttl=60)
 async def foo_handler(request: Request) -> HTTPResponse:
-    return json({"foo": "bar"})
+    return FOO.response()
 
 if __name__ == '__main__':
     # app.run(host='0.0.0.0', port=8888, debug=True, dev=True)
@@ -1,39 +1,59 @@
-import time
-from string import Template
 from sanic import Sanic, Request, HTTPResponse
 # from sanic.log import logger
-from sanic.response import html, text
-from _config import TomlConfig
+from sanic.response import json, text
+from utils.config import TomlConfig
+from utils.conditional import respond
+from utils.render import PageRenderer
+from utils.static import StaticFiles
+from sanic_book.admission import setup_admission
+from sanic_book.cache import cached, setup_response_cache
+from sanic_book.offload import setup_offload
+from sanic_book.tracing import NanoSecondRequest, setup_tracing
+from sanic_book.uploads import receive_form
+from sanic_book.watchdog import setup_watchdog
 from auth import protected
 from login import login
 
 
-class NanoSecondRequest(Request):
-    @classmethod
-    def generate_id(*_):
-        return time.time_ns()
-
-
 toml_config = TomlConfig(path="./configs/main.toml")
-app = Sanic(toml_config.APP_NAME, config=toml_config)
+app = Sanic(toml_config.APP_NAME, config=toml_config, request_class=NanoSecondRequest)
+setup_tracing(app, sample_rate=toml_config.TRACE_SAMPLE_RATE,
+              directory=toml_config.TRACE_DIR, fmt=toml_config.TRACE_FORMAT,
+              trusted_proxies=toml_config.TRACE_TRUSTED_PROXIES,
+              max_bytes=toml_config.TRACE_MAX_BYTES, backups=toml_config.TRACE_BACKUPS)
+setup_watchdog(app, threshold=toml_config.WATCHDOG_THRESHOLD)
+setup_offload(app, {"cpu": ("process", toml_config.OFFLOAD_PROCESSES)})
+setup_admission(app,
+                limits={name: tuple(limit) for name, limit in (
+                            ("login", toml_config.RATE_LIMIT_LOGIN),
+                            ("ip", toml_config.RATE_LIMIT_IP),
+                            ("subject", toml_config.RATE_LIMIT_SUBJECT)) if limit},
+                max_active=toml_config.MAX_ACTIVE_REQUESTS,
+                max_queue=toml_config.MAX_QUEUED_REQUESTS,
+                queue_timeout=toml_config.QUEUE_TIMEOUT,
+                max_lag=toml_config.MAX_LOOP_LAG)
+setup_response_cache(app, max_bytes=toml_config.RESPONSE_CACHE_BYTES,
+                     max_item=toml_config.RESPONSE_CACHE_ITEM_MAX,
+                     shared_slots=toml_config.RESPONSE_CACHE_SHARED_SLOTS,
+                     shared_slot_size=toml_config.RESPONSE_CACHE_SLOT_SIZE)
 app.blueprint(login)
-app.static("/static", "./_static")
+renderer = PageRenderer(template="templates/demo.html", root="configs")
+static_files = StaticFiles("./_static")
+
+
+@app.route("/static/<path:path>", methods=["GET", "HEAD"])
+async def static(request: Request, path: str) -> HTTPResponse:
+    return await static_files.respond(request, path)
 
 
 @app.route("/<tag:strorempty>")
+@cached(ttl=5, stale=60, vary=("accept-encoding",))
 async def page(request: Request, tag: str) -> HTTPResponse:
     # return text("Hello, world.")
     # logger.info(f"logging {request.id}\n{request.remote_addr}")
     # return text(f"{request.id}\n{request.remote_addr}")
-    root = "configs/index" if tag == "" else f"configs/{tag}"
-    print("tag: ", tag)
-    with open("templates/demo.html", encoding="utf-8") as fp:
-        context = fp.read()
-    with open(f"{root}/article.html", encoding="utf-8") as fp:
-        article = fp.read()
-    with open(f"{root}/aside.html", encoding="utf-8") as fp:
-        aside = fp.read()
-    return html(Template(context).substitute(article=article, aside=aside))
+    rendered = await renderer.page(tag)
+    return respond(request, rendered.rep)
 
 
 @app.get("/secret")
@@ -43,9 +63,20 @@ async def secret(request):
     return text("To go fast, you must be fast.")
 
 
-@app.post("/form-post")
+@app.post("/form-post", stream=True)
 async def forms(request: Request) -> HTTPResponse:
-   return text("DDD")
+    """流式接收表单，文件直接写入 UPLOAD_DIR"""
+    form = await receive_form(request, toml_config.UPLOAD_DIR,
+                              max_body=toml_config.UPLOAD_MAX_BODY,
+                              max_file=toml_config.UPLOAD_MAX_FILE,
+                              max_fields_size=toml_config.UPLOAD_MAX_FIELDS_SIZE,
+                              hash_name=toml_config.UPLOAD_HASH or None)
+    return json({
+        "fields": form.fields,
+        "files": [{"name": upload.name, "filename": upload.filename,
+                   "content_type": upload.content_type, "size": upload.size,
+                   "digest": upload.digest} for upload in form.uploads()],
+    })
 
 if __name__ == "__main__":
     app.run(dev=True, host='0.0.0.0', port=8080)
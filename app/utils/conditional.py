@@ -0,0 +1,131 @@
+"""条件请求（ETag / Last-Modified）与压缩协商
+
+表示（representation）在生成时就把 ETag 和各编码版本算好，
+请求到来时只需比较请求头并挑选合适的版本。
+"""
+import gzip
+import hashlib
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+
+from sanic import Request, HTTPResponse
+from sanic.response import empty, raw
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+# 按偏好顺序排列，None 表示不压缩
+ENCODINGS = ("br", "gzip", None)
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def strong_etag(data: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def compress(data: bytes) -> dict[str | None, bytes]:
+    """计算 data 的全部可用编码版本"""
+    variants: dict[str | None, bytes] = {None: data}
+    variants["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        variants["br"] = brotli.compress(data)
+    # 压缩后反而更大的版本没有意义
+    return {k: v for k, v in variants.items() if k is None or len(v) < len(data)}
+
+
+def _variant_etag(etag: str, encoding: str | None) -> str:
+    # 强 ETag 必须区分不同的编码
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def negotiate(accept_encoding: str | None, available) -> str | None:
+    """根据 Accept-Encoding 从 available 中选出编码，None 表示原文"""
+    if not accept_encoding:
+        return None
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    for encoding in ENCODINGS:
+        if encoding is None:
+            break
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较
+    tags = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in tags
+
+
+def not_modified_since(request: Request, last_modified: float | None) -> bool:
+    since = request.headers.get("if-modified-since")
+    if not since or last_modified is None:
+        return False
+    try:
+        return int(last_modified) <= parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+@dataclass(slots=True)
+class Representation:
+    """同一资源的全部编码版本及其校验信息"""
+    etag: str
+    content_type: str
+    last_modified: float | None = None
+    variants: dict[str | None, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, data: bytes, content_type: str,
+              last_modified: float | None = None) -> "Representation":
+        return cls(etag=strong_etag(data),
+                   content_type=content_type,
+                   last_modified=last_modified,
+                   variants=compress(data))
+
+
+def conditional_headers(etag: str, encoding: str | None,
+                        last_modified: float | None) -> dict[str, str]:
+    headers = {"ETag": _variant_etag(etag, encoding), "Vary": "Accept-Encoding"}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return headers
+
+
+def is_not_modified(request: Request, etag: str,
+                    last_modified: float | None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # 任一编码版本的 ETag 都视为同一资源
+        return any(etag_matches(if_none_match, _variant_etag(etag, encoding))
+                   for encoding in ENCODINGS)
+    return not_modified_since(request, last_modified)
+
+
+def respond(request: Request, rep: Representation,
+            headers: dict[str, str] | None = None) -> HTTPResponse:
+    encoding = negotiate(request.headers.get("accept-encoding"), rep.variants)
+    response_headers = conditional_headers(rep.etag, encoding, rep.last_modified)
+    if headers:
+        response_headers.update(headers)
+    if is_not_modified(request, rep.etag, rep.last_modified):
+        response_headers.pop("Content-Encoding", None)
+        return empty(status=304, headers=response_headers)
+    return raw(rep.variants[encoding], headers=response_headers,
+               content_type=rep.content_type)
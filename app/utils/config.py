@@ -1,32 +1,256 @@
-from typing import Any, Callable, Sequence
-import toml
-from sanic.config import Config, SANIC_PREFIX
+"""TOML 配置
+
+配置文件只在主进程中解析一次，解析结果（冻结的快照）通过环境变量传给 worker，
+worker 启动时只需校验文件 mtime 而无需重新解析。多个文件按顺序逐层合并，
+``SANIC_`` 前缀的环境变量优先级最高。调用 :func:`setup_config_reload` 后，
+主进程监视文件变化并把新快照广播给所有 worker，无需重启。
+
+快照以 JSON 传递；环境变量名不能带 ``SANIC_`` 前缀，否则会被 Sanic 当作配置项读入。
+"""
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Sequence
+
+from sanic.config import DEFAULT_CONFIG, Config, SANIC_PREFIX
+from sanic.log import logger
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+    import toml
+
+SNAPSHOT_ENV = "BOOK_CONFIG_SNAPSHOT"
+SNAPSHOT_FILE_ENV = "BOOK_CONFIG_SNAPSHOT_FILE"
+# TOML 中 JSON 无法直接表示的类型；datetime 是 date 的子类，须排在前面
+_TOML_TYPES = {"datetime": datetime.datetime, "date": datetime.date, "time": datetime.time}
+
+
+def _load_toml(path: str) -> dict[str, Any]:
+    if tomllib is not None:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path, "r", encoding="utf-8") as f:
+        return toml.load(f)
+
+
+def _merge(base: dict[str, Any], layer: Mapping[str, Any]) -> dict[str, Any]:
+    for key, value in layer.items():
+        if isinstance(value, Mapping) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _read_text(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _mtimes(paths: Sequence[str]) -> tuple[int, ...]:
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+def _encode(value: Any) -> dict[str, str]:
+    for name, cls in _TOML_TYPES.items():
+        if isinstance(value, cls):
+            return {"$toml": name, "value": value.isoformat()}
+    raise TypeError(f"Unsupported config value: {value!r}")
+
+
+def _decode(obj: dict[str, Any]) -> Any:
+    if obj.keys() == {"$toml", "value"} and obj["$toml"] in _TOML_TYPES:
+        return _TOML_TYPES[obj["$toml"]].fromisoformat(obj["value"])
+    return obj
+
+
+class Snapshot:
+    """已解析、已转大写的配置快照，内容只读"""
+
+    def __init__(self, paths: Sequence[str], mtimes: tuple[int, ...], values: dict[str, Any]):
+        self.paths = tuple(paths)
+        self.mtimes = mtimes
+        self.values = MappingProxyType(values)
+
+    @classmethod
+    def parse(cls, paths: Sequence[str]) -> "Snapshot":
+        mtimes = _mtimes(paths)
+        merged: dict[str, Any] = {}
+        for path in paths:
+            _merge(merged, _to_uppercase(_load_toml(path)))
+        return cls(paths, mtimes, merged)
+
+    def is_current(self, paths: Sequence[str]) -> bool:
+        try:
+            return self.paths == tuple(paths) and self.mtimes == _mtimes(paths)
+        except OSError:
+            return False
+
+    def dumps(self) -> str:
+        return json.dumps({"paths": self.paths, "mtimes": self.mtimes,
+                           "values": dict(self.values)}, default=_encode)
+
+    @classmethod
+    def loads(cls, data: str | bytes) -> "Snapshot":
+        data = json.loads(data, object_hook=_decode)
+        return cls(data["paths"], tuple(data["mtimes"]), data["values"])
+
+    @classmethod
+    def load(cls, paths: Sequence[str]) -> "Snapshot":
+        """优先复用主进程传下来的快照"""
+        if data := os.environ.get(SNAPSHOT_ENV):
+            try:
+                snapshot = cls.loads(data)
+            except Exception:
+                snapshot = None
+            if snapshot is not None and snapshot.is_current(paths):
+                return snapshot
+        snapshot = cls.parse(paths)
+        # worker 进程由当前进程启动，会继承这个环境变量
+        os.environ[SNAPSHOT_ENV] = snapshot.dumps()
+        return snapshot
+
+
+def _to_uppercase(obj: dict[str, Any]) -> dict[str, Any]:
+    retval: dict[str, Any] = {}
+    for key, value in obj.items():
+        upper_key = key.upper()
+        if isinstance(value, list):
+            retval[upper_key] = [
+                _to_uppercase(item) if isinstance(item, dict) else item
+                for item in value
+            ]
+        elif isinstance(value, dict):
+            retval[upper_key] = _to_uppercase(value)
+        else:
+            retval[upper_key] = value
+    return retval
 
 
 class TomlConfig(Config):
-    def __init__(self, path: str,
+    def __init__(self, path: str | Sequence[str],
                  defaults: dict[str, str | bool | int | float | None] = None,
                  env_prefix: str | None = SANIC_PREFIX,
                  keep_alive: bool | None = None,
                  *,
                  converters: Sequence[Callable[[str], Any]] | None = None):
         super().__init__(defaults, env_prefix, keep_alive, converters=converters)
-        with open(path, "r", encoding="utf-8") as f:
-            self.apply(toml.load(f))
+        # 从文件中删除的配置项恢复为这些默认值，没有默认值的直接移除
+        self._defaults = {**DEFAULT_CONFIG, **(defaults or {})}
+        # Config 的属性都保存在 dict 中，因此使用下划线开头的键
+        self._paths = (path,) if isinstance(path, str) else tuple(path)
+        self._snapshot = Snapshot.load(self._paths)
+        self.update(self._snapshot.values)
+        self._toml_env_prefix = env_prefix
+        self._apply_environment()
 
     def apply(self, config):
-        self.update(self._to_uppercase(config))
+        self.update(_to_uppercase(config))
 
     def _to_uppercase(self, obj: dict[str, Any]) -> dict[str, Any]:
-        retval: dict[str, Any] = {}
-        for key, value in obj.items():
-            upper_key = key.upper()
-            if isinstance(value, list):
-                retval[upper_key] = [
-                    self._to_uppercase(item) for item in value
-                ]
-            elif isinstance(value, dict):
-                retval[upper_key] = self._to_uppercase(value)
+        return _to_uppercase(obj)
+
+    def _apply_environment(self) -> None:
+        # 环境变量覆盖文件中的值
+        if self._toml_env_prefix:
+            self.load_environment_vars(self._toml_env_prefix)
+
+    def apply_snapshot(self, snapshot: Snapshot) -> None:
+        removed = self._snapshot.values.keys() - snapshot.values.keys()
+        self._snapshot = snapshot
+        for key in removed:
+            if key in self._defaults:
+                self.update({key: self._defaults[key]})
             else:
-                retval[upper_key] = value
-        return retval
+                self.pop(key, None)
+        self.update(snapshot.values)
+        self._apply_environment()
+
+
+def setup_config_reload(app, interval: float = 1.0) -> None:
+    """配置文件变化时热更新所有 worker 的 ``app.config``
+
+    主进程中的监视线程负责重新解析，并把快照写入私有临时目录（0700）中的文件后
+    递增共享版本号；worker 只轮询共享内存中的版本号，变化时读取快照文件。
+    """
+    config: TomlConfig = app.config
+    stop = threading.Event()
+
+    async def reparse():
+        while True:
+            await asyncio.sleep(interval)
+            if await asyncio.to_thread(config._snapshot.is_current, config._paths):
+                continue
+            try:
+                snapshot = await asyncio.to_thread(Snapshot.parse, config._paths)
+            except Exception:
+                logger.exception("Failed to reload config from %s", config._paths)
+                continue
+            config.apply_snapshot(snapshot)
+            logger.info("Config reloaded from %s", ", ".join(config._paths))
+
+    @app.main_process_start
+    async def config_version(app):
+        app.shared_ctx.config_version = multiprocessing.Value("Q", 0)
+        directory = tempfile.mkdtemp(prefix="sanic-book-config-")
+        os.environ[SNAPSHOT_FILE_ENV] = os.path.join(directory, "config.snapshot")
+
+    @app.main_process_ready
+    async def config_watch(app):
+        version = app.shared_ctx.config_version
+        path = os.environ[SNAPSHOT_FILE_ENV]
+
+        def watch():
+            snapshot = config._snapshot
+            while not stop.wait(interval):
+                if snapshot.is_current(config._paths):
+                    continue
+                try:
+                    snapshot = Snapshot.parse(config._paths)
+                except Exception:
+                    logger.exception("Failed to reload config from %s", config._paths)
+                    continue
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with open(fd, "w", encoding="utf-8") as f:
+                    f.write(snapshot.dumps())
+                os.replace(tmp, path)
+                with version.get_lock():
+                    version.value += 1
+                logger.info("Config reloaded from %s", ", ".join(config._paths))
+
+        threading.Thread(target=watch, name="config-watch", daemon=True).start()
+
+    @app.main_process_stop
+    async def config_unwatch(app):
+        stop.set()
+        shutil.rmtree(os.path.dirname(os.environ[SNAPSHOT_FILE_ENV]), ignore_errors=True)
+
+    @app.after_server_start
+    async def config_poll(app):
+        if not hasattr(app.shared_ctx, "config_version"):
+            # 单进程模式不执行 main_process_*，由本进程自己检查并重新解析
+            app.add_task(reparse(), name="config-poll")
+            return
+        version = app.shared_ctx.config_version
+        path = os.environ[SNAPSHOT_FILE_ENV]
+
+        async def poll():
+            seen = 0
+            while True:
+                await asyncio.sleep(interval)
+                current = version.value
+                if current == seen:
+                    continue
+                seen = current
+                data = await asyncio.to_thread(_read_text, path)
+                app.config.apply_snapshot(Snapshot.loads(data))
+
+        app.add_task(poll(), name="config-poll")
@@ -0,0 +1,147 @@
+"""启动过程剖析
+
+记录三类耗时：各模块的导入时间、各蓝图的注册时间，以及每个 worker
+从进程启动到接受第一个连接的时间。通过 ``python server.py --profile-startup``
+或环境变量 ``SANIC_BOOK_PROFILE_STARTUP=1`` 开启（``sanic`` 命令行只能用环境变量，
+worker 进程会继承它）；若环境变量的值是路径前缀，则每个进程另外把结果写入
+``<前缀>-<pid>.json``。
+
+本模块只依赖标准库，必须在其他模块之前导入。
+"""
+import importlib.abc
+import json
+import os
+import sys
+import time
+
+PROFILE_ENV = "SANIC_BOOK_PROFILE_STARTUP"
+PROFILE_FLAG = "--profile-startup"
+
+_started = time.perf_counter()
+
+
+def enabled() -> bool:
+    if PROFILE_FLAG in sys.argv:
+        os.environ.setdefault(PROFILE_ENV, "1")
+    return bool(os.environ.get(PROFILE_ENV))
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, profiler: "StartupProfiler"):
+        self.loader = loader
+        self.profiler = profiler
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = self.profiler._stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            self.profiler.imports[module.__name__] = (total, total - children)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _TimedFinder(importlib.abc.MetaPathFinder):
+    def __init__(self, profiler: "StartupProfiler"):
+        self.profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self.profiler)
+                return spec
+        return None
+
+
+class StartupProfiler:
+    def __init__(self):
+        # 模块名 -> (含子模块的耗时, 自身耗时)，单位秒
+        self.imports: dict[str, tuple[float, float]] = {}
+        self.blueprints: dict[str, float] = {}
+        self.first_connection: float | None = None
+        self._stack: list[float] = []
+        self._finder = _TimedFinder(self)
+
+    def install(self) -> None:
+        """开始记录模块导入耗时"""
+        if self._finder not in sys.meta_path:
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self) -> None:
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def time_blueprints(self) -> None:
+        """记录每个蓝图 ``register`` 的耗时"""
+        from sanic import Blueprint
+
+        register = Blueprint.register
+        profiler = self
+
+        def timed_register(self, app, options):
+            start = time.perf_counter()
+            try:
+                return register(self, app, options)
+            finally:
+                profiler.blueprints[self.name] = (
+                    profiler.blueprints.get(self.name, 0.0) + time.perf_counter() - start
+                )
+
+        Blueprint.register = timed_register
+
+    def attach(self, app) -> None:
+        """在 app 上注册报告启动耗时的监听器与信号"""
+        from sanic.log import logger
+        from sanic.signals import Event
+
+        @app.after_server_start
+        async def profile_ready(app):
+            self.uninstall()
+            logger.info("Startup: %.1f ms to ready", (time.perf_counter() - _started) * 1000)
+
+        @app.signal(Event.HTTP_LIFECYCLE_BEGIN)
+        async def profile_first_connection(conn_info):
+            if self.first_connection is not None:
+                return
+            self.first_connection = time.perf_counter() - _started
+            logger.info("Startup: %.1f ms to first connection", self.first_connection * 1000)
+            for line in self.report():
+                logger.info("Startup: %s", line)
+            self.dump()
+
+    def report(self, limit: int = 20) -> list[str]:
+        lines = [f"{'import (self)':<48}{'self ms':>10}{'total ms':>10}"]
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (total, own) in slowest[:limit]:
+            lines.append(f"{name:<48}{own * 1000:>10.2f}{total * 1000:>10.2f}")
+        for name, seconds in sorted(self.blueprints.items(), key=lambda item: -item[1]):
+            lines.append(f"blueprint {name:<38}{seconds * 1000:>10.2f}")
+        return lines
+
+    def dump(self) -> None:
+        target = os.environ.get(PROFILE_ENV, "")
+        if target in ("", "1"):
+            return
+        with open(f"{target}-{os.getpid()}.json", "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(),
+                       "worker": os.environ.get("SANIC_WORKER_NAME"),
+                       "first_connection": self.first_connection,
+                       "imports": self.imports,
+                       "blueprints": self.blueprints}, f, indent=2)
+
+
+startup_profiler = StartupProfiler()
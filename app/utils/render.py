@@ -0,0 +1,122 @@
+"""页面渲染引擎
+
+模板只加载、编译一次；按 tag 渲染好的页面放入有界 LRU 缓存，
+源文件 mtime 变化时自动失效。每个渲染结果的 ETag 与压缩版本也只计算一次。所有磁盘读取都在线程池中进行，不阻塞事件循环；
+模板替换与压缩在 ``cpu`` 执行池中进行（见 ``sanic_book.offload``）。
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from string import Template
+
+from sanic.exceptions import NotFound
+from sanic_book.offload import offload
+from sanic_book.tracing import span
+
+from .conditional import Representation
+
+
+def _read(path: str) -> tuple[str, int]:
+    with open(path, encoding="utf-8") as fp:
+        mtime = os.fstat(fp.fileno()).st_mtime_ns
+        return fp.read(), mtime
+
+
+def _mtimes(paths: tuple[str, ...]) -> tuple[int, ...]:
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+@offload("cpu")
+def build_page(template: str, article: str, aside: str,
+               last_modified: float) -> tuple[str, Representation]:
+    """替换模板并计算 ETag 与各压缩版本；只传模板源码，避免序列化 Template 对象"""
+    body = Template(template).substitute(article=article, aside=aside)
+    rep = Representation.build(body.encode("utf-8"), "text/html; charset=utf-8", last_modified)
+    return body, rep
+
+
+@dataclass(slots=True)
+class Page:
+    body: str
+    rep: Representation
+    paths: tuple[str, ...]
+    mtimes: tuple[int, ...]
+    checked_at: float
+
+
+class PageRenderer:
+    def __init__(self, template: str = "templates/demo.html",
+                 root: str = "configs",
+                 maxsize: int = 64,
+                 check_interval: float = 1.0):
+        self.template_path = template
+        self.root = root
+        self.maxsize = maxsize
+        self.check_interval = check_interval  # mtime 检查的最小间隔（秒）
+        self._template: Template | None = None
+        self._template_mtime = 0
+        self._pages: OrderedDict[str, Page] = OrderedDict()
+
+    def root_of(self, tag: str) -> str:
+        return f"{self.root}/index" if tag == "" else f"{self.root}/{tag}"
+
+    async def render(self, tag: str) -> str:
+        return (await self.page(tag)).body
+
+    async def page(self, tag: str) -> Page:
+        page = self._pages.get(tag)
+        if page is not None and await self._fresh(page):
+            self._pages.move_to_end(tag)
+            return page
+        page = await self._render(tag)
+        self._pages[tag] = page
+        self._pages.move_to_end(tag)
+        while len(self._pages) > self.maxsize:
+            self._pages.popitem(last=False)
+        return page
+
+    async def _fresh(self, page: Page) -> bool:
+        now = time.monotonic()
+        if now - page.checked_at < self.check_interval:
+            return True
+        try:
+            with span("template.stat", files=len(page.paths)):
+                mtimes = await asyncio.to_thread(_mtimes, page.paths)
+        except OSError:
+            return False
+        page.checked_at = now
+        return mtimes == page.mtimes
+
+    async def _compiled(self) -> Template:
+        (mtime,) = await asyncio.to_thread(_mtimes, (self.template_path,))
+        if self._template is None or mtime != self._template_mtime:
+            source, mtime = await asyncio.to_thread(_read, self.template_path)
+            self._template = Template(source)
+            self._template_mtime = mtime
+            self._pages.clear()
+        return self._template
+
+    async def _render(self, tag: str) -> Page:
+        root = self.root_of(tag)
+        paths = (self.template_path,
+                 f"{root}/article.html",
+                 f"{root}/aside.html")
+        template = await self._compiled()
+        try:
+            with span("template.read", tag=tag):
+                (article, article_mtime), (aside, aside_mtime) = await asyncio.gather(
+                    asyncio.to_thread(_read, paths[1]),
+                    asyncio.to_thread(_read, paths[2]),
+                )
+        except FileNotFoundError:
+            raise NotFound(f"Requested page not found: /{tag}")
+        mtimes = (self._template_mtime, article_mtime, aside_mtime)
+        with span("template.encode", tag=tag):
+            body, rep = await build_page(template.template, article, aside, max(mtimes) / 1e9)
+        return Page(body=body,
+                    rep=rep,
+                    paths=paths,
+                    mtimes=mtimes,
+                    checked_at=time.monotonic())
@@ -0,0 +1,331 @@
+"""带条件请求、预压缩版本协商与 Range 支持的静态文件服务
+
+启动时扫描一次根目录，建立文件元数据索引（大小、mtime、ETag、MIME 类型），
+请求路径上不再 ``stat``；索引按 ``check_interval`` 在后台线程中增量刷新。
+小文件放入按字节数淘汰的内存缓存；大文件通过 mmap 映射后按块发送内存视图，
+不经过 ``read()`` 复制。支持单区间与多区间（``multipart/byteranges``）请求。
+
+与原文件同目录下的 ``*.br`` / ``*.gz`` 视为其预压缩版本，可用::
+
+    python -m utils.static ./_static
+
+预先生成。
+"""
+import asyncio
+import hashlib
+import mimetypes
+import mmap
+import os
+import secrets
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from sanic import Request, HTTPResponse
+from sanic.exceptions import NotFound
+from sanic.response import empty, raw
+
+from .conditional import (SUFFIXES, compress, conditional_headers,
+                          is_not_modified, negotiate)
+
+# 超过此大小的文件用 size-mtime 作 ETag，避免启动时对大文件求摘要
+ETAG_HASH_LIMIT = 4 << 20
+# 多区间请求的区间数上限，超过时忽略 Range 返回整个文件
+MAX_RANGES = 16
+
+
+@dataclass(slots=True)
+class FileMeta:
+    path: Path
+    size: int
+    mtime_ns: int
+    etag: str
+    content_type: str
+    # 编码 -> (预压缩文件路径, 大小)
+    variants: dict[str, tuple[Path, int]] = field(default_factory=dict)
+
+    @property
+    def last_modified(self) -> float:
+        return self.mtime_ns / 1e9
+
+
+def _file_etag(path: Path, size: int, mtime_ns: int) -> str:
+    if size > ETAG_HASH_LIMIT:
+        return f'"{size:x}-{mtime_ns:x}"'
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fp:
+        while chunk := fp.read(1 << 16):
+            digest.update(chunk)
+    return '"%s"' % digest.hexdigest()
+
+
+def _variants(path: Path, mtime_ns: int) -> dict[str, tuple[Path, int]]:
+    variants = {}
+    for encoding, suffix in SUFFIXES.items():
+        sibling = path.with_name(path.name + suffix)
+        try:
+            stat = sibling.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime_ns >= mtime_ns:
+            variants[encoding] = (sibling, stat.st_size)
+    return variants
+
+
+def _scan(root: Path, previous: dict[str, FileMeta]) -> dict[str, FileMeta]:
+    """扫描 root 下所有文件；大小与 mtime 未变的文件沿用原 ETag"""
+    files: dict[str, FileMeta] = {}
+    suffixes = tuple(SUFFIXES.values())
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = Path(directory, name)
+            if name.endswith(suffixes) and path.with_suffix("").is_file():
+                continue  # 预压缩版本，随原文件登记
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            key = path.relative_to(root).as_posix()
+            old = previous.get(key)
+            if old is not None and (old.size, old.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                etag = old.etag
+            else:
+                etag = _file_etag(path, stat.st_size, stat.st_mtime_ns)
+            content_type, _ = mimetypes.guess_type(name)
+            files[key] = FileMeta(path=path,
+                                  size=stat.st_size,
+                                  mtime_ns=stat.st_mtime_ns,
+                                  etag=etag,
+                                  content_type=content_type or "application/octet-stream",
+                                  variants=_variants(path, stat.st_mtime_ns))
+    return files
+
+
+def _read_bytes(path: Path) -> bytes:
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+def _map(path: Path) -> mmap.mmap:
+    with open(path, "rb") as fp:
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, "madvise"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+
+def parse_range(header: str, size: int) -> list[tuple[int, int]] | None:
+    """解析 ``Range`` 头，返回排序并合并后的 [start, end) 区间
+
+    语法无效或区间过多时返回 None（按规范忽略 Range）；没有可满足的区间时返回空列表。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) + 1 if last else size
+                if last and end <= start:
+                    return None
+            else:
+                suffix = int(last)
+                start, end = max(size - suffix, 0), size
+        except ValueError:
+            return None
+        if start < size and end > start:
+            ranges.append((start, min(end, size)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    ranges.sort()
+    merged: list[tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request: Request, meta: FileMeta) -> bool:
+    value = request.headers.get("if-range")
+    if not value:
+        return True
+    if value.startswith(('"', "W/")):
+        return value == meta.etag
+    try:
+        return parsedate_to_datetime(value).timestamp() == int(meta.last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+class HotCache:
+    """小文件内容缓存，按总字节数做 LRU 淘汰"""
+
+    def __init__(self, max_bytes: int = 16 << 20, max_item: int = 256 << 10):
+        self.max_bytes = max_bytes
+        self.max_item = max_item
+        self.size = 0
+        self._items: OrderedDict[tuple, bytes] = OrderedDict()
+
+    def get(self, key: tuple) -> bytes | None:
+        data = self._items.get(key)
+        if data is not None:
+            self._items.move_to_end(key)
+        return data
+
+    def put(self, key: tuple, data: bytes) -> None:
+        if len(data) > self.max_item or key in self._items:
+            return
+        self._items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.size = 0
+
+
+class StaticFiles:
+    def __init__(self, root: str, check_interval: float = 5.0,
+                 cache_bytes: int = 16 << 20, cache_file_max: int = 256 << 10,
+                 chunk_size: int = 1 << 20):
+        self.root = Path(root).resolve()
+        self.check_interval = check_interval  # 索引刷新间隔（秒）
+        self.chunk_size = chunk_size
+        self.cache = HotCache(cache_bytes, cache_file_max)
+        self._files: dict[str, FileMeta] = {}
+        self._indexed_at: float | None = None
+        self._lock = asyncio.Lock()
+        self._refresh: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    async def build_index(self) -> int:
+        """扫描根目录（在线程中进行），返回索引中的文件数"""
+        async with self._lock:
+            self._files = await asyncio.to_thread(_scan, self.root, self._files)
+            self._indexed_at = time.monotonic()
+        return len(self._files)
+
+    async def meta(self, path: str) -> FileMeta:
+        if self._indexed_at is None:
+            await self.build_index()
+        elif (time.monotonic() - self._indexed_at >= self.check_interval
+              and (self._refresh is None or self._refresh.done())):
+            # 后台刷新，当前请求继续使用旧索引
+            self._refresh = asyncio.create_task(self.build_index())
+        # 索引键都是根目录下的相对路径，含 .. 等的路径自然查不到
+        meta = self._files.get(path.strip("/"))
+        if meta is None:
+            raise NotFound(f"File not found: /{path}")
+        return meta
+
+    async def _content(self, meta: FileMeta, location: Path, size: int) -> bytes | mmap.mmap:
+        if size > self.cache.max_item:
+            return await asyncio.to_thread(_map, location)
+        key = (meta.etag, location.name)
+        data = self.cache.get(key)
+        if data is None:
+            data = await asyncio.to_thread(_read_bytes, location)
+            self.cache.put(key, data)
+        return data
+
+    async def respond(self, request: Request, path: str) -> HTTPResponse | None:
+        meta = await self.meta(path)
+        ranges = None
+        if (header := request.headers.get("range")) and if_range_matches(request, meta):
+            ranges = parse_range(header, meta.size)
+        # Range 针对原始表示，此时不再协商压缩版本
+        encoding = None if ranges is not None else negotiate(
+            request.headers.get("accept-encoding"), meta.variants)
+        headers = conditional_headers(meta.etag, encoding, meta.last_modified)
+        headers["Accept-Ranges"] = "bytes"
+        if is_not_modified(request, meta.etag, meta.last_modified):
+            headers.pop("Content-Encoding", None)
+            return empty(status=304, headers=headers)
+        if ranges == []:
+            headers["Content-Range"] = f"bytes */{meta.size}"
+            return raw(b"", status=416, headers=headers)
+
+        location, size = (meta.path, meta.size) if encoding is None else meta.variants[encoding]
+        content_type = meta.content_type
+        status = 200
+        # 响应体由 (起点, 终点) 区间与 bytes 分隔片段依次拼成
+        parts: list[tuple[int, int] | bytes] = [(0, size)]
+        if ranges is not None and len(ranges) == 1:
+            status = 206
+            parts = ranges
+            headers["Content-Range"] = f"bytes {ranges[0][0]}-{ranges[0][1] - 1}/{size}"
+        elif ranges is not None:
+            status = 206
+            boundary = secrets.token_hex(12)
+            content_type = f"multipart/byteranges; boundary={boundary}"
+            parts = []
+            for start, end in ranges:
+                parts.append((f"\r\n--{boundary}\r\nContent-Type: {meta.content_type}\r\n"
+                              f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n").encode())
+                parts.append((start, end))
+            parts.append(f"\r\n--{boundary}--\r\n".encode())
+        length = sum(len(p) if isinstance(p, bytes) else p[1] - p[0] for p in parts)
+        headers["Content-Length"] = str(length)
+
+        if request.method == "HEAD":
+            return raw(b"", status=status, headers=headers, content_type=content_type)
+        content = await self._content(meta, location, size)
+        if isinstance(content, bytes):
+            view = memoryview(content)
+            body = b"".join(p if isinstance(p, bytes) else view[p[0]:p[1]] for p in parts)
+            return raw(body, status=status, headers=headers, content_type=content_type)
+
+        # 大文件：逐块发送 mmap 的内存视图。传输层可能仍持有视图，
+        # 因此不显式 close，由引用计数在发送完成后释放映射
+        response = await request.respond(status=status, headers=headers,
+                                         content_type=content_type)
+        view = memoryview(content)
+        for part in parts:
+            if isinstance(part, bytes):
+                await response.send(part)
+                continue
+            for offset in range(part[0], part[1], self.chunk_size):
+                await response.send(view[offset:min(offset + self.chunk_size, part[1])])
+        await response.eof()
+        return None
+
+
+def precompress(root: str, min_size: int = 256) -> int:
+    """为 root 下可压缩的文件生成 .gz / .br 版本，返回生成的文件数"""
+    count = 0
+    skip = tuple(SUFFIXES.values())
+    for path in Path(root).rglob("*"):
+        if not path.is_file() or path.name.endswith(skip):
+            continue
+        content_type, _ = mimetypes.guess_type(path.name)
+        if not content_type or not (content_type.startswith("text/")
+                                    or content_type.endswith(("javascript", "json", "xml", "svg+xml"))):
+            continue
+        data = path.read_bytes()
+        if len(data) < min_size:
+            continue
+        for encoding, body in compress(data).items():
+            if encoding is None:
+                continue
+            path.with_name(path.name + SUFFIXES[encoding]).write_bytes(body)
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    for root in sys.argv[1:] or ["./_static"]:
+        print(f"{root}: {precompress(root)} files")
@@ -0,0 +1,54 @@
+"""`@protected` 每次请求的鉴权开销：有/无已验证 token 缓存
+
+用法::
+
+    python benchmarks/auth_overhead.py --requests 100000 --tokens 100
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import jwt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from auth import check_token  # noqa: E402
+
+SECRET = "KEEP_IT_SECRET_KEEP_IT_SAFE"
+
+
+class Config(dict):
+    __getattr__ = dict.__getitem__
+
+
+def make_app(cache_size: int) -> SimpleNamespace:
+    return SimpleNamespace(ctx=SimpleNamespace(),
+                           config=Config(SECRET=SECRET, TOKEN_CACHE_SIZE=cache_size))
+
+
+def run(app, tokens: list[str], requests: int) -> float:
+    start = time.perf_counter_ns()
+    for i in range(requests):
+        request = SimpleNamespace(app=app, token=tokens[i % len(tokens)],
+                                  ctx=SimpleNamespace())
+        assert check_token(request)
+    return (time.perf_counter_ns() - start) / requests
+
+
+def main(args):
+    exp = int(time.time()) + 3600
+    tokens = [jwt.encode({"sub": str(i), "exp": exp}, SECRET, algorithm="HS256")
+              for i in range(args.tokens)]
+    baseline = run(make_app(0), tokens, args.requests)
+    cached = run(make_app(4096), tokens, args.requests)
+    print(f"no cache: {baseline / 1000:8.2f} µs/request")
+    print(f"   cache: {cached / 1000:8.2f} µs/request  ({baseline / cached:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--tokens", type=int, default=100)
+    main(parser.parse_args())
@@ -0,0 +1,73 @@
+"""`TomlConfig` 启动耗时：旧实现 / 主进程首次解析 / worker 复用快照
+
+用法::
+
+    python benchmarks/config_startup.py --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import toml
+from sanic.config import Config
+
+APP_ROOT = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_ROOT))
+
+from utils.config import SNAPSHOT_ENV, TomlConfig  # noqa: E402
+
+CONFIG_PATH = str(APP_ROOT / "configs/main.toml")
+
+
+class LegacyTomlConfig(Config):
+    """改造前的实现：每个 worker 都用 toml 解析并递归转换"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        with open(path, "r", encoding="utf-8") as f:
+            self.apply(toml.load(f))
+
+    def apply(self, config):
+        self.update(self._to_uppercase(config))
+
+    def _to_uppercase(self, obj: dict[str, Any]) -> dict[str, Any]:
+        retval: dict[str, Any] = {}
+        for key, value in obj.items():
+            upper_key = key.upper()
+            if isinstance(value, list):
+                retval[upper_key] = [self._to_uppercase(item) for item in value]
+            elif isinstance(value, dict):
+                retval[upper_key] = self._to_uppercase(value)
+            else:
+                retval[upper_key] = value
+        return retval
+
+
+def timeit(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(args):
+    legacy = timeit(lambda: LegacyTomlConfig(CONFIG_PATH), args.repeat)
+
+    def cold():
+        os.environ.pop(SNAPSHOT_ENV, None)
+        TomlConfig(CONFIG_PATH)
+
+    parse = timeit(cold, args.repeat)
+    TomlConfig(CONFIG_PATH)  # 主进程写入快照
+    snapshot = timeit(lambda: TomlConfig(CONFIG_PATH), args.repeat)
+    for name, seconds in (("legacy", legacy), ("parse", parse), ("snapshot", snapshot)):
+        print(f"{name:>9}: {seconds * 1e6:10.1f} µs  ({legacy / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
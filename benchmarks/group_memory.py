@@ -0,0 +1,96 @@
+"""内存中保存分组时每个分组占用的字节数
+
+用法::
+
+    python benchmarks/group_memory.py --sizes 100000 1000000
+
+``dataclasses`` 为原先的做法：``dict[group_id, Group]`` 加有序索引，``number``/``name``
+是 ``uuid.UUID``、日期各自独立（与 ``add_group`` 创建的分组相同）；``dataclasses/str``
+把 UUID 换成字符串；``table`` 为 :class:`GroupTable`。用 :mod:`tracemalloc` 统计
+构建后仍被引用的内存，并附带读取全部分组的耗时（``table`` 按页构造 :class:`Group`）。
+"""
+import argparse
+import datetime
+import gc
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "doc/integrations/GraphQL/Strawberry/tests"))
+
+from api.records import GroupTable, order_key  # noqa: E402
+from api.snowflake import Snowflake  # noqa: E402
+from api.types import Group  # noqa: E402
+
+
+def generate(ids: list[int], uuid_objects: bool):
+    for group_id in ids:
+        number, name = uuid.uuid4(), uuid.uuid4()
+        yield Group(group_id=str(group_id),
+                    number=number if uuid_objects else str(number),
+                    name=name if uuid_objects else str(name),
+                    creation_time=datetime.date.today(),
+                    update_time=datetime.date.today())
+
+
+def build_dict(groups):
+    table = {group.group_id: group for group in groups}
+    index = sorted((order_key(key), key) for key in table)
+    return table, index
+
+
+def read_dict(store) -> int:
+    table, _ = store
+    return sum(1 for group in table.values() if group.device_number == 0)
+
+
+def read_table(table: GroupTable, page_size: int = 1000) -> int:
+    """与接口一样按页读取，每次只构造一页 Group"""
+    count, after = 0, None
+    while keys := table.page(after, page_size):
+        count += sum(1 for group in table.get_many(keys) if group.device_number == 0)
+        after = order_key(keys[-1])
+    return count
+
+
+VARIANTS = {
+    "dataclasses": (lambda ids: build_dict(generate(ids, True)), read_dict),
+    "dataclasses/str": (lambda ids: build_dict(generate(ids, False)), read_dict),
+    "table": (lambda ids: GroupTable(generate(ids, False)), read_table),
+}
+
+
+def measure(build, read, ids: list[int]) -> tuple[float, float, float]:
+    """返回 (每个分组的字节数, 每个分组的峰值字节数, 读取全部的秒数)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = build(ids)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    assert read(store) == len(ids)
+    elapsed = time.perf_counter() - start
+    del store
+    return (retained - before) / len(ids), (peak - before) / len(ids), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    args = parser.parse_args()
+    for size in args.sizes:
+        ids = Snowflake().next_ids(size)
+        for name in args.variants:
+            per_group, peak, elapsed = measure(*VARIANTS[name], ids)
+            print(f"{size:>9} groups  {name:<16} {per_group:8.1f} B/group  "
+                  f"peak {peak:8.1f} B/group  read all {elapsed * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
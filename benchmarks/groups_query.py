@@ -0,0 +1,66 @@
+"""`Query.groups` 在不同存储后端与数据规模下的延迟
+
+用法::
+
+    python benchmarks/groups_query.py --sizes 10 1000 100000 --repeat 5
+"""
+import argparse
+import asyncio
+import datetime
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]
+                       / "doc/integrations/GraphQL/Strawberry/tests"))
+
+from api.schema import make_group_loader, schema  # noqa: E402
+from api.snowflake import Snowflake  # noqa: E402
+from api.storage import create_store  # noqa: E402
+from api.types import Group  # noqa: E402
+
+QUERY = "{ groups { group_id number name device_number update_time } }"
+# 名称 -> (存储 URL, 是否开启跨请求缓存)
+BACKENDS = {"memory": ("memory://", False),
+            "sqlite": ("sqlite://", False),
+            "sqlite+cache": ("sqlite://", True)}
+
+
+def make_groups(n: int) -> list[Group]:
+    today = datetime.date.today()
+    return [Group(group_id=str(group_id), number=str(uuid.uuid4()), name=str(uuid.uuid4()),
+                  creation_time=today, update_time=today)
+            for group_id in Snowflake().next_ids(n)]
+
+
+async def measure(url: str, cache: bool, groups: list[Group], repeat: int) -> list[float]:
+    store = create_store(url, cache=cache, groups=groups)
+    timings = []
+    for _ in range(repeat):
+        context = {"device_loader": make_group_loader(store), "store": store}
+        start = time.perf_counter()
+        result = await schema.execute(QUERY, context_value=context)
+        timings.append(time.perf_counter() - start)
+        assert result.errors is None, result.errors
+        assert len(result.data["groups"]) == len(groups)
+    await store.close()
+    return timings
+
+
+async def main(args):
+    for size in args.sizes:
+        groups = make_groups(size)
+        for backend, (url, cache) in BACKENDS.items():
+            timings = await measure(url, cache, groups, args.repeat)
+            print(f"{size:>8} groups  {backend:<14} "
+                  f"median {statistics.median(timings) * 1000:10.2f} ms  "
+                  f"min {min(timings) * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
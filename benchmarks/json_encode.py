@@ -0,0 +1,96 @@
+"""`groups` 负载在各 JSON 后端下的编码吞吐（字节/秒）
+
+用法::
+
+    python benchmarks/json_encode.py --sizes 100 10000 --repeat 5
+
+``legacy`` 为原先 NDJSON 流的做法：``dataclasses.asdict`` 逐个转换后再用标准库编码；
+``<后端>/objects`` 直接编码 Group 对象；``<后端>/graphql`` 编码 Strawberry
+执行结果形状的 dict（GraphQL 响应的编码路径）。
+"""
+import argparse
+import dataclasses
+import datetime
+import json
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "doc/integrations/GraphQL/Strawberry/tests"))
+
+import strawberry  # noqa: E402
+from api.snowflake import Snowflake  # noqa: E402
+from api.types import Group  # noqa: E402
+from sanic_book import serialization  # noqa: E402
+
+
+def make_groups(n: int) -> list[Group]:
+    today = datetime.date.today()
+    return [Group(group_id=str(group_id), number=str(uuid.uuid4()), name=str(uuid.uuid4()),
+                  creation_time=today, update_time=today)
+            for group_id in Snowflake().next_ids(n)]
+
+
+def legacy_dumps(groups: list[Group]) -> bytes:
+    rows = []
+    for group in groups:
+        data = dataclasses.asdict(group)
+        for key, value in data.items():
+            if value is strawberry.UNSET:
+                data[key] = None
+            elif isinstance(value, datetime.date):
+                data[key] = value.isoformat()
+        rows.append(data)
+    return json.dumps({"groups": rows}, ensure_ascii=False).encode()
+
+
+def graphql_payload(groups: list[Group]) -> dict:
+    return {"data": {"groups": [
+        {"group_id": g.group_id, "number": g.number, "name": g.name,
+         "device_number": g.device_number, "update_time": g.update_time.isoformat()}
+        for g in groups
+    ]}}
+
+
+def measure(fn, payload, repeat: int) -> tuple[float, int]:
+    size = len(fn(payload))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backends = {}
+    for name in serialization.BACKENDS:
+        try:
+            backends[name] = serialization.select(name)[1]
+        except ImportError:
+            print(f"{name}: not installed")
+
+    for n in args.sizes:
+        groups = make_groups(n)
+        cases = [("legacy", legacy_dumps, groups)]
+        for name, dumps in backends.items():
+            cases.append((f"{name}/objects", lambda g, dumps=dumps: dumps({"groups": g}), groups))
+            cases.append((f"{name}/graphql", dumps, graphql_payload(groups)))
+        for label, fn, payload in cases:
+            seconds, size = measure(fn, payload, args.repeat)
+            print(f"{n:>8} groups  {label:<16} {size / seconds / 1e6:10.1f} MB/s  "
+                  f"{n / seconds:12.0f} groups/s  ({size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
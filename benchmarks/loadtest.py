@@ -0,0 +1,328 @@
+"""端到端压测：启动本地服务并用内置的异步负载生成器压测各端点
+
+示例::
+
+    python benchmarks/loadtest.py --workers 4 --concurrency 64 --duration 10 \\
+        --output results/$(git rev-parse --short HEAD).json
+    python benchmarks/loadtest.py --compare results/old.json results/new.json
+
+每个场景报告 req/s 以及 p50/p99/p999 延迟，结果写入 JSON 以便跨提交对比。
+只有 2xx/3xx 响应计入 req/s 与延迟，其他状态码与连接错误都计为 errors。
+负载生成器直接使用 asyncio 流与 HTTP/1.1 keep-alive，不依赖第三方库。
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+APP_ROOT = ROOT / "app"
+GRAPHQL_ROOT = ROOT / "doc/integrations/GraphQL/Strawberry/tests"
+
+# 服务名 -> (工作目录, 应用路径, 额外的环境变量)
+SERVERS = {
+    "app": (APP_ROOT, "server:app", {}),
+    # 压测请求都来自同一 IP、使用同一 token，关闭按 IP/主体的限流，才能测到处理函数本身
+    "site": (APP_ROOT, "utils._test_server:app",
+             {"SANIC_RATE_LIMIT_IP": "0", "SANIC_RATE_LIMIT_SUBJECT": "0"}),
+    "graphql": (GRAPHQL_ROOT, "server:app", {}),
+}
+
+GROUPS_QUERY = json.dumps({"query": "{ groups { group_id number name device_number } }"})
+
+
+@dataclass
+class Scenario:
+    name: str
+    server: str
+    path: str
+    method: str = "GET"
+    body: str = ""
+    headers: dict[str, str] = field(default_factory=dict)
+    auth: bool = False  # 需要先从 /login 获取 JWT
+
+
+SCENARIOS = [
+    Scenario("root", "app", "/"),
+    Scenario("info", "app", "/api/info/"),
+    Scenario("page", "site", "/"),
+    Scenario("page-about", "site", "/about"),
+    Scenario("secret", "site", "/secret", auth=True),
+    Scenario("graphql-groups", "graphql", "/v1.1/groups", method="POST", body=GROUPS_QUERY,
+             headers={"Content-Type": "application/json"}),
+]
+
+
+@dataclass
+class Result:
+    name: str
+    requests: int
+    errors: int
+    seconds: float
+    rps: float
+    p50_ms: float
+    p99_ms: float
+    p999_ms: float
+    status: dict[str, int]
+
+
+def percentile(sorted_values: list[int], q: float) -> float:
+    if not sorted_values:
+        return math.nan
+    index = max(0, math.ceil(q * len(sorted_values)) - 1)
+    return sorted_values[index] / 1e6
+
+
+class Connection:
+    """极简 HTTP/1.1 keep-alive 客户端"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def connect(self) -> None:
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def request(self, payload: bytes) -> int:
+        if self.writer is None:
+            await self.connect()
+        self.writer.write(payload)
+        reader = self.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        status = int(status_line.split(b" ", 2)[1])
+        length = None
+        chunked = False
+        keep_alive = True
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            value = value.strip()
+            if name == "content-length":
+                length = int(value)
+            elif name == "transfer-encoding" and "chunked" in value.lower():
+                chunked = True
+            elif name == "connection" and value.lower() == "close":
+                keep_alive = False
+        if chunked:
+            while size := int((await reader.readline()).split(b";")[0], 16):
+                await reader.readexactly(size + 2)
+            await reader.readline()
+        elif length:
+            await reader.readexactly(length)
+        if not keep_alive:
+            self.close()
+        return status
+
+
+def build_request(scenario: Scenario, host: str, token: str | None) -> bytes:
+    headers = {"Host": host, "Connection": "keep-alive",
+               "Accept-Encoding": "gzip, br", **scenario.headers}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    body = scenario.body.encode()
+    if body or scenario.method in ("POST", "PUT", "PATCH"):
+        headers["Content-Length"] = str(len(body))
+    lines = [f"{scenario.method} {scenario.path} HTTP/1.1"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+async def login(host: str, port: int) -> str:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"POST /login/ HTTP/1.1\r\nHost: {host}\r\nContent-Length: 0\r\n"
+                 f"Connection: close\r\n\r\n".encode())
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    if head.split(b" ", 2)[1] != b"200":
+        raise RuntimeError(f"login failed: {head.splitlines()[0].decode()}")
+    return body.decode().strip()
+
+
+async def run_scenario(scenario: Scenario, host: str, port: int,
+                       concurrency: int, duration: float, warmup: float) -> Result:
+    token = await login(host, port) if scenario.auth else None
+    payload = build_request(scenario, host, token)
+    latencies: list[int] = []
+    status: dict[str, int] = {}
+    errors = 0
+
+    async def worker(deadline: float, record: bool) -> None:
+        nonlocal errors
+        connection = Connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter_ns()
+                try:
+                    code = await connection.request(payload)
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    connection.close()
+                    if record:
+                        errors += 1
+                    continue
+                if record:
+                    status[str(code)] = status.get(str(code), 0) + 1
+                    if 200 <= code < 400:
+                        latencies.append(time.perf_counter_ns() - start)
+                    else:
+                        errors += 1
+        finally:
+            connection.close()
+
+    if warmup > 0:
+        deadline = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(deadline, False) for _ in range(concurrency)))
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(worker(deadline, True) for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return Result(name=scenario.name,
+                  requests=len(latencies),
+                  errors=errors,
+                  seconds=seconds,
+                  rps=len(latencies) / seconds,
+                  p50_ms=percentile(latencies, 0.50),
+                  p99_ms=percentile(latencies, 0.99),
+                  p999_ms=percentile(latencies, 0.999),
+                  status=status)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name: str, host: str, port: int, workers: int) -> subprocess.Popen:
+    cwd, target, extra_env = SERVERS[name]
+    env = {**os.environ, **extra_env,
+           "PYTHONPATH": os.pathsep.join(filter(None, [str(cwd), os.environ.get("PYTHONPATH")]))}
+    command = [sys.executable, "-m", "sanic", target, f"--host={host}", f"--port={port}",
+               f"--workers={workers}", "--no-access-logs"]
+    # 输出写入临时文件而不是管道，避免管道写满阻塞服务
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    process.log = log
+    return process
+
+
+async def wait_ready(process: subprocess.Popen, host: str, port: int, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            process.log.seek(0)
+            raise RuntimeError(process.log.read().decode(errors="replace"))
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+    raise TimeoutError(f"server on port {port} did not start in {timeout}s")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    results: list[Result] = []
+    for server in dict.fromkeys(s.server for s in selected):
+        port = free_port()
+        process = start_server(server, args.host, port, args.workers)
+        try:
+            await wait_ready(process, args.host, port, args.startup_timeout)
+            for scenario in (s for s in selected if s.server == server):
+                result = await run_scenario(scenario, args.host, port, args.concurrency,
+                                            args.duration, args.warmup)
+                print(format_result(result))
+                results.append(result)
+        finally:
+            stop_server(process)
+    return {"revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "results": [asdict(result) for result in results]}
+
+
+def format_result(result: Result) -> str:
+    return (f"{result.name:<16} {result.rps:10.1f} req/s  "
+            f"p50 {result.p50_ms:8.2f} ms  p99 {result.p99_ms:8.2f} ms  "
+            f"p999 {result.p999_ms:8.2f} ms  errors {result.errors}")
+
+
+def compare(old_path: str, new_path: str) -> None:
+    old = {r["name"]: r for r in json.loads(Path(old_path).read_text())["results"]}
+    new = {r["name"]: r for r in json.loads(Path(new_path).read_text())["results"]}
+    print(f"{'scenario':<16}{'req/s':>22}{'p99 ms':>24}")
+    for name in new:
+        if name not in old:
+            continue
+        a, b = old[name], new[name]
+        print(f"{name:<16}{a['rps']:>10.1f} -> {b['rps']:<10.1f}"
+              f"{a['p99_ms']:>10.2f} -> {b['p99_ms']:<10.2f}"
+              f"({(b['rps'] / a['rps'] - 1) * 100:+.1f}% req/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--scenarios", nargs="*", choices=[s.name for s in SCENARIOS])
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="对比两个结果文件")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = asyncio.run(run(args))
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
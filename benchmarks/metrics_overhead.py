@@ -0,0 +1,49 @@
+"""延迟统计中间件对 `/` 处理器吞吐量的影响（目标 < 2%）
+
+交替启动关闭/开启指标的 app 服务若干轮，比较 req/s 的中位数::
+
+    python benchmarks/metrics_overhead.py --rounds 3 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+
+from loadtest import SCENARIOS, run_scenario, start_server, stop_server, wait_ready, free_port
+
+ROOT = next(s for s in SCENARIOS if s.name == "root")
+
+
+async def measure(enabled: bool, args) -> float:
+    os.environ["SANIC_BOOK_METRICS"] = "1" if enabled else "0"
+    port = free_port()
+    process = start_server("app", args.host, port, args.workers)
+    try:
+        await wait_ready(process, args.host, port, 30.0)
+        result = await run_scenario(ROOT, args.host, port, args.concurrency,
+                                    args.duration, args.warmup)
+    finally:
+        stop_server(process)
+    return result.rps
+
+
+async def main(args):
+    off, on = [], []
+    for _ in range(args.rounds):
+        off.append(await measure(False, args))
+        on.append(await measure(True, args))
+    baseline, instrumented = statistics.median(off), statistics.median(on)
+    print(f"metrics off: {baseline:10.1f} req/s")
+    print(f"metrics on : {instrumented:10.1f} req/s")
+    print(f"overhead   : {(1 - instrumented / baseline) * 100:+.2f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""对比 `page` 处理器的旧实现与 `PageRenderer` 的冷/热吞吐量
+
+用法::
+
+    python benchmarks/page_render.py --requests 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from string import Template
+
+APP_ROOT = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_ROOT))
+os.chdir(APP_ROOT)
+
+from utils.render import PageRenderer  # noqa: E402
+
+TAGS = ["", "about", "projects", "platable", "forms"]
+
+
+async def legacy(tag: str) -> str:
+    """原 `page` 处理器：每次请求都同步读取 3 个文件并重新解析模板"""
+    root = "configs/index" if tag == "" else f"configs/{tag}"
+    with open("templates/demo.html", encoding="utf-8") as fp:
+        context = fp.read()
+    with open(f"{root}/article.html", encoding="utf-8") as fp:
+        article = fp.read()
+    with open(f"{root}/aside.html", encoding="utf-8") as fp:
+        aside = fp.read()
+    return Template(context).substitute(article=article, aside=aside)
+
+
+async def drive(render, requests: int, concurrency: int) -> float:
+    queue = iter(range(requests))
+
+    async def worker():
+        for i in queue:
+            await render(TAGS[i % len(TAGS)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main(args):
+    results = {"legacy": await drive(legacy, args.requests, args.concurrency)}
+
+    async def cold(tag: str) -> str:
+        return await PageRenderer().render(tag)
+
+    results["cold"] = await drive(cold, args.requests, args.concurrency)
+    renderer = PageRenderer()
+    for tag in TAGS:  # 预热
+        await renderer.render(tag)
+    results["warm"] = await drive(renderer.render, args.requests, args.concurrency)
+    for name, rps in results.items():
+        print(f"{name:>8}: {rps:12.1f} req/s  ({rps / results['legacy']:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
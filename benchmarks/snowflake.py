@@ -0,0 +1,89 @@
+"""雪花 ID 生成吞吐量（单线程 / 多线程 / 多进程），并检查 ID 唯一性
+
+用法::
+
+    python benchmarks/snowflake.py --ids 200000 --threads 8 --processes 4
+"""
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]
+                       / "doc/integrations/GraphQL/Strawberry/tests"))
+
+from api.snowflake import Snowflake  # noqa: E402
+
+
+def report(name: str, ids: list[int], seconds: float) -> None:
+    unique = len(set(ids)) == len(ids)
+    print(f"{name:>24}: {len(ids) / seconds:14,.0f} ids/s  unique={unique}")
+    if not unique:
+        raise SystemExit(f"{name}: duplicate IDs")
+
+
+def single(n: int, batch: int) -> None:
+    generator = Snowflake()
+    start = time.perf_counter()
+    ids = [generator.next_id() for _ in range(n)]
+    report("next_id", ids, time.perf_counter() - start)
+
+    generator = Snowflake()
+    start = time.perf_counter()
+    ids = []
+    while len(ids) < n:
+        ids.extend(generator.next_ids(batch))
+    report(f"next_ids({batch})", ids, time.perf_counter() - start)
+
+
+def threads(n: int, count: int, batch: int) -> None:
+    generator = Snowflake()
+    results: list[list[int]] = [[] for _ in range(count)]
+
+    def work(out: list[int]) -> None:
+        while len(out) < n // count:
+            out.extend(generator.next_ids(batch))
+
+    workers = [threading.Thread(target=work, args=(out,)) for out in results]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    report(f"{count} threads", [i for out in results for i in out],
+           time.perf_counter() - start)
+
+
+def _process(args: tuple[int, int, int]) -> tuple[list[int], float]:
+    worker_id, n, batch = args
+    generator = Snowflake(worker_id=worker_id)
+    start = time.perf_counter()
+    ids: list[int] = []
+    while len(ids) < n:
+        ids.extend(generator.next_ids(batch))
+    return ids, time.perf_counter() - start
+
+
+def processes(n: int, count: int, batch: int) -> None:
+    with multiprocessing.Pool(count) as pool:
+        results = pool.map(_process, [(i, n // count, batch) for i in range(count)])
+    # 各进程并行运行，以最慢者计时
+    report(f"{count} processes", [i for ids, _ in results for i in ids],
+           max(seconds for _, seconds in results))
+
+
+def main(args):
+    single(args.ids, args.batch)
+    threads(args.ids, args.threads, args.batch)
+    processes(args.ids, args.processes, args.batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ids", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=min(4, multiprocessing.cpu_count()))
+    main(parser.parse_args())
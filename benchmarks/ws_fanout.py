@@ -0,0 +1,154 @@
+"""GraphQL 订阅的 WebSocket 扇出延迟
+
+启动 Strawberry 示例服务，建立 ``--connections`` 个 graphql-transport-ws 连接并订阅
+``group_changes``，再通过另一个连接执行 ``add_group`` 变更，统计每个订阅者
+收到事件的时刻与事件 ``published_at`` 之差（p50/p99/max）。
+
+用法::
+
+    python benchmarks/ws_fanout.py --connections 10000 --clients 4 --workers 2 --events 20
+
+订阅者分布在 ``--clients`` 个客户端进程中，避免单个客户端进程的处理速度成为瓶颈；
+客户端与服务在同一台机器上时会争用 CPU。连接数很大时需要调高 ``ulimit -n``。
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from websockets.asyncio.client import connect
+
+from loadtest import free_port, percentile, start_server, stop_server, wait_ready
+
+PROTOCOL = "graphql-transport-ws"
+PATH = "/v1.1/groups/subscriptions"
+SUBSCRIPTION = "subscription { group_changes { kind group_id published_at } }"
+MUTATION = 'mutation { add_group(name: "%s", number: "%s") { group_id } }'
+
+
+async def open_connection(url: str):
+    ws = await connect(url, subprotocols=[PROTOCOL], max_queue=None, open_timeout=60)
+    await ws.send(json.dumps({"type": "connection_init"}))
+    assert json.loads(await ws.recv())["type"] == "connection_ack"
+    return ws
+
+
+async def subscriber(ws, received: list[tuple[int, str]], wanted: int) -> None:
+    count = 0
+    async for raw in ws:
+        # 先只记录到达时刻，结束后再解码，减少客户端自身对延迟的影响
+        received.append((time.time_ns(), raw))
+        count += 1
+        if count == wanted:
+            return
+
+
+def latencies_of(received: list[tuple[int, str]]) -> list[int]:
+    """纳秒"""
+    latencies = []
+    for now, raw in received:
+        message = json.loads(raw)
+        if message["type"] != "next":
+            raise RuntimeError(raw)
+        published_at = message["payload"]["data"]["group_changes"]["published_at"]
+        latencies.append(now - int(published_at * 1e9))
+    return latencies
+
+
+async def client(url: str, connections: int, batch: int, wanted: int, timeout: float,
+                 ready, results) -> None:
+    sockets = []
+    for i in range(0, connections, batch):
+        sockets += await asyncio.gather(*(open_connection(url)
+                                          for _ in range(min(batch, connections - i))))
+    await asyncio.gather(*(ws.send(json.dumps({"type": "subscribe", "id": "1",
+                                               "payload": {"query": SUBSCRIPTION}}))
+                           for ws in sockets))
+    received: list[tuple[int, str]] = []
+    tasks = [asyncio.create_task(subscriber(ws, received, wanted)) for ws in sockets]
+    await asyncio.to_thread(ready.wait)
+    await asyncio.wait(tasks, timeout=timeout)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+    results.put(latencies_of(received))
+
+
+def client_main(*args) -> None:
+    asyncio.run(client(*args))
+
+
+async def publish(url: str, events: int, interval: float) -> None:
+    ws = await open_connection(url)
+    for n in range(events):
+        await ws.send(json.dumps({"type": "subscribe", "id": str(n), "payload": {
+            "query": MUTATION % (uuid.uuid4(), uuid.uuid4())}}))
+        await asyncio.sleep(interval)
+    await ws.close()
+
+
+def run(args) -> None:
+    port = free_port()
+    url = f"ws://{args.host}:{port}{PATH}"
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["GROUP_STORE"] = f"sqlite:///{tmp}/groups.db"
+        process = start_server("graphql", args.host, port, args.workers)
+        try:
+            asyncio.run(wait_ready(process, args.host, port, args.startup_timeout))
+            # 所有客户端订阅完成后，主进程才开始发布
+            ready = multiprocessing.Barrier(args.clients + 1)
+            results = multiprocessing.Queue()
+            shares = [args.connections // args.clients + (i < args.connections % args.clients)
+                      for i in range(args.clients)]
+            clients = [multiprocessing.Process(target=client_main, args=(
+                url, share, args.batch, args.events, args.timeout, ready, results))
+                for share in shares]
+            start = time.perf_counter()
+            for proc in clients:
+                proc.start()
+            ready.wait()
+            print(f"subscribed {args.connections} connections in {time.perf_counter() - start:.1f}s")
+            time.sleep(args.settle)
+            asyncio.run(publish(url, args.events, args.interval))
+            latencies = sorted(value for _ in clients for value in results.get())
+            for proc in clients:
+                proc.join()
+        finally:
+            stop_server(process)
+
+    print(f"received {len(latencies)}/{args.connections * args.events} events")
+    if latencies:
+        print(f"latency p50={percentile(latencies, 0.5):.1f}ms "
+              f"p99={percentile(latencies, 0.99):.1f}ms "
+              f"max={latencies[-1] / 1e6:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=4, help="客户端进程数")
+    parser.add_argument("--events", type=int, default=20, help="触发的变更次数")
+    parser.add_argument("--interval", type=float, default=0.5, help="变更之间的间隔（秒）")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--batch", type=int, default=500, help="每批并发建立的连接数")
+    parser.add_argument("--settle", type=float, default=1.0, help="订阅后等待的秒数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="客户端等待事件的最长秒数")
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    try:
+        import resource
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+    run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""持久化查询（APQ）与查询结果缓存
+
+- :class:`PersistedQueries`：sha256 -> 查询文档的注册表，兼容 Apollo APQ 协议；
+- :class:`ResultCache`：只读查询的 LRU 结果缓存，任何 mutation 执行后整体失效。
+
+解析与校验的缓存直接使用 Strawberry 自带的 ``ParserCache`` / ``ValidationCache``。
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from graphql import ExecutionResult
+from sanic.exceptions import BadRequest
+from sanic.request import Request
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+# APQ 客户端据此重新发送完整查询
+PERSISTED_QUERY_NOT_FOUND_ERROR = {"message": PERSISTED_QUERY_NOT_FOUND,
+                                   "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}}
+
+
+class PersistedQueries:
+    def __init__(self, maxsize: int = 4096, manifest: str | None = None):
+        self.maxsize = maxsize
+        self._queries: OrderedDict[str, str] = OrderedDict()
+        # 清单中的查询常驻，不参与淘汰
+        self._pinned: dict[str, str] = {}
+        if manifest:
+            self._pinned.update(json.loads(Path(manifest).read_text(encoding="utf-8")))
+
+    @staticmethod
+    def hash(query: str) -> str:
+        return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+    def get(self, sha256: str) -> str | None:
+        if (query := self._pinned.get(sha256)) is not None:
+            return query
+        if (query := self._queries.get(sha256)) is not None:
+            self._queries.move_to_end(sha256)
+        return query
+
+    def register(self, query: str) -> str:
+        sha256 = self.hash(query)
+        if sha256 not in self._pinned:
+            self._queries[sha256] = query
+            self._queries.move_to_end(sha256)
+            while len(self._queries) > self.maxsize:
+                self._queries.popitem(last=False)
+        return sha256
+
+    def apply(self, request: Request) -> dict | None:
+        """把 APQ 请求还原为普通请求
+
+        未注册的哈希返回 GraphQL 错误对象；请求格式错误时抛出 ``BadRequest``。
+        """
+        data = request.json
+        if not isinstance(data, dict):
+            return None
+        extensions = data.get("extensions")
+        if extensions is None:
+            return None
+        if not isinstance(extensions, dict):
+            raise BadRequest("extensions must be an object")
+        persisted = extensions.get("persistedQuery")
+        if persisted is None:
+            return None
+        if not isinstance(persisted, dict) or not isinstance(persisted.get("sha256Hash"), str):
+            raise BadRequest("persistedQuery must be an object with a sha256Hash string")
+        sha256 = persisted["sha256Hash"]
+        if query := data.get("query"):
+            if not isinstance(query, str) or self.hash(query) != sha256:
+                raise BadRequest("provided sha does not match query")
+            self.register(query)
+            return None
+        if (query := self.get(sha256)) is None:
+            return PERSISTED_QUERY_NOT_FOUND_ERROR
+        data["query"] = query
+        request.body = json.dumps(data).encode()
+        request.parsed_json = data
+        return None
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0  # 每次 clear 加一
+        self._results: OrderedDict[tuple, tuple[float, ExecutionResult]] = OrderedDict()
+
+    @staticmethod
+    def key(query: str, variables: dict[str, Any] | None,
+            operation_name: str | None) -> tuple:
+        return (query, json.dumps(variables, sort_keys=True, default=str), operation_name)
+
+    def get(self, key: tuple) -> ExecutionResult | None:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if time.monotonic() >= expires:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return result
+
+    def put(self, key: tuple, result: ExecutionResult) -> None:
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        self._results.clear()
+        self.generation += 1
+
+
+# PERSISTED_QUERIES 指向 {sha256: query} 形式的 JSON 清单
+persisted_queries = PersistedQueries(manifest=os.environ.get("PERSISTED_QUERIES"))
+result_cache = ResultCache()
+
+
+class ResultCacheExtension(SchemaExtension):
+    """命中时跳过执行；mutation 执行后清空结果缓存"""
+
+    def on_execute(self):
+        execution_context = self.execution_context
+        operation_type = execution_context.operation_type
+        key = None
+        generation = result_cache.generation
+        if operation_type is OperationType.QUERY:
+            key = ResultCache.key(execution_context.query,
+                                  execution_context.variables,
+                                  execution_context.operation_name)
+            if (cached := result_cache.get(key)) is not None:
+                execution_context.result = cached
+                key = None
+        yield
+        result = execution_context.result
+        if operation_type is OperationType.MUTATION:
+            result_cache.clear()
+        elif (key is not None and result is not None and not result.errors
+              and result_cache.generation == generation):
+            # 执行期间缓存被清空过，说明数据已变，结果不再缓存
+            result_cache.put(key, result)
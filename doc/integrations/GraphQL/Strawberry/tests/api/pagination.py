@@ -0,0 +1,55 @@
+"""Relay 风格的分组分页（基于雪花 ID 顺序的游标）"""
+import base64
+
+import strawberry
+
+from .storage import order_key
+from .types import Group
+
+CURSOR_PREFIX = "group:"
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(group_id: strawberry.ID) -> str:
+    return base64.urlsafe_b64encode(f"{CURSOR_PREFIX}{group_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+        if not value.startswith(CURSOR_PREFIX):
+            raise ValueError
+        return order_key(value.removeprefix(CURSOR_PREFIX))
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from None
+
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    has_previous_page: bool
+    start_cursor: str | None
+    end_cursor: str | None
+
+
+@strawberry.type
+class GroupEdge:
+    cursor: str
+    node: Group
+
+
+@strawberry.type
+class GroupConnection:
+    edges: list[GroupEdge]
+    page_info: PageInfo
+
+    @classmethod
+    def build(cls, groups: list[Group], has_next_page: bool,
+              has_previous_page: bool) -> "GroupConnection":
+        edges = [GroupEdge(cursor=encode_cursor(group.group_id), node=group)
+                 for group in groups]
+        return cls(edges=edges,
+                   page_info=PageInfo(has_next_page=has_next_page,
+                                      has_previous_page=has_previous_page,
+                                      start_cursor=edges[0].cursor if edges else None,
+                                      end_cursor=edges[-1].cursor if edges else None))
@@ -0,0 +1,240 @@
+"""分组的紧凑列式存储
+
+:class:`Group` 是 Strawberry 类型（普通 dataclass）：每个实例带一个 ``__dict__``，
+日期、UUID 也各是独立的对象，内存中保存大量分组时开销可观。:class:`GroupTable`
+把每个字段按列存放在 ``array``/``bytearray`` 中：
+
+- ``group_id`` 按 :func:`order_key` 存入有序的 ``array("q")``，同时充当分页索引；
+- ``number``、``name`` 为规范形式的 UUID 字符串时各占 16 字节，其他字符串另行保存；
+- 日期存为序数，读取时同一天复用同一个 ``date`` 对象；
+- ``description`` 多为空，只保存非空的值。
+
+只在读取时才构造 :class:`Group`，也就是解析器拿到数据的时候。
+"""
+import bisect
+import dataclasses
+import datetime
+from array import array
+from collections.abc import Iterable, Sequence
+
+import strawberry
+
+from .types import Group
+
+# 单次写入的新键少于该数量时逐个插入，否则合并后重建索引
+MERGE_THRESHOLD = 64
+
+
+def order_key(group_id: strawberry.ID) -> int:
+    """分组按雪花 ID 的数值排序；不是 64 位整数时抛出 ValueError"""
+    key = int(group_id)
+    if not -(1 << 63) <= key < 1 << 63:
+        raise ValueError(f"group_id out of range: {group_id!r}")
+    return key
+
+
+def lookup_key(group_id: strawberry.ID) -> int | None:
+    """查询用：无法解析的 group_id 不可能存在，返回 None"""
+    try:
+        return order_key(group_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_uuid(h: str) -> str:
+    """32 位十六进制转为规范形式"""
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _pack_uuid(value: str) -> bytes | None:
+    """规范形式（小写、带连字符）的 UUID 转为 16 字节，其他字符串返回 None"""
+    if len(value) != 36:
+        return None
+    try:
+        raw = bytes.fromhex(value.replace("-", ""))
+    except ValueError:
+        return None
+    return raw if len(raw) == 16 and _format_uuid(raw.hex()) == value else None
+
+
+class _Dates(dict):
+    """序数 -> date，同一天复用同一个对象"""
+
+    def __missing__(self, ordinal: int) -> datetime.date:
+        date = self[ordinal] = datetime.date.fromordinal(ordinal)
+        return date
+
+
+class GroupTable:
+    """按行号存放各列；行号在插入时分配，删除后复用"""
+
+    def __init__(self, groups: Iterable[Group] = ()):
+        self._keys = array("q")  # 有序的 order_key
+        self._rows = array("i")  # 与 _keys 一一对应的行号
+        self._free = array("i")  # 可复用的行号
+        self._size = 0  # 已分配的行数
+        self._ids: dict[int, str] = {}  # 行号 -> group_id，仅当它不等于 str(order_key) 时
+        self._uuids = bytearray()  # 每行 32 字节：number、name
+        self._other: dict[tuple[int, int], str] = {}  # (行号, 0/1) -> 不是规范 UUID 的 number/name
+        self._created = array("i")  # 日期序数
+        self._updated = array("i")
+        self._devices = array("q")
+        self._descriptions: dict[int, str] = {}
+        self._dates = _Dates()
+        self.put_many(groups)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, group_id: strawberry.ID) -> bool:
+        key = lookup_key(group_id)
+        return key is not None and self._index(key) >= 0
+
+    def _index(self, key: int) -> int:
+        keys = self._keys
+        i = bisect.bisect_left(keys, key)
+        return i if i < len(keys) and keys[i] == key else -1
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        row = self._size
+        self._size += 1
+        self._uuids += bytes(32)
+        self._created.append(0)
+        self._updated.append(0)
+        self._devices.append(0)
+        return row
+
+    def _write(self, row: int, key: int, group: Group) -> None:
+        group_id = str(group.group_id)
+        if group_id == str(key):
+            self._ids.pop(row, None)
+        else:
+            self._ids[row] = group_id
+        for column, value in enumerate((str(group.number), str(group.name))):
+            raw = _pack_uuid(value)
+            if raw is None:
+                self._other[row, column] = value
+            else:
+                self._other.pop((row, column), None)
+                start = row * 32 + column * 16
+                self._uuids[start:start + 16] = raw
+        self._created[row] = group.creation_time.toordinal()
+        self._updated[row] = group.update_time.toordinal()
+        self._devices[row] = group.device_number
+        description = group.description
+        if isinstance(description, str):
+            self._descriptions[row] = description
+        else:
+            self._descriptions.pop(row, None)
+
+    def _read(self, key: int, row: int) -> Group:
+        h = self._uuids[row * 32:row * 32 + 32].hex()
+        number = f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}"
+        name = f"{h[32:40]}-{h[40:44]}-{h[44:48]}-{h[48:52]}-{h[52:]}"
+        if self._other:
+            number = self._other.get((row, 0), number)
+            name = self._other.get((row, 1), name)
+        dates = self._dates
+        return Group(group_id=self._ids.get(row) or str(key),
+                     number=number,
+                     name=name,
+                     creation_time=dates[self._created[row]],
+                     update_time=dates[self._updated[row]],
+                     device_number=self._devices[row],
+                     description=self._descriptions.get(row))
+
+    def get(self, group_id: strawberry.ID) -> Group | None:
+        key = lookup_key(group_id)
+        i = -1 if key is None else self._index(key)
+        return None if i < 0 else self._read(key, self._rows[i])
+
+    def get_many(self, keys: Sequence[strawberry.ID]) -> list[Group | None]:
+        all_keys, rows, read = self._keys, self._rows, self._read
+        size = len(all_keys)
+        groups = []
+        for group_id in keys:
+            key = lookup_key(group_id)
+            if key is None:
+                groups.append(None)
+                continue
+            i = bisect.bisect_left(all_keys, key)
+            groups.append(read(key, rows[i]) if i < size and all_keys[i] == key else None)
+        return groups
+
+    def keys(self) -> list[strawberry.ID]:
+        if not self._ids:
+            return [str(key) for key in self._keys]
+        ids = self._ids
+        return [ids.get(row) or str(key) for key, row in zip(self._keys, self._rows)]
+
+    def page(self, after: int | None, limit: int) -> list[strawberry.ID]:
+        """按 order_key 升序返回 after 之后的至多 limit 个键"""
+        start = 0 if after is None else bisect.bisect_right(self._keys, after)
+        keys = self._keys[start:start + limit]
+        rows = self._rows[start:start + limit]
+        return [self._ids.get(row) or str(key) for key, row in zip(keys, rows)]
+
+    def put(self, group: Group) -> None:
+        self.put_many([group])
+
+    def put_many(self, groups: Iterable[Group]) -> None:
+        added: dict[int, int] = {}  # 新键 -> 行号
+        for group in groups:
+            key = order_key(group.group_id)
+            i = self._index(key)
+            if i >= 0:
+                row = self._rows[i]
+            else:
+                row = added.get(key)
+                if row is None:
+                    row = added[key] = self._allocate()
+            self._write(row, key, group)
+        if not added:
+            return
+        new = sorted(added.items())
+        keys, rows = self._keys, self._rows
+        if not keys or new[0][0] > keys[-1]:
+            # 雪花 ID 递增，新分组通常排在最后
+            keys.extend(key for key, _ in new)
+            rows.extend(row for _, row in new)
+        elif len(new) < MERGE_THRESHOLD:
+            for key, row in new:
+                i = bisect.bisect_left(keys, key)
+                keys.insert(i, key)
+                rows.insert(i, row)
+        else:
+            merged = sorted([*zip(keys, rows), *new])
+            self._keys = array("q", [key for key, _ in merged])
+            self._rows = array("i", [row for _, row in merged])
+
+    def update(self, group_id: strawberry.ID, **fields) -> Group | None:
+        group = self.get(group_id)
+        if group is None:
+            return None
+        group = dataclasses.replace(group, **fields)
+        self.put(group)
+        return group
+
+    def delete(self, group_id: strawberry.ID) -> bool:
+        key = lookup_key(group_id)
+        return key is not None and self.discard(key)
+
+    def discard(self, key: int) -> bool:
+        """按 order_key 删除"""
+        i = self._index(key)
+        if i < 0:
+            return False
+        row = self._rows[i]
+        del self._keys[i]
+        del self._rows[i]
+        self._ids.pop(row, None)
+        self._other.pop((row, 0), None)
+        self._other.pop((row, 1), None)
+        self._descriptions.pop(row, None)
+        self._free.append(row)
+        return True
+
+    def clear(self) -> None:
+        self.__init__()
@@ -1,104 +1,197 @@
+import os
+import time
 import uuid
 import datetime
+from collections.abc import AsyncGenerator
 from typing import Any
 import strawberry
 from strawberry.sanic.views import GraphQLView as _GraphQLView
 from strawberry.types import Info
 from strawberry.dataloader import DataLoader
+from strawberry.extensions import ParserCache, ValidationCache
 from strawberry.http.temporal_response import TemporalResponse
 from strawberry.schema.config import StrawberryConfig
 from sanic.request import Request
-from .snowflake import snowflake
+from sanic.response import HTTPResponse, json
+from sanic_book.graphql import OperationMetrics, QueryCost, Tracing
+from sanic_book.serialization import dumps
+from sanic_book.tracing import span
+from .caching import ResultCacheExtension, persisted_queries, result_cache
+from .pagination import MAX_PAGE_SIZE, GroupConnection, decode_cursor
+from .snowflake import Snowflake
+from .storage import CachedGroupStore, GroupStore, create_store, order_key
+from .types import Group, GroupChange
+
+
+# 存储后端：GROUP_STORE=sqlite:///groups.db（多 worker 共享）或 memory://（单进程）；
+# GROUP_STORE_CACHE=1 开启各 worker 的读缓存，并经共享内存接收其他 worker 的变更通知
+groups_store: GroupStore = create_store(
+    os.environ.get("GROUP_STORE", "sqlite:///groups.db"),
+    cache=os.environ.get("GROUP_STORE_CACHE", "1") == "1",
+    groups=[Group(group_id=group_id,
+                  number=str(number),
+                  name=str(name),
+                  creation_time=datetime.date.today(),
+                  update_time=datetime.date.today(),
+                  device_number=0)
+            for group_id, number, name in [("277218759112916992", uuid.UUID('{00010203-0405-0607-0809-0a0b0c0d0e0f}'), uuid.uuid1())]]
+)
+
+if isinstance(groups_store, CachedGroupStore):
+    # 其他 worker 写入后，本进程缓存的查询结果也随之失效
+    groups_store.listeners.append(lambda changes: result_cache.clear())
+
+
+GROUPS_TOPIC = "groups"
+
+
+def publish_change(info: Info, kind: str, group_id: strawberry.ID) -> None:
+    """把变更发给所有 worker 的订阅者（未启用 ``setup_pubsub`` 时忽略）"""
+    broker = info.context.get("broker")
+    if broker is not None:
+        broker.publish(GROUPS_TOPIC, {"kind": kind, "group_id": str(group_id),
+                                      "published_at": time.time()})
+
+
+def check_group_id(group_id: strawberry.ID) -> None:
+    """写操作的 group_id 必须是雪花 ID（64 位整数）"""
+    try:
+        order_key(group_id)
+    except ValueError:
+        raise ValueError(f"Invalid group_id {group_id!r}: expected a snowflake ID") from None
+
+
+def make_group_loader(store: GroupStore) -> DataLoader[strawberry.ID, Group]:
+    async def load_groups(keys: list[strawberry.ID]) -> list[Group | ValueError]:
+        with span("dataloader.groups", keys=len(keys)):
+            groups = await store.get_many(keys)
+        return [ValueError("not found") if group is None else group for group in groups]
+    return DataLoader(load_fn=load_groups)
 
 
-@strawberry.type
-class Group:
-    group_id: strawberry.ID  # 分组 ID (递增主键，雪花算法生成) snowflake()
-    number: strawberry.ID  # 分组编号（唯一）
-    name: strawberry.ID  # 分组名称（唯一）
-    creation_time: datetime.date  # 创建时间
-    update_time: datetime.date  # 更新时间
-    device_number: int = 0  # 组内设备数
-    description: str | None = strawberry.UNSET  # 组描述
-
-
-groups_database = {group_id: Group(group_id=group_id,
-                                   number=number,
-                                   name=name,
-                                   creation_time=datetime.date.today(),
-                                   update_time=datetime.date.today(),
-                                   device_number=0)
-                   for group_id, number, name in [("277218759112916992", uuid.UUID('{00010203-0405-0607-0809-0a0b0c0d0e0f}'), uuid.uuid1())]}
-
-
-async def load_groups(keys: list[strawberry.ID]) -> list[Group | ValueError]:
-    def lookup(key: strawberry.ID) -> Group | ValueError:
-        if user := groups_database.get(key):
-            print(user)
-            return user
-        return ValueError("not found")
-    return [lookup(key) for key in keys]
+class GraphQLView(_GraphQLView):
+    async def post(self, request: Request) -> HTTPResponse:
+        if (error := persisted_queries.apply(request)) is not None:
+            return json({"errors": [error]})
+        return await super().post(request)
 
+    def encode_json(self, data: object) -> bytes:
+        return dumps(data)
 
-class GraphQLView(_GraphQLView):
     async def get_context(self, request: Request, response: TemporalResponse) -> Any:
-        return {"device_loader": DataLoader(load_fn=load_groups)}
+        if isinstance(groups_store, CachedGroupStore):
+            groups_store.refresh()  # 在结果缓存命中之前处理其他 worker 的变更
+        return {"request": request,
+                "device_loader": make_group_loader(groups_store),
+                "store": groups_store,
+                "snowflake": request.app.ctx.snowflake,
+                "broker": getattr(request.app.ctx, "broker", None)}
+
+
+async def subscription_context(app) -> dict[str, Any]:
+    """订阅执行时共用的 context（不绑定某个请求）"""
+    return {"device_loader": make_group_loader(groups_store),
+            "store": groups_store,
+            "snowflake": app.ctx.snowflake,
+            "broker": app.ctx.broker}
 
 
 @strawberry.type
 class Query:
     @strawberry.field
     async def group(self, group_id: strawberry.ID, info: Info) -> Group:
-        print(f"ID: {id}, {type(id)}")
         return await info.context["device_loader"].load(group_id)
 
     @strawberry.field
     async def groups(self, info: Info) -> list[Group]:
-        return [await info.context["device_loader"].load(group_id) for group_id in groups_database.keys()]
+        keys = await info.context["store"].keys()
+        return await info.context["device_loader"].load_many(keys)
 
-
-@strawberry.input
-class AddGroupInput:
-    group_id: strawberry.ID  # 分组 ID (递增主键，雪花算法生成) snowflake()
-    number: strawberry.ID  # 分组编号（唯一）
-    name: strawberry.ID  # 分组名称（唯一）
-    creation_time: datetime.date  # 创建时间
-    update_time: datetime.date  # 更新时间
-    device_number: int = 0  # 组内设备数
-    description: str | None = strawberry.UNSET  # 组描述
+    @strawberry.field
+    async def groups_connection(self, info: Info, first: int = 100,
+                                after: str | None = None) -> GroupConnection:
+        """按 group_id 顺序分页，``after`` 为上一页的 ``end_cursor``"""
+        first = max(0, min(first, MAX_PAGE_SIZE))
+        after_key = None if after is None else decode_cursor(after)
+        # 多取一个用于判断是否还有下一页
+        keys = await info.context["store"].page(after_key, first + 1)
+        groups = await info.context["device_loader"].load_many(keys[:first])
+        return GroupConnection.build(groups,
+                                     has_next_page=len(keys) > first,
+                                     has_previous_page=after is not None)
 
 
 @strawberry.type
 class Mutation:
     @strawberry.mutation
-    def add_group(self, group_id: strawberry.ID, name: str, number: str) -> Group:
-        g = AddGroupInput(group_id=snowflake(),
-                          number=uuid.UUID(number),
-                          name=uuid.UUID(name),
-                          creation_time=datetime.date.today(),
-                          update_time=datetime.date.today(),
-                          device_number=0
-                          )
-        groups_database[group_id] = g
+    async def add_group(self, name: str, number: str, info: Info,
+                        group_id: strawberry.ID | None = None) -> Group:
+        if group_id is None:
+            generator: Snowflake = info.context["snowflake"]
+            group_id = strawberry.ID(str(await generator.anext_id()))
+        else:
+            check_group_id(group_id)
+        # 校验并统一为规范形式的 UUID 字符串，便于紧凑存储
+        g = Group(group_id=group_id,
+                  number=str(uuid.UUID(number)),
+                  name=str(uuid.UUID(name)),
+                  creation_time=datetime.date.today(),
+                  update_time=datetime.date.today(),
+                  device_number=0
+                  )
+        await info.context["store"].put(g)
+        publish_change(info, "added", g.group_id)
         return g
 
     @strawberry.mutation
-    def delete_group(self, group_id: strawberry.ID) -> int:
-        groups_database.pop(group_id)
+    async def delete_group(self, group_id: strawberry.ID, info: Info) -> int:
+        check_group_id(group_id)
+        await info.context["store"].delete(group_id)
+        publish_change(info, "deleted", group_id)
         return 204
 
     @strawberry.mutation
-    def change_update_time(self, group_id: strawberry.ID, update_time: datetime.date) -> Group:
-        g = groups_database.get(group_id)
-        g.update_time = update_time
-        return g
+    async def change_update_time(self, group_id: strawberry.ID, update_time: datetime.date, info: Info) -> Group:
+        check_group_id(group_id)
+        group = await info.context["store"].update(group_id, update_time=update_time)
+        publish_change(info, "updated", group_id)
+        return group
 
     @strawberry.mutation
-    def change_device_number(self, group_id: strawberry.ID, device_number: int) -> Group:
-        g = groups_database.get(group_id)
-        g.device_number = device_number
-        return g
+    async def change_device_number(self, group_id: strawberry.ID, device_number: int, info: Info) -> Group:
+        check_group_id(group_id)
+        group = await info.context["store"].update(group_id, device_number=device_number)
+        publish_change(info, "updated", group_id)
+        return group
 
 
-schema = strawberry.Schema(query=Query, mutation=Mutation,
-                           config=StrawberryConfig(auto_camel_case=False))
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def group_changes(self, info: Info,
+                            group_id: strawberry.ID | None = None) -> AsyncGenerator[GroupChange, None]:
+        """分组的增删改；指定 group_id 时只推送该分组"""
+        async for event in info.context["broker"].listen(GROUPS_TOPIC):
+            if group_id is None or event["group_id"] == group_id:
+                yield GroupChange(**event)
+
+
+class GroupQueryCost(QueryCost):
+    """GRAPHQL_MAX_COST 为单次操作的成本上限；``groups`` 按 1000 个分组估算，
+    ``groups_connection`` 按 ``first`` 估算。GRAPHQL_TIMEOUT、GRAPHQL_RESOLVER_TIMEOUT
+    分别为整个查询与单个解析器的时限（秒）。"""
+    max_cost = int(os.environ.get("GRAPHQL_MAX_COST", "10000"))
+    list_sizes = {"Query.groups": 1000}
+    operation_timeout = float(os.environ.get("GRAPHQL_TIMEOUT", "10"))
+    resolver_timeout = float(os.environ.get("GRAPHQL_RESOLVER_TIMEOUT", "5"))
+
+
+schema = strawberry.Schema(query=Query, mutation=Mutation, subscription=Subscription,
+                           config=StrawberryConfig(auto_camel_case=False),
+                           # 两个缓存都按 maxsize 在模块级共享，每次请求新建扩展对象也不影响命中
+                           extensions=[lambda: ParserCache(maxsize=256),
+                                       lambda: ValidationCache(maxsize=256),
+                                       GroupQueryCost,
+                                       Tracing,
+                                       ResultCacheExtension,
+                                       OperationMetrics])
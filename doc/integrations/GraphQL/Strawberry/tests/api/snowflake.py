@@ -1,14 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""雪花算法 ID 生成器
 
+每个 Sanic worker 进程在启动时从共享状态中领取唯一的 worker ID，
+进程内由 :class:`Snowflake` 实例加锁生成 ID，可按批领取。
+"""
+import asyncio
 import multiprocessing
-import re
 import threading
 import time
 
-LAST_TIMESTAMP = -1
-SEQUENCE = 0
-
 WORKER_ID_BITS = 5
 DATACENTER_ID_BITS = 5
 MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
@@ -22,98 +23,127 @@ SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
 
 EPOCH = time.mktime((2021, 1, 1, 0, 0, 0, 0, 0, 0))
 
-RE_PATTERN = re.compile(r"\d+")
-
-
-def has_digit(s: str) -> bool:
-    return bool(RE_PATTERN.search(s))
-
-
-def gen_worker_id(s: str) -> int:
-    return int("".join(RE_PATTERN.findall(s)))
-
 
 def get_timestamp() -> int:
-    now = int((time.time()) * 1000)
-    return now
-
-
-def til_next_millis(last: int) -> int:
-    timestamp = get_timestamp()
-    while timestamp <= last:
-        timestamp = get_timestamp()
-    return timestamp
-
-
-def snowflake(worker_id: int = 0, datacenter_id: int = 0, epoch: int = None) -> int:
-    global LAST_TIMESTAMP, SEQUENCE
-
-    if epoch is None:
-        epoch = globals()["EPOCH"]
-
-    proc = multiprocessing.current_process()
-    thread = threading.current_thread()
-    if worker_id == 0:
-        name = ""
-        if proc.name != "MainProcess" and has_digit(proc.name):
-            name += proc.name
-        if thread.name != "MainThread" and has_digit(thread.name):
-            name += thread.name
-        if name:
-            worker_id = gen_worker_id(name)
-
-    worker_id &= MAX_WORKER_ID
-    datacenter_id &= MAX_DATACENTER_ID
-
-    timestamp = get_timestamp()
-    if timestamp < LAST_TIMESTAMP:
-        raise ValueError("Clock moved backwards")
-
-    if timestamp == LAST_TIMESTAMP:
-        SEQUENCE = (SEQUENCE + 1) & SEQUENCE_MASK
-        if SEQUENCE == 0:
-            timestamp = til_next_millis(LAST_TIMESTAMP)
-    else:
-        SEQUENCE = 0
-
-    LAST_TIMESTAMP = timestamp
-    timestamp = timestamp - (int(epoch * 1000))
-
-    return (
-        (timestamp << TIMESTAMP_LEFT_SHIFT)
-        | (datacenter_id << DATACENTER_ID_SHIFT)
-        | (worker_id << WORKER_ID_SHIFT)
-        | SEQUENCE
-    )
+    return time.time_ns() // 1_000_000
+
+
+class Snowflake:
+    """线程安全的雪花 ID 生成器
+
+    同一毫秒内序列号用尽时休眠到下一毫秒，而不是忙等。
+    """
+
+    def __init__(self, worker_id: int = 0, datacenter_id: int = 0,
+                 epoch: float = EPOCH):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be in [0, {MAX_WORKER_ID}]")
+        if not 0 <= datacenter_id <= MAX_DATACENTER_ID:
+            raise ValueError(f"datacenter_id must be in [0, {MAX_DATACENTER_ID}]")
+        self.worker_id = worker_id
+        self.datacenter_id = datacenter_id
+        self.epoch = int(epoch * 1000)
+        self._node = (datacenter_id << DATACENTER_ID_SHIFT) | (worker_id << WORKER_ID_SHIFT)
+        self._lock = threading.Lock()
+        self._last_timestamp = -1
+        self._sequence = 0
+
+    def _reserve(self, n: int) -> tuple[list[int], float]:
+        """尽可能在当前毫秒内领取 n 个 ID
+
+        返回领到的 ID 以及领取剩余部分前需要等待的秒数。
+        """
+        with self._lock:
+            timestamp = get_timestamp()
+            if timestamp < self._last_timestamp:
+                raise ValueError("Clock moved backwards")
+            if timestamp == self._last_timestamp:
+                start = self._sequence + 1
+            else:
+                start = 0
+            count = min(n, SEQUENCE_MASK + 1 - start)
+            if count <= 0:
+                return [], (self._last_timestamp + 1) / 1000 - time.time_ns() / 1e9
+            self._last_timestamp = timestamp
+            self._sequence = start + count - 1
+            prefix = ((timestamp - self.epoch) << TIMESTAMP_LEFT_SHIFT) | self._node
+            return [prefix | sequence for sequence in range(start, start + count)], 0.0
+
+    def next_ids(self, n: int) -> list[int]:
+        ids: list[int] = []
+        while len(ids) < n:
+            batch, wait = self._reserve(n - len(ids))
+            ids.extend(batch)
+            if wait > 0:
+                time.sleep(wait)
+        return ids
+
+    def next_id(self) -> int:
+        return self.next_ids(1)[0]
+
+    async def anext_ids(self, n: int) -> list[int]:
+        """:meth:`next_ids` 的异步版本，等待时钟时让出事件循环"""
+        ids: list[int] = []
+        while len(ids) < n:
+            batch, wait = self._reserve(n - len(ids))
+            ids.extend(batch)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return ids
+
+    async def anext_id(self) -> int:
+        return (await self.anext_ids(1))[0]
+
+
+_generators: dict[tuple[int, int, float], Snowflake] = {}
+_generators_lock = threading.Lock()
+
+
+def snowflake(worker_id: int = 0, datacenter_id: int = 0, epoch: float | None = None) -> int:
+    """兼容旧接口：按 (worker_id, datacenter_id, epoch) 复用生成器"""
+    key = (worker_id & MAX_WORKER_ID, datacenter_id & MAX_DATACENTER_ID,
+           EPOCH if epoch is None else epoch)
+    generator = _generators.get(key)
+    if generator is None:
+        with _generators_lock:
+            generator = _generators.setdefault(key, Snowflake(*key))
+    return generator.next_id()
+
+
+def setup_snowflake(app, datacenter_id: int = 0) -> None:
+    """为每个 worker 进程分配唯一的 worker ID，生成器挂在 ``app.ctx.snowflake``
+
+    主进程在 ``app.shared_ctx`` 中建立 worker 槽位表，worker 启动时领取空闲槽位，
+    停止时归还，因此重启的 worker 不会与仍在运行的 worker 冲突。
+    """
+    @app.main_process_start
+    async def snowflake_slots(app):
+        app.shared_ctx.snowflake_slots = multiprocessing.Array("b", MAX_WORKER_ID + 1)
+
+    @app.before_server_start
+    async def snowflake_acquire(app):
+        slots = getattr(app.shared_ctx, "snowflake_slots", None)
+        if slots is None:
+            # 单进程模式不执行 main_process_start
+            slots = multiprocessing.Array("b", MAX_WORKER_ID + 1)
+        app.ctx.snowflake_slots = slots
+        with slots.get_lock():
+            try:
+                worker_id = slots[:].index(0)
+            except ValueError:
+                raise RuntimeError(f"At most {MAX_WORKER_ID + 1} workers are supported") from None
+            slots[worker_id] = 1
+        app.ctx.snowflake = Snowflake(worker_id, datacenter_id)
+
+    @app.after_server_stop
+    async def snowflake_release(app):
+        slots = app.ctx.snowflake_slots
+        with slots.get_lock():
+            slots[app.ctx.snowflake.worker_id] = 0
 
 
 if __name__ == "__main__":
-    uuid = snowflake()
-    print(uuid)
-    ids = [snowflake() for _ in range(10)]
+    generator = Snowflake()
+    print(generator.next_id())
+    ids = generator.next_ids(10_000)
     print(len(ids) == len(set(ids)))
-
-    processes = [
-        multiprocessing.Process(target=snowflake)
-        for _ in range(multiprocessing.cpu_count() * 2 + 1)
-    ]
-    for p in processes:
-        p.start()
-    for p in processes:
-        p.join()
-
-    results = []
-    with multiprocessing.Pool(4) as pool:
-        for _ in range(10):
-            res = pool.apply_async(snowflake)
-            results.append(res.get())
-    print(len(results) == len(set(results)))
-
-    threads = [
-        threading.Thread(target=snowflake)
-        for _ in range(multiprocessing.cpu_count() * 2 + 1)
-    ]
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
\ No newline at end of file
@@ -0,0 +1,384 @@
+"""分组数据的异步存储后端
+
+解析器只通过 :class:`GroupStore` 的批量接口访问数据，
+阻塞的 SQLite 调用都放到线程池中执行。
+
+多 worker 部署时使用 ``sqlite:///groups.db``（WAL 模式，各 worker 共享同一个文件）
+并开启 :class:`CachedGroupStore`：读请求命中本进程缓存，写请求经
+:class:`ChangeFeed`（共享内存中的环形变更日志）通知其他 worker 失效对应条目。
+``memory://`` 只在单进程内有效。
+"""
+import abc
+import asyncio
+import dataclasses
+import datetime
+import multiprocessing
+import sqlite3
+import threading
+from collections.abc import Callable, Iterable, Sequence
+
+import strawberry
+
+from .records import GroupTable, lookup_key, order_key
+from .types import Group
+
+# SQLite 单条语句的参数个数上限（旧版本为 999）
+SQLITE_MAX_VARIABLES = 900
+
+
+class GroupStore(abc.ABC):
+    @abc.abstractmethod
+    async def get_many(self, keys: Sequence[strawberry.ID]) -> list[Group | None]:
+        """按 keys 的顺序返回分组，不存在的位置为 None"""
+
+    @abc.abstractmethod
+    async def keys(self) -> list[strawberry.ID]:
+        ...
+
+    @abc.abstractmethod
+    async def page(self, after: int | None, limit: int) -> list[strawberry.ID]:
+        """按 :func:`order_key` 升序返回 after 之后的至多 limit 个键"""
+
+    @abc.abstractmethod
+    async def put(self, group: Group) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def update(self, group_id: strawberry.ID, **fields) -> Group | None:
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, group_id: strawberry.ID) -> bool:
+        ...
+
+    async def get(self, group_id: strawberry.ID) -> Group | None:
+        return (await self.get_many([group_id]))[0]
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryGroupStore(GroupStore):
+    def __init__(self, groups: Iterable[Group] = ()):
+        self._table = GroupTable(groups)
+
+    async def get_many(self, keys):
+        return self._table.get_many(keys)
+
+    async def keys(self):
+        return self._table.keys()
+
+    async def page(self, after, limit):
+        return self._table.page(after, limit)
+
+    async def put(self, group):
+        self._table.put(group)
+
+    async def update(self, group_id, **fields):
+        return self._table.update(group_id, **fields)
+
+    async def delete(self, group_id):
+        return self._table.delete(group_id)
+
+
+class SQLiteGroupStore(GroupStore):
+    COLUMNS = ("group_id", "number", "name", "creation_time",
+               "update_time", "device_number", "description")
+
+    def __init__(self, path: str = ":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            # 多个 worker 共享同一文件：WAL 下读写互不阻塞，写冲突时等待而不是报错
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS groups ("
+                "group_id TEXT PRIMARY KEY, number TEXT NOT NULL, name TEXT NOT NULL, "
+                "creation_time TEXT NOT NULL, update_time TEXT NOT NULL, "
+                "device_number INTEGER NOT NULL DEFAULT 0, description TEXT)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS groups_order ON groups (CAST(group_id AS INTEGER))"
+            )
+
+    @staticmethod
+    def _to_row(group: Group) -> tuple:
+        description = group.description
+        return (str(group.group_id), str(group.number), str(group.name),
+                group.creation_time.isoformat(), group.update_time.isoformat(),
+                group.device_number,
+                None if description is strawberry.UNSET else description)
+
+    @staticmethod
+    def _from_row(row: tuple) -> Group:
+        group_id, number, name, creation_time, update_time, device_number, description = row
+        return Group(group_id=strawberry.ID(group_id),
+                     number=strawberry.ID(number),
+                     name=strawberry.ID(name),
+                     creation_time=datetime.date.fromisoformat(creation_time),
+                     update_time=datetime.date.fromisoformat(update_time),
+                     device_number=device_number,
+                     description=description)
+
+    def _run(self, fn, *args):
+        def call():
+            with self._lock:
+                return fn(*args)
+        return asyncio.to_thread(call)
+
+    def _get_many(self, keys: Sequence[str]) -> list[Group | None]:
+        found: dict[str, Group] = {}
+        columns = ", ".join(self.COLUMNS)
+        for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            chunk = keys[i:i + SQLITE_MAX_VARIABLES]
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM groups WHERE group_id IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for row in rows:
+                found[row[0]] = self._from_row(row)
+        return [found.get(key) for key in keys]
+
+    async def get_many(self, keys):
+        return await self._run(self._get_many, [str(key) for key in keys])
+
+    async def keys(self):
+        rows = await self._run(lambda: self._conn.execute("SELECT group_id FROM groups").fetchall())
+        return [strawberry.ID(row[0]) for row in rows]
+
+    def _page(self, after: int | None, limit: int) -> list[tuple[str]]:
+        if after is None:
+            return self._conn.execute(
+                "SELECT group_id FROM groups ORDER BY CAST(group_id AS INTEGER) LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return self._conn.execute(
+            "SELECT group_id FROM groups WHERE CAST(group_id AS INTEGER) > ? "
+            "ORDER BY CAST(group_id AS INTEGER) LIMIT ?",
+            (after, limit),
+        ).fetchall()
+
+    async def page(self, after, limit):
+        rows = await self._run(self._page, after, limit)
+        return [strawberry.ID(row[0]) for row in rows]
+
+    def _put_many(self, groups: Iterable[Group], replace: bool = True) -> None:
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._conn:
+            self._conn.executemany(
+                f"{verb} INTO groups VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                map(self._to_row, groups),
+            )
+
+    async def put(self, group):
+        await self._run(self._put_many, [group])
+
+    async def put_many(self, groups: Iterable[Group]) -> None:
+        await self._run(self._put_many, list(groups))
+
+    def _update(self, group_id: str, fields: dict) -> Group | None:
+        # 读-改-写放在同一个 IMMEDIATE 事务中，避免与其他 worker 的更新互相覆盖
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._get_many([group_id])
+            if rows[0] is None:
+                self._conn.rollback()
+                return None
+            group = dataclasses.replace(rows[0], **fields)
+            self._put_many([group])
+        except BaseException:
+            self._conn.rollback()
+            raise
+        return group
+
+    async def update(self, group_id, **fields):
+        return await self._run(self._update, str(group_id), fields)
+
+    def _delete(self, group_id: str) -> bool:
+        with self._conn:
+            return self._conn.execute(
+                "DELETE FROM groups WHERE group_id = ?", (group_id,)
+            ).rowcount > 0
+
+    async def delete(self, group_id):
+        return await self._run(self._delete, str(group_id))
+
+    async def close(self):
+        await self._run(self._conn.close)
+
+
+class ChangeFeed:
+    """跨 worker 的变更通知
+
+    共享内存中保存一个单调递增的序号和最近 ``size`` 条变更的 :func:`order_key`；
+    写入方加锁追加，读取方比较序号即可知道是否有变化，无需加锁。
+    落后超过 ``size`` 条时只能整体失效。
+    """
+
+    ALL = -1  # 整体失效
+
+    def __init__(self, shared: dict):
+        self._seq = shared["group_changes_seq"]
+        self._ring = shared["group_changes_ring"]
+        self._lock = shared["group_changes_lock"]
+        self.size = len(self._ring)
+        self.seen = self._seq.value
+
+    @staticmethod
+    def allocate(size: int = 4096) -> dict:
+        """在主进程中分配共享内存，返回值保存到 ``app.shared_ctx``"""
+        return {"group_changes_seq": multiprocessing.RawValue("Q", 0),
+                "group_changes_ring": multiprocessing.RawArray("q", size),
+                "group_changes_lock": multiprocessing.Lock()}
+
+    @property
+    def seq(self) -> int:
+        return self._seq.value
+
+    def publish(self, keys: Iterable[int]) -> None:
+        with self._lock:
+            seq = self._seq.value
+            for key in keys:
+                seq += 1
+                self._ring[seq % self.size] = key
+            # 先写环形缓冲再更新序号，读取方看到新序号时条目已就绪
+            self._seq.value = seq
+
+    def poll(self) -> set[int] | None:
+        """返回上次调用以来变更的键；None 表示需要整体失效"""
+        seq = self._seq.value
+        if seq == self.seen:
+            return set()
+        if seq - self.seen > self.size:
+            changes = None
+        else:
+            changes = {self._ring[i % self.size] for i in range(self.seen + 1, seq + 1)}
+            if self.ALL in changes:
+                changes = None
+        self.seen = seq
+        return changes
+
+
+class CachedGroupStore(GroupStore):
+    """跨请求的读缓存，写操作同步失效
+
+    缓存的分组保存在 :class:`GroupTable` 中，读取时才构造 :class:`Group`。
+
+    设置 :attr:`feed` 后，本进程的写入会通知其他 worker，读取前也会先处理
+    其他 worker 的变更；``listeners`` 在发生外部变更时被调用（例如清空结果缓存）。
+    """
+
+    def __init__(self, backend: GroupStore):
+        self.backend = backend
+        self.feed: ChangeFeed | None = None
+        self.listeners: list[Callable[[set[int] | None], None]] = []
+        self._cache = GroupTable()
+        self._keys: list[strawberry.ID] | None = None
+
+    def refresh(self) -> int | None:
+        """处理其他 worker 的变更，返回当前序号（未接入变更通知时为 None）"""
+        if self.feed is None:
+            return None
+        changes = self.feed.poll()
+        if changes == set():
+            return self.feed.seen
+        self._keys = None
+        if changes is None:
+            self._cache.clear()
+        else:
+            for key in changes:
+                self._cache.discard(key)
+        for listener in self.listeners:
+            listener(changes)
+        return self.feed.seen
+
+    async def get_many(self, keys):
+        seq = self.refresh()
+        found = self._cache.get_many(keys)
+        missing = [key for key, group in zip(keys, found) if group is None]
+        if not missing:
+            return found
+        groups = [group for group in await self.backend.get_many(missing) if group is not None]
+        # 读取期间若有变更，结果可能已过期，只返回不缓存
+        if self.feed is None or self.feed.seq == seq:
+            self._cache.put_many(groups)
+        fetched = {order_key(group.group_id): group for group in groups}
+        return [group or fetched.get(lookup_key(key)) for key, group in zip(keys, found)]
+
+    async def keys(self):
+        seq = self.refresh()
+        if self._keys is not None:
+            return list(self._keys)
+        keys = await self.backend.keys()
+        if self.feed is None or self.feed.seq == seq:
+            self._keys = keys
+        return list(keys)
+
+    async def page(self, after, limit):
+        return await self.backend.page(after, limit)
+
+    def invalidate(self, group_id: strawberry.ID | None = None) -> None:
+        self._keys = None
+        if group_id is None:
+            self._cache.clear()
+        else:
+            self._cache.delete(group_id)
+        key = ChangeFeed.ALL if group_id is None else lookup_key(group_id)
+        if self.feed is not None and key is not None:
+            self.feed.publish([key])
+
+    async def put(self, group):
+        await self.backend.put(group)
+        self.invalidate(group.group_id)
+
+    async def update(self, group_id, **fields):
+        group = await self.backend.update(group_id, **fields)
+        self.invalidate(group_id)
+        return group
+
+    async def delete(self, group_id):
+        deleted = await self.backend.delete(group_id)
+        self.invalidate(group_id)
+        return deleted
+
+    async def close(self):
+        await self.backend.close()
+
+
+def create_store(url: str = "memory://", cache: bool = False,
+                 groups: Iterable[Group] = ()) -> GroupStore:
+    """按 URL 创建存储：``memory://``、``sqlite:///groups.db`` 或 ``sqlite:////abs/groups.db``"""
+    if url.startswith("memory://"):
+        store: GroupStore = MemoryGroupStore(groups)
+    elif url.startswith("sqlite://"):
+        store = SQLiteGroupStore(url.removeprefix("sqlite://").removeprefix("/") or ":memory:")
+        # 文件可能已被其他 worker 写入，初始数据不覆盖已有记录
+        store._put_many(groups, replace=False)
+    else:
+        raise ValueError(f"Unsupported group store: {url}")
+    return CachedGroupStore(store) if cache else store
+
+
+def setup_group_store(app, store: GroupStore, size: int = 4096) -> None:
+    """为 store 接入跨 worker 的变更通知（需要 ``CachedGroupStore``）"""
+    from sanic.log import logger
+
+    @app.main_process_start
+    async def group_changes_allocate(app):
+        for key, value in ChangeFeed.allocate(size).items():
+            setattr(app.shared_ctx, key, value)
+
+    @app.before_server_start
+    async def group_changes_attach(app):
+        if not isinstance(store, CachedGroupStore):
+            logger.warning("Group store has no read cache; cross-worker notifications are disabled")
+            return
+        if isinstance(store.backend, MemoryGroupStore) and app.state.workers > 1:
+            logger.warning("memory:// group store is per-process; use sqlite:///groups.db with multiple workers")
+        if "group_changes_seq" not in vars(app.shared_ctx):
+            # 单进程模式不执行 main_process_start，也没有需要通知的其他 worker
+            return
+        store.feed = ChangeFeed(vars(app.shared_ctx))
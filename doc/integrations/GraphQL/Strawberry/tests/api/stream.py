@@ -0,0 +1,41 @@
+"""以 NDJSON 分块流式返回全部分组
+
+每一行是一页分组（JSON 数组），客户端可以边收边处理，
+服务端内存占用只与页大小有关，而与分组总数无关。
+"""
+from sanic import Blueprint, Request
+from sanic.exceptions import BadRequest
+from sanic_book.serialization import dumps
+
+from .pagination import MAX_PAGE_SIZE, encode_cursor
+from .schema import groups_store
+from .storage import GroupStore, order_key
+
+groups_stream = Blueprint("groups_stream", url_prefix="/groups")
+
+
+async def iter_pages(store: GroupStore, page_size: int, after: int | None = None):
+    while True:
+        keys = await store.page(after, page_size)
+        if not keys:
+            return
+        yield [group for group in await store.get_many(keys) if group is not None]
+        if len(keys) < page_size:
+            return
+        after = order_key(keys[-1])
+
+
+@groups_stream.get("/stream")
+async def stream_groups(request: Request):
+    try:
+        page_size = int(request.args.get("page_size", MAX_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("page_size must be an integer")
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    response = await request.respond(content_type="application/x-ndjson")
+    async for groups in iter_pages(groups_store, page_size):
+        # Group 对象直接编码，无需先转换为 dict
+        line = {"cursor": encode_cursor(groups[-1].group_id) if groups else None,
+                "groups": groups}
+        await response.send(dumps(line) + b"\n")
+    await response.eof()
@@ -0,0 +1,43 @@
+import datetime
+import strawberry
+
+
+@strawberry.type
+class Group:
+    group_id: strawberry.ID  # 分组 ID (递增主键，雪花算法生成) snowflake()
+    number: strawberry.ID  # 分组编号（唯一）
+    name: strawberry.ID  # 分组名称（唯一）
+    creation_time: datetime.date  # 创建时间
+    update_time: datetime.date  # 更新时间
+    device_number: int = 0  # 组内设备数
+    description: str | None = strawberry.UNSET  # 组描述
+
+
+@strawberry.input
+class AddGroupInput:
+    group_id: strawberry.ID  # 分组 ID (递增主键，雪花算法生成) snowflake()
+    number: strawberry.ID  # 分组编号（唯一）
+    name: strawberry.ID  # 分组名称（唯一）
+    creation_time: datetime.date  # 创建时间
+    update_time: datetime.date  # 更新时间
+    device_number: int = 0  # 组内设备数
+    description: str | None = strawberry.UNSET  # 组描述
+
+
+@strawberry.type
+class GroupChange:
+    """分组变更事件，经订阅 ``group_changes`` 推送"""
+    kind: str  # added / updated / deleted
+    group_id: strawberry.ID
+    published_at: float  # 发布时间（Unix 秒），可用于测量投递延迟
+
+    @strawberry.field
+    async def group(self, info: strawberry.Info) -> Group | None:
+        """变更后的分组；已删除时为 None"""
+        if self.kind == "deleted":
+            return None
+        store = info.context["store"]
+        if hasattr(store, "refresh"):
+            store.refresh()  # 事件可能来自其他 worker
+        (group,) = await store.get_many([self.group_id])
+        return group
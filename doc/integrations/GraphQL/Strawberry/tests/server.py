@@ -1,11 +1,40 @@
+import os
 from sanic import Sanic
-from api.schema import schema, GraphQLView
+from sanic.response import text
+from sanic_book.metrics import CONTENT_TYPE, render_metrics, setup_metrics
+from sanic_book.pubsub import setup_pubsub
+from sanic_book.serialization import dumps, loads
+from sanic_book.subscriptions import PROTOCOL, SubscriptionServer
+from sanic_book.tracing import NanoSecondRequest, setup_tracing
+from sanic_book.watchdog import render_watchdog, setup_watchdog
+from api.schema import schema, groups_store, subscription_context, GraphQLView
+from api.snowflake import setup_snowflake
+from api.storage import setup_group_store
+from api.stream import groups_stream
 
-app = Sanic(__name__)
+app = Sanic(__name__, request_class=NanoSecondRequest, dumps=dumps, loads=loads)
+setup_snowflake(app)
+setup_group_store(app, groups_store) # 多 worker 间的缓存失效通知
+setup_metrics(app)
+setup_pubsub(app) # 订阅事件在各 worker 间转发
+setup_tracing(app, sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "0.01")),
+              fmt=os.environ.get("TRACE_FORMAT", "jsonl"),
+              trust_header=os.environ.get("TRACE_TRUST_HEADER") == "1") # 本地调试时才信任 X-Trace
+setup_watchdog(app, threshold=float(os.environ.get("WATCHDOG_THRESHOLD", "0.1")))
 
 
 app.add_route(
-    GraphQLView.as_view(schema=schema, graphiql=True),
+    GraphQLView.as_view(schema=schema, graphql_ide="graphiql"),
     "/groups",
     version="v1.1"
 )
+app.blueprint(groups_stream, version="v1.1")
+# GraphQL 订阅（graphql-transport-ws），相同的订阅在每个 worker 内只执行一次
+subscriptions = SubscriptionServer(schema, subscription_context)
+app.add_websocket_route(subscriptions.handle, "/groups/subscriptions",
+                        version="v1.1", subprotocols=[PROTOCOL])
+
+
+@app.get("/metrics")
+async def metrics(request):
+    return text(render_metrics(request.app) + render_watchdog(request.app), content_type=CONTENT_TYPE)
@@ -0,0 +1,225 @@
+"""准入控制：跨 worker 的令牌桶限流、并发上限与过载卸载
+
+- :class:`SharedTokenBucket` 把每个键（客户端 IP、token 主体等）的令牌桶放在共享内存的
+  定长哈希表中，所有 worker 共用同一份额度；表满时覆盖探测范围内最久未用的桶。
+- :class:`ConcurrencyLimiter` 限制每个 worker 同时处理的请求数，超出的请求在有界队列中
+  等待，队列满或等待超时即返回 503。
+- 事件循环延迟超过阈值时直接返回 503，不再排队，使尾延迟保持有界。
+
+用法::
+
+    setup_admission(app, limits={"login": (5 / 60, 5)})
+
+    async def handler(request):
+        request.app.ctx.admission.check("login", client_ip(request))
+        async with request.app.ctx.admission.slot():
+            ...
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import time
+from contextlib import asynccontextmanager
+
+from sanic.exceptions import SanicException, ServiceUnavailable
+
+from .watchdog import LagMonitor, lag_monitor
+
+# 每个键在哈希表中的最大探测次数
+PROBES = 8
+
+
+class TooManyRequests(SanicException):
+    status_code = 429
+    quiet = True
+
+
+def _retry_after(seconds: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, int(seconds + 0.999)))}
+
+
+def client_ip(request) -> str:
+    """代理配置（REAL_IP_HEADER 等）生效时为真实客户端地址"""
+    return request.remote_addr or request.ip
+
+
+def key_hash(key: str) -> int:
+    """跨进程稳定的 64 位哈希（内置 hash() 每个进程的种子不同）"""
+    value = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+    return value or 1  # 0 表示空槽
+
+
+class SharedTokenBucket:
+    """共享内存中的令牌桶表
+
+    ``rate`` 为每秒补充的令牌数，``burst`` 为桶容量。各进程的 ``time.monotonic()``
+    来自同一个系统时钟，可以直接比较。``shared`` 中没有该表时（单进程模式不执行
+    ``main_process_start``）使用进程内的表。
+    """
+
+    def __init__(self, shared: dict, name: str, rate: float, burst: float,
+                 slots: int = 4096):
+        if f"admission_{name}_keys" not in shared:
+            shared = self.allocate(name, slots)
+        self.keys = shared[f"admission_{name}_keys"]
+        self.state = shared[f"admission_{name}_state"]  # [tokens, updated_at] * slots
+        self.lock = shared[f"admission_{name}_lock"]
+        self.slots = len(self.keys)
+        self.rate = rate
+        self.burst = burst
+
+    @staticmethod
+    def allocate(name: str, slots: int = 4096) -> dict:
+        """在主进程中分配共享内存，返回值保存到 ``app.shared_ctx``"""
+        return {f"admission_{name}_keys": multiprocessing.RawArray("Q", slots),
+                f"admission_{name}_state": multiprocessing.RawArray("d", slots * 2),
+                f"admission_{name}_lock": multiprocessing.Lock()}
+
+    def acquire(self, key: str, cost: float = 1.0, now: float | None = None) -> float:
+        """扣除令牌；成功返回 0，否则返回需要等待的秒数"""
+        h = key_hash(key)
+        now = time.monotonic() if now is None else now
+        keys, state, slots = self.keys, self.state, self.slots
+        with self.lock:
+            victim = None
+            oldest = float("inf")
+            for probe in range(PROBES):
+                slot = (h + probe) % slots
+                current = keys[slot]
+                if current == h:
+                    break
+                if current == 0:
+                    keys[slot] = h
+                    state[2 * slot] = self.burst
+                    state[2 * slot + 1] = now
+                    break
+                updated = state[2 * slot + 1]
+                if updated < oldest:
+                    victim, oldest = slot, updated
+            else:
+                # 探测范围已满：覆盖最久未用的桶
+                slot = victim
+                keys[slot] = h
+                state[2 * slot] = self.burst
+                state[2 * slot + 1] = now
+            tokens = min(self.burst, state[2 * slot] + (now - state[2 * slot + 1]) * self.rate)
+            state[2 * slot + 1] = now
+            if tokens >= cost:
+                state[2 * slot] = tokens - cost
+                return 0.0
+            state[2 * slot] = tokens
+        return (cost - tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class ConcurrencyLimiter:
+    """单个 worker 的并发上限与有界等待队列"""
+
+    def __init__(self, max_active: int, max_queue: int, queue_timeout: float):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: list[asyncio.Future] = []
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise ServiceUnavailable("Server is busy", headers=_retry_after(1))
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as exc:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            timed_out = isinstance(exc, asyncio.TimeoutError)
+            if waiter.done() and not waiter.cancelled():
+                # 名额已在超时或取消的同时转交给本请求
+                if timed_out:
+                    return
+                self.release()
+                raise
+            waiter.cancel()
+            if timed_out:
+                raise ServiceUnavailable("Server is busy", headers=_retry_after(1)) from None
+            raise
+
+    def release(self) -> None:
+        # 名额直接转交给队首的等待者，active 不变
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class Admission:
+    """一个 worker 的准入控制器，挂在 ``app.ctx.admission``"""
+
+    def __init__(self, buckets: dict[str, SharedTokenBucket], limiter: ConcurrencyLimiter,
+                 monitor: LagMonitor, max_lag: float):
+        self.buckets = buckets
+        self.limiter = limiter
+        self.monitor = monitor
+        self.max_lag = max_lag
+        self.shed = 0  # 因过载拒绝的请求数
+        self.limited = 0  # 因限流拒绝的请求数
+
+    def check(self, name: str, key: str, cost: float = 1.0) -> None:
+        """按名为 name 的限额扣除 key 的令牌，不足时抛出 429"""
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            return
+        wait = bucket.acquire(key, cost)
+        if wait:
+            self.limited += 1
+            raise TooManyRequests("Too many requests", headers=_retry_after(wait))
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个并发名额；事件循环延迟过高时直接 503"""
+        if self.monitor.current() > self.max_lag:
+            self.shed += 1
+            raise ServiceUnavailable("Server is overloaded", headers=_retry_after(1))
+        try:
+            await self.limiter.acquire()
+        except ServiceUnavailable:
+            self.shed += 1
+            raise
+        try:
+            yield
+        finally:
+            self.limiter.release()
+
+
+def setup_admission(app, limits: dict[str, tuple[float, float]], slots: int = 4096,
+                    max_active: int = 256, max_queue: int = 512,
+                    queue_timeout: float = 1.0, max_lag: float = 0.2) -> None:
+    """``limits`` 为 名称 -> (每秒令牌数, 桶容量)"""
+
+    @app.main_process_start
+    async def admission_allocate(app):
+        for name in limits:
+            for key, value in SharedTokenBucket.allocate(name, slots).items():
+                setattr(app.shared_ctx, key, value)
+
+    @app.before_server_start
+    async def admission_attach(app):
+        shared = vars(app.shared_ctx)
+        buckets = {name: SharedTokenBucket(shared, name, rate, burst, slots)
+                   for name, (rate, burst) in limits.items()}
+        monitor = lag_monitor(app)  # 与 setup_watchdog 共用
+        app.ctx.admission = Admission(buckets,
+                                      ConcurrencyLimiter(max_active, max_queue, queue_timeout),
+                                      monitor, max_lag)
+
+    @app.after_server_stop
+    async def admission_detach(app):
+        await app.ctx.admission.monitor.stop()
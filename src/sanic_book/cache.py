@@ -0,0 +1,366 @@
+"""GET 响应缓存
+
+- :func:`cached` 装饰处理函数，按路由声明 TTL、``stale``（stale-while-revalidate 窗口）
+  以及参与缓存键的请求头；缓存的是处理函数的返回值，响应中间件（追踪、指标等）仍对每个
+  请求照常运行。
+- 每个 worker 有一个按总字节数淘汰的 LRU；可选的共享层放在共享内存的定长槽位表中，
+  一个 worker 生成的响应其他 worker 也能命中。
+- 同一个键同时只有一个请求执行处理函数（single-flight），其余请求等待其结果；
+  过期但仍在 ``stale`` 窗口内的条目直接返回，同时在后台重新生成。
+
+只缓存状态码 200、不带 ``Set-Cookie`` 且未声明 ``no-store``/``private`` 的普通响应，
+流式响应（``request.respond``）不缓存。
+
+用法::
+
+    setup_response_cache(app, max_bytes=32 << 20, shared_slots=1024)
+
+    @bp.get("/")
+    @cached(ttl=5, stale=30, vary=("accept-encoding",))
+    async def handler(request):
+        ...
+"""
+import asyncio
+import ctypes
+import multiprocessing
+import struct
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from sanic.log import logger
+from sanic.response import HTTPResponse, empty
+
+from .admission import PROBES, key_hash
+from .serialization import dumps, loads
+
+# 不随缓存条目保存的响应头
+SKIP_HEADERS = frozenset(("content-length", "content-type", "transfer-encoding", "connection"))
+# 后台刷新时去掉的请求头：带上它们时处理函数可能返回 304/206，条目就无法更新
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since", "if-match",
+                       "if-unmodified-since", "if-range", "range")
+# 共享层条目的头部：状态码、元数据长度
+_HEAD = struct.Struct("!HI")
+
+
+def cache_key(request, vary: tuple[str, ...] = ()) -> str:
+    """路径 + 排序后的查询参数 + vary 中各请求头的值"""
+    parts = [request.path, "&".join(f"{k}={v}" for k, v in sorted(request.query_args))]
+    parts.extend(request.headers.get(name, "") for name in vary)
+    return "\n".join(parts)
+
+
+def cacheable(response) -> bool:
+    if not isinstance(response, HTTPResponse) or response.status != 200:
+        return False
+    headers = response.headers
+    if "set-cookie" in headers:
+        return False
+    control = headers.get("cache-control", "").lower()
+    return "no-store" not in control and "private" not in control
+
+
+class Entry:
+    __slots__ = ("status", "headers", "content_type", "body", "stored_at", "ttl", "stale")
+
+    def __init__(self, status: int, headers: tuple[tuple[str, str], ...], content_type: str,
+                 body: bytes, stored_at: float, ttl: float, stale: float):
+        self.status = status
+        self.headers = headers
+        self.content_type = content_type
+        self.body = body
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.stale = stale
+
+    @classmethod
+    def from_response(cls, response: HTTPResponse, ttl: float, stale: float) -> "Entry":
+        headers = tuple((k, v) for k, v in response.headers.items()
+                        if k.lower() not in SKIP_HEADERS)
+        return cls(response.status, headers, response.content_type, response.body or b"",
+                   time.monotonic(), ttl, stale)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers) + 128
+
+    def fresh(self, now: float) -> bool:
+        return now < self.stored_at + self.ttl
+
+    def usable(self, now: float) -> bool:
+        return now < self.stored_at + self.ttl + self.stale
+
+    def encode(self) -> bytes:
+        meta = dumps([self.headers, self.content_type])
+        return _HEAD.pack(self.status, len(meta)) + meta + self.body
+
+    @classmethod
+    def decode(cls, data: bytes, stored_at: float, ttl: float, stale: float) -> "Entry":
+        status, length = _HEAD.unpack_from(data)
+        start = _HEAD.size
+        headers, content_type = loads(data[start:start + length])
+        return cls(status, tuple(map(tuple, headers)), content_type,
+                   data[start + length:], stored_at, ttl, stale)
+
+    def response(self, request, state: str) -> HTTPResponse:
+        headers = dict(self.headers)
+        headers["Age"] = str(int(time.monotonic() - self.stored_at))
+        headers["X-Cache"] = state
+        etag = headers.get("ETag") or headers.get("etag")
+        if_none_match = request.headers.get("if-none-match")
+        if etag and if_none_match and (
+                if_none_match.strip() == "*"
+                or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+            # 304 没有消息体，不能声明内容编码
+            return empty(status=304, headers={k: v for k, v in headers.items()
+                                              if k.lower() != "content-encoding"})
+        return HTTPResponse(self.body, status=self.status, headers=headers,
+                            content_type=self.content_type)
+
+
+class LocalCache:
+    """单个 worker 内的 LRU，按条目总字节数淘汰"""
+
+    def __init__(self, max_bytes: int = 32 << 20, max_item: int = 1 << 20):
+        self.max_bytes = max_bytes
+        self.max_item = max_item
+        self.size = 0
+        self._items: OrderedDict[str, Entry] = OrderedDict()
+
+    def get(self, key: str) -> Entry | None:
+        entry = self._items.get(key)
+        if entry is not None:
+            self._items.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: Entry) -> None:
+        size = entry.size
+        if size > self.max_item:
+            return
+        self.pop(key)
+        self._items[key] = entry
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= evicted.size
+
+    def pop(self, key: str) -> None:
+        entry = self._items.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.size = 0
+
+
+class SharedCache:
+    """共享内存中的定长槽位表，所有 worker 共用
+
+    每个槽位保存一条编码后的条目（不超过 ``slot_size`` 字节）；键按 64 位哈希开放寻址，
+    探测范围已满时覆盖最早写入的条目。
+    """
+
+    def __init__(self, shared: dict, name: str = "response"):
+        self.keys = shared[f"cache_{name}_keys"]
+        self.times = shared[f"cache_{name}_times"]  # [stored_at, ttl, stale] * slots
+        self.lengths = shared[f"cache_{name}_lengths"]
+        self.data = shared[f"cache_{name}_data"]
+        self.lock = shared[f"cache_{name}_lock"]
+        self.slots = len(self.keys)
+        self.slot_size = len(self.data) // self.slots
+
+    @staticmethod
+    def allocate(name: str = "response", slots: int = 1024, slot_size: int = 64 << 10) -> dict:
+        """在主进程中分配共享内存，返回值保存到 ``app.shared_ctx``"""
+        return {f"cache_{name}_keys": multiprocessing.RawArray("Q", slots),
+                f"cache_{name}_times": multiprocessing.RawArray("d", slots * 3),
+                f"cache_{name}_lengths": multiprocessing.RawArray("I", slots),
+                f"cache_{name}_data": multiprocessing.RawArray(ctypes.c_char, slots * slot_size),
+                f"cache_{name}_lock": multiprocessing.Lock()}
+
+    def get(self, key: str, now: float) -> Entry | None:
+        h = key_hash(key)
+        keys, times = self.keys, self.times
+        with self.lock:
+            for probe in range(PROBES):
+                slot = (h + probe) % self.slots
+                if keys[slot] == h:
+                    stored_at, ttl, stale = times[3 * slot:3 * slot + 3]
+                    if now >= stored_at + ttl + stale:
+                        return None
+                    start = slot * self.slot_size
+                    data = self.data[start:start + self.lengths[slot]]
+                    break
+                if keys[slot] == 0:
+                    return None
+            else:
+                return None
+        return Entry.decode(data, stored_at, ttl, stale)
+
+    def put(self, key: str, entry: Entry) -> bool:
+        data = entry.encode()
+        if len(data) > self.slot_size:
+            return False
+        h = key_hash(key)
+        keys, times = self.keys, self.times
+        with self.lock:
+            victim = None
+            oldest = float("inf")
+            for probe in range(PROBES):
+                slot = (h + probe) % self.slots
+                if keys[slot] in (h, 0):
+                    break
+                stored_at = times[3 * slot]
+                if stored_at < oldest:
+                    victim, oldest = slot, stored_at
+            else:
+                slot = victim
+            keys[slot] = h
+            times[3 * slot:3 * slot + 3] = [entry.stored_at, entry.ttl, entry.stale]
+            self.lengths[slot] = len(data)
+            start = slot * self.slot_size
+            self.data[start:start + len(data)] = data
+        return True
+
+    def clear(self) -> None:
+        with self.lock:
+            ctypes.memset(self.keys, 0, ctypes.sizeof(self.keys))
+
+
+class ResponseCache:
+    """一个 worker 的响应缓存，挂在 ``app.ctx.response_cache``"""
+
+    def __init__(self, local: LocalCache, shared: SharedCache | None = None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def get(self, key: str, now: float, shared: bool = True) -> Entry | None:
+        entry = self.local.get(key)
+        if entry is not None and entry.fresh(now):
+            return entry
+        if shared and self.shared is not None:
+            # 本地条目已过期时，其他 worker 可能已经刷新并存入了共享层
+            newer = self.shared.get(key, now)
+            if newer is not None and (entry is None or newer.stored_at > entry.stored_at):
+                self.local.put(key, newer)
+                return newer
+        if entry is not None and entry.usable(now):
+            return entry
+        if entry is not None:
+            self.local.pop(key)
+        return None
+
+    def put(self, key: str, entry: Entry, shared: bool = True) -> None:
+        self.local.put(key, entry)
+        if shared and self.shared is not None:
+            self.shared.put(key, entry)
+
+    def clear(self) -> None:
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def _claim(self, key: str) -> asyncio.Future:
+        """登记正在生成的键；须在让出事件循环之前调用，其他请求才能看到"""
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        return future
+
+    async def _generate(self, key: str, future: asyncio.Future, handler, ttl: float,
+                        stale: float, shared: bool):
+        """执行处理函数并缓存结果；同一个键的并发请求等待同一个 future"""
+        try:
+            response = await handler()
+            entry = None
+            if cacheable(response):
+                entry = Entry.from_response(response, ttl, stale)
+                self.put(key, entry, shared)
+            future.set_result(entry)
+            return response
+        except BaseException:
+            future.set_result(None)  # 等待者各自执行处理函数
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _revalidate(self, request, key: str, future: asyncio.Future, handler,
+                          ttl: float, stale: float, shared: bool):
+        # 旧响应已经生成，原请求只剩下给处理函数提供参数
+        for name in CONDITIONAL_HEADERS:
+            request.headers.popall(name, None)
+        try:
+            await self._generate(key, future, handler, ttl, stale, shared)
+        except Exception:
+            logger.exception("Failed to revalidate cached response for %r", key)
+
+    async def serve(self, request, key: str, handler, ttl: float, stale: float = 0.0,
+                    shared: bool = True) -> HTTPResponse:
+        now = time.monotonic()
+        entry = self.get(key, now, shared)
+        if entry is not None:
+            if entry.fresh(now):
+                self.hits += 1
+                return entry.response(request, "HIT")
+            self.stale_hits += 1
+            if key not in self._inflight:
+                task = asyncio.create_task(self._revalidate(
+                    request, key, self._claim(key), handler, ttl, stale, shared))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return entry.response(request, "STALE")
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            entry = await asyncio.shield(inflight)
+            if entry is not None:
+                self.hits += 1
+                return entry.response(request, "HIT")
+            return await handler()
+        self.misses += 1
+        response = await self._generate(key, self._claim(key), handler, ttl, stale, shared)
+        if isinstance(response, HTTPResponse):
+            response.headers["X-Cache"] = "MISS"
+        return response
+
+
+def cached(ttl: float, stale: float = 0.0, vary: tuple[str, ...] = (), shared: bool = True):
+    """缓存 GET 处理函数的响应
+
+    ``ttl`` 秒内直接命中；之后的 ``stale`` 秒内返回旧响应并在后台刷新。
+    ``vary`` 为参与缓存键的请求头，``shared`` 为 False 时只用本 worker 的 LRU。
+    未调用 :func:`setup_response_cache` 时不做缓存。
+    """
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(request, *args, **kwargs):
+            cache = getattr(request.app.ctx, "response_cache", None)
+            if cache is None or request.method != "GET":
+                return await f(request, *args, **kwargs)
+            return await cache.serve(request, cache_key(request, vary),
+                                     lambda: f(request, *args, **kwargs), ttl, stale, shared)
+        return decorated_function
+    return decorator
+
+
+def setup_response_cache(app, max_bytes: int = 32 << 20, max_item: int = 1 << 20,
+                         shared_slots: int = 0, shared_slot_size: int = 64 << 10) -> None:
+    """``shared_slots`` 为 0 时不启用跨 worker 的共享层"""
+
+    if shared_slots:
+        @app.main_process_start
+        async def response_cache_allocate(app):
+            for key, value in SharedCache.allocate("response", shared_slots,
+                                                   shared_slot_size).items():
+                setattr(app.shared_ctx, key, value)
+
+    @app.before_server_start
+    async def response_cache_attach(app):
+        # 单进程模式不执行 main_process_start，只有一个 worker，也不需要共享层
+        shared = None
+        if shared_slots and "cache_response_keys" in vars(app.shared_ctx):
+            shared = SharedCache(vars(app.shared_ctx))
+        app.ctx.response_cache = ResponseCache(LocalCache(max_bytes, max_item), shared)
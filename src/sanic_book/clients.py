@@ -0,0 +1,265 @@
+"""应用共享的出站 HTTP 客户端
+
+每个上游服务对应一个 :class:`Upstream`（内部是一个 ``httpx.AsyncClient``），
+在 ``before_server_start`` 中创建、``after_server_stop`` 中关闭，连接在请求之间复用，
+不必每次调用都重新建立 TCP/TLS 连接。
+
+- 每个上游有自己的连接池；安装了 ``h2`` 时对 HTTPS 上游启用 HTTP/2，多个请求共用一个连接；
+- ``max_concurrency`` 限制同时进行的请求数，其余请求排队，最多等待 ``queue_timeout`` 秒；
+- 幂等请求遇到连接错误、超时或 429/502/503/504 时重试，退避时间为带全抖动的指数退避
+  （有 ``Retry-After`` 时按它等待，但不超过 ``max_backoff``）；
+- 同时发出的相同 GET（URL 与全部请求头都相同、没有请求体）只请求一次，结果共享。
+
+各 worker 的统计写入共享内存，由 :func:`render_clients` 汇总输出；单进程模式下改用进程内的数组。
+
+用法::
+
+    setup_clients(app, {"search": {"base_url": "https://search.internal", "max_concurrency": 64}})
+
+    response = await request.app.ctx.http["search"].get("/v1/items", params={"q": "sanic"})
+"""
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import random
+import time
+from operator import itemgetter
+
+import httpx
+from sanic.log import logger
+
+HTTP2 = importlib.util.find_spec("h2") is not None
+IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# 每个 worker 每个上游一行：请求数、失败数、重试数、合并数、进行中、排队中、连接数、空闲连接数、总耗时（秒）
+REQUESTS, FAILURES, RETRIES, COALESCED, IN_FLIGHT, WAITING, CONNECTIONS, IDLE, LATENCY_SUM = range(9)
+FIELDS = 9
+
+
+class Upstream:
+    """一个上游服务的客户端
+
+    ``stats`` 为共享内存中属于本 worker 的 RawArray，``offset`` 为本上游所在行的起点。
+    """
+
+    def __init__(self, name: str, base_url: str = "", *, stats=None, offset: int = 0,
+                 max_connections: int = 100, max_keepalive: int = 20,
+                 keepalive_expiry: float = 30.0, max_concurrency: int = 100,
+                 queue_timeout: float = 5.0, timeout: float = 10.0,
+                 connect_timeout: float = 3.0, retries: int = 2, backoff: float = 0.1,
+                 max_backoff: float = 2.0, http2: bool = True, coalesce: bool = True,
+                 headers: dict[str, str] | None = None):
+        self.name = name
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=http2 and HTTP2,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_keepalive,
+                                keepalive_expiry=keepalive_expiry),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            headers=headers,
+        )
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.coalesce = coalesce
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pending: dict[tuple, asyncio.Task] = {}
+        self._stats = stats if stats is not None else [0.0] * FIELDS
+        self._offset = offset
+
+    def _add(self, field: int, value: float = 1) -> None:
+        self._stats[self._offset + field] += value
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        request = self.client.build_request(method, url, **kwargs)
+        headers = request.headers
+        if not (self.coalesce and request.method == "GET") or (
+                "content-length" in headers or "transfer-encoding" in headers):
+            return await self._send(request)
+        # 租户、API key 等任何请求头不同都可能得到不同的响应，因此按全部请求头区分
+        key = (str(request.url), *sorted(headers.multi_items(), key=itemgetter(0)))
+        task = self._pending.get(key)
+        if task is None:
+            # 请求在独立的任务中进行，个别调用者被取消时不影响其他调用者
+            task = self._pending[key] = asyncio.ensure_future(self._send(request))
+            task.add_done_callback(lambda done: self._done(key, done))
+        else:
+            self._add(COALESCED)
+        return await asyncio.shield(task)
+
+    def _done(self, key: tuple, task: asyncio.Task) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if not task.cancelled():
+            task.exception()  # 所有调用者都已取消时，避免“异常未被获取”的警告
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def _delay(self, attempt: int, response: httpx.Response | None) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after is not None:
+            try:
+                return min(max(float(retry_after), 0.0), self.max_backoff)
+            except ValueError:
+                pass  # HTTP 日期格式，按退避处理
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        retryable = request.method in IDEMPOTENT
+        attempt = 0
+        while True:
+            self._add(WAITING)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._add(FAILURES)
+                raise httpx.PoolTimeout(f"No free slot for upstream {self.name!r}",
+                                        request=request) from None
+            finally:
+                self._add(WAITING, -1)
+            self._add(IN_FLIGHT)
+            self._add(REQUESTS)
+            start = time.perf_counter()
+            response = None
+            try:
+                response = await self.client.send(request)
+            except httpx.TransportError:
+                if not retryable or attempt >= self.retries:
+                    self._add(FAILURES)
+                    raise
+            finally:
+                self._slots.release()
+                self._add(IN_FLIGHT, -1)
+                self._add(LATENCY_SUM, time.perf_counter() - start)
+            if response is not None and not (
+                    retryable and attempt < self.retries and response.status_code in RETRY_STATUSES):
+                return response
+            await asyncio.sleep(self._delay(attempt, response))
+            if response is not None:
+                await response.aclose()
+            attempt += 1
+            self._add(RETRIES)
+
+    def update_pool_stats(self) -> None:
+        """把连接池的连接数与空闲连接数写入统计（读取 httpcore 的内部状态）"""
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return
+        start = self._offset
+        self._stats[start + CONNECTIONS] = len(connections)
+        self._stats[start + IDLE] = sum(1 for connection in connections if connection.is_idle())
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def _allocate(max_workers: int, upstreams: int) -> dict:
+    """在主进程中分配共享内存，返回值保存到 ``app.shared_ctx``"""
+    return {
+        "clients_data": multiprocessing.RawArray("d", max_workers * max(upstreams, 1) * FIELDS),
+        "clients_workers": multiprocessing.RawArray("i", max_workers),
+        "clients_lock": multiprocessing.Lock(),
+    }
+
+
+def setup_clients(app, upstreams: dict[str, dict], max_workers: int = 32,
+                  stats_interval: float = 1.0) -> None:
+    """``upstreams`` 为上游名 -> :class:`Upstream` 的参数，客户端放在 ``app.ctx.http``"""
+    names = list(upstreams)
+
+    @app.main_process_start
+    async def clients_allocate(app):
+        for key, value in _allocate(max_workers, len(names)).items():
+            setattr(app.shared_ctx, key, value)
+
+    @app.before_server_start
+    async def clients_start(app):
+        shared = vars(app.shared_ctx)
+        if "clients_data" not in shared:
+            # 单进程模式不执行 main_process_start
+            shared = _allocate(1, len(names))
+        with shared["clients_lock"]:
+            try:
+                worker = shared["clients_workers"][:].index(0)
+            except ValueError:
+                raise RuntimeError(f"At most {max_workers} workers are supported") from None
+            shared["clients_workers"][worker] = os.getpid()
+        app.ctx.clients_shared = shared
+        app.ctx.clients_worker = worker
+        base = worker * len(names) * FIELDS
+        data = shared["clients_data"]
+        # 上一个占用该行的 worker 的统计不再有效
+        data[base:base + len(names) * FIELDS] = [0.0] * (len(names) * FIELDS)
+        app.ctx.http = {name: Upstream(name, **options, stats=data,
+                                       offset=base + index * FIELDS)
+                        for index, (name, options) in enumerate(upstreams.items())}
+
+    @app.after_server_start
+    async def clients_start_stats(app):
+        async def update():
+            while True:
+                await asyncio.sleep(stats_interval)
+                for upstream in app.ctx.http.values():
+                    upstream.update_pool_stats()
+
+        if names:
+            app.add_task(update(), name="clients-stats")
+
+    @app.after_server_stop
+    async def clients_close(app):
+        results = await asyncio.gather(*(upstream.aclose() for upstream in app.ctx.http.values()),
+                                       return_exceptions=True)
+        for name, result in zip(app.ctx.http, results):
+            if isinstance(result, Exception):
+                logger.warning("Failed to close HTTP client %r: %s", name, result)
+        shared = app.ctx.clients_shared
+        with shared["clients_lock"]:
+            shared["clients_workers"][app.ctx.clients_worker] = 0
+
+
+def render_clients(app) -> str:
+    """Prometheus 文本格式，汇总所有 worker"""
+    upstreams: dict[str, Upstream] | None = getattr(app.ctx, "http", None)
+    if not upstreams:
+        return ""
+    for upstream in upstreams.values():
+        upstream.update_pool_stats()
+    shared = app.ctx.clients_shared
+    data = shared["clients_data"]
+    workers = [i for i, pid in enumerate(shared["clients_workers"][:]) if pid]
+    totals = {}
+    for index, name in enumerate(upstreams):
+        row = [0.0] * FIELDS
+        for worker in workers:
+            start = (worker * len(upstreams) + index) * FIELDS
+            for i, value in enumerate(data[start:start + FIELDS]):
+                row[i] += value
+        totals[name] = row
+    series = (
+        ("sanic_upstream_requests_total", "counter", "Requests sent upstream, including retries.", REQUESTS),
+        ("sanic_upstream_failures_total", "counter", "Upstream requests that failed after all retries.", FAILURES),
+        ("sanic_upstream_retries_total", "counter", "Upstream request retries.", RETRIES),
+        ("sanic_upstream_coalesced_total", "counter", "GET calls served by an identical in-flight request.", COALESCED),
+        ("sanic_upstream_in_flight", "gauge", "Upstream requests in progress.", IN_FLIGHT),
+        ("sanic_upstream_waiting", "gauge", "Calls waiting for a concurrency slot.", WAITING),
+        ("sanic_upstream_connections", "gauge", "Open pooled connections.", CONNECTIONS),
+        ("sanic_upstream_idle_connections", "gauge", "Idle pooled connections.", IDLE),
+        ("sanic_upstream_seconds_total", "counter", "Time spent in upstream requests.", LATENCY_SUM),
+    )
+    lines = []
+    for name, kind, help_text, field in series:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for upstream, row in totals.items():
+            value = row[field] if field == LATENCY_SUM else int(row[field])
+            lines.append(f'{name}{{upstream="{upstream}"}} {value}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,299 @@
+"""Strawberry 扩展
+
+与 :mod:`sanic_book.metrics`、:mod:`sanic_book.tracing` 等配合使用，
+需要在 GraphQL 上下文中提供 ``request``。
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from inspect import isawaitable
+from typing import Any
+
+from graphql import (DocumentNode, FieldNode, FragmentDefinitionNode, FragmentSpreadNode,
+                     GraphQLError, GraphQLSchema, InlineFragmentNode, IntValueNode,
+                     SelectionSetNode, VariableNode, get_named_type,
+                     get_nullable_type, get_operation_ast, is_leaf_type, is_list_type)
+from sanic.log import logger
+from strawberry.extensions import SchemaExtension
+from strawberry.schema.schema import validate_document
+from strawberry.types.graphql import OperationType
+
+from .serialization import dumps_str
+from .tracing import activate, current_span, span
+
+
+class OperationMetrics(SchemaExtension):
+    """按 GraphQL 操作名统计请求延迟，序列名为 ``graphql:<操作名>``
+
+    操作名由客户端给出，超过 ``setup_metrics`` 的 ``max_variants`` 后归入 ``graphql:other``。
+    """
+
+    def on_execute(self):
+        execution_context = self.execution_context
+        context = execution_context.context
+        request = context.get("request") if isinstance(context, dict) else getattr(context, "request", None)
+        if request is not None:
+            name = execution_context.operation_name or "anonymous"
+            request.ctx.metrics_series = f"graphql:{name}"
+        yield
+
+
+class Tracing(SchemaExtension):
+    """为被采样的请求记录 GraphQL 执行与解析器的 span
+
+    默认只追踪 Query/Mutation/Subscription 上的字段；普通对象字段数量可能很大，
+    逐个记录的开销得不偿失。
+    """
+
+    ROOT_TYPES = frozenset({"Query", "Mutation", "Subscription"})
+
+    def on_execute(self):
+        name = self.execution_context.operation_name or "anonymous"
+        with span("graphql.execute", operation=name):
+            yield
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        if current_span() is None or info.parent_type.name not in self.ROOT_TYPES:
+            return _next(root, info, *args, **kwargs)
+        resolver_span = span(f"resolve {info.parent_type.name}.{info.field_name}")
+        try:
+            with activate(resolver_span):
+                result = _next(root, info, *args, **kwargs)
+        except Exception:
+            resolver_span.end()
+            raise
+        if not isawaitable(result):
+            resolver_span.end()
+            return result
+
+        # 异步解析器的函数体在 await 时才执行，span 需要覆盖到那时
+        async def await_result():
+            try:
+                with activate(resolver_span):
+                    return await result
+            finally:
+                resolver_span.end()
+        return await_result()
+
+
+def query_cost(schema: GraphQLSchema, document: DocumentNode, operation_name: str | None = None,
+               variables: dict[str, Any] | None = None, *,
+               field_costs: dict[str, int] | None = None,
+               list_sizes: dict[str, int] | None = None,
+               default_list_size: int = 100,
+               size_arguments: tuple[str, ...] = ("first", "last", "limit")) -> int:
+    """估算一次操作的成本
+
+    每个字段默认计 1（``field_costs`` 按 ``"类型.字段"`` 覆盖），列表字段的子字段成本
+    乘以预计的元素个数：优先取字段的 ``size_arguments`` 参数，其次取 ``list_sizes``，
+    否则为 ``default_list_size``。带分页参数但返回对象的字段（如 Relay 连接），
+    其参数作用于它的列表子字段（如 ``edges``）。联合/接口类型的各分支成本相加，结果偏大。
+    """
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0
+    fragments = {definition.name.value: definition for definition in document.definitions
+                 if isinstance(definition, FragmentDefinitionNode)}
+    variables = variables or {}
+    field_costs = field_costs or {}
+    list_sizes = list_sizes or {}
+
+    def size_of(field, node: FieldNode) -> int | None:
+        # 负数按 0 计，否则一个带负数参数的别名字段就能抵消其他字段的成本
+        for argument in node.arguments or ():
+            if argument.name.value in size_arguments:
+                value = argument.value
+                if isinstance(value, IntValueNode):
+                    return max(int(value.value), 0)
+                if isinstance(value, VariableNode):
+                    value = variables.get(value.name.value)
+                    return max(value, 0) if isinstance(value, int) else None
+        for name in size_arguments:
+            argument = field.args.get(name)
+            if argument is None:
+                continue
+            if isinstance(argument.default_value, int):
+                return max(argument.default_value, 0)
+            # 由 SDL 构建的 schema 只在 AST 中保留默认值
+            node_default = getattr(argument.ast_node, "default_value", None)
+            if isinstance(node_default, IntValueNode):
+                return max(int(node_default.value), 0)
+        return None
+
+    def selection_cost(parent_type, selection_set: SelectionSetNode | None,
+                       inherited: int | None) -> int:
+        if selection_set is None:
+            return 0
+        total = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                fields = getattr(parent_type, "fields", None)
+                if name.startswith("__") or fields is None or name not in fields:
+                    continue
+                total += field_cost(parent_type, fields[name], selection, inherited)
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                fragment_type = schema.get_type(condition.name.value) if condition else parent_type
+                total += selection_cost(fragment_type, selection.selection_set, inherited)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None:
+                    total += selection_cost(schema.get_type(fragment.type_condition.name.value),
+                                            fragment.selection_set, inherited)
+        return total
+
+    def field_cost(parent_type, field, node: FieldNode, inherited: int | None) -> int:
+        key = f"{parent_type.name}.{node.name.value}"
+        named = get_named_type(field.type)
+        size = size_of(field, node)
+        children_size = None
+        if is_list_type(get_nullable_type(field.type)):
+            count = size if size is not None else inherited
+            if count is None:
+                count = list_sizes.get(key, default_list_size)
+        else:
+            count = 1
+            children_size = size  # 分页参数交给列表子字段
+        own = field_costs.get(key, 1)
+        if is_leaf_type(named):
+            return own * count
+        return own + count * selection_cost(named, node.selection_set, children_size)
+
+    root = schema.get_root_type(operation.operation)
+    return selection_cost(root, operation.selection_set, None)
+
+
+class CostStats:
+    """按操作名汇总查询成本，每隔 ``interval`` 秒写一条日志，用于根据真实流量调整预算"""
+
+    def __init__(self, interval: float = 60.0):
+        self.interval = interval
+        # 操作名 -> [次数, 成本之和, 最大成本, 被拒绝次数, 超时次数]
+        self._operations: dict[str, list[int]] = {}
+        self._since = time.monotonic()
+
+    def record(self, name: str, cost: int, rejected: bool = False, timed_out: bool = False) -> None:
+        row = self._operations.get(name)
+        if row is None:
+            row = self._operations[name] = [0, 0, 0, 0, 0]
+        row[0] += 1
+        row[1] += cost
+        row[2] = max(row[2], cost)
+        row[3] += rejected
+        row[4] += timed_out
+        if time.monotonic() - self._since >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        now = time.monotonic()
+        if self._operations:
+            logger.info("GraphQL operation costs: %s", dumps_str({
+                "event": "graphql_cost", "pid": os.getpid(),
+                "interval_s": round(now - self._since, 1),
+                "operations": {name: {"count": count, "mean": round(total / count, 1),
+                                      "max": peak, "rejected": rejected, "timeouts": timeouts}
+                               for name, (count, total, peak, rejected, timeouts)
+                               in self._operations.items()},
+            }))
+        self._operations.clear()
+        self._since = now
+
+
+class QueryCost(SchemaExtension):
+    """查询成本上限与解析器超时
+
+    校验阶段用 :func:`query_cost` 估算成本，超过 ``max_cost`` 的操作不执行；
+    须放在 ``ValidationCache`` 之后。查询执行时每个异步解析器最多运行
+    ``resolver_timeout`` 秒，且不超过整个操作剩余的 ``operation_timeout``，到时取消并返回
+    字段错误。mutation 与订阅不设期限：中途取消写操作会让结果不确定，订阅本就长期运行。
+    同步字段不检查期限，其数量由成本上限约束。
+
+    通过子类设置参数::
+
+        class GroupQueryCost(QueryCost):
+            max_cost = 10000
+            list_sizes = {"Query.groups": 1000}
+    """
+
+    max_cost = 10000
+    field_costs: dict[str, int] = {}
+    list_sizes: dict[str, int] = {}
+    default_list_size = 100
+    resolver_timeout = 5.0
+    operation_timeout = 10.0
+    cache_size = 256
+    stats = CostStats()
+    # (query, operation_name, variables) -> 成本；各子类共用
+    _costs: OrderedDict[tuple, int] = OrderedDict()
+
+    def __init__(self, *, execution_context=None):
+        super().__init__(execution_context=execution_context)
+        self.cost = 0
+        self.timed_out = False
+        self._deadline: float | None = None
+
+    def _operation_cost(self) -> int:
+        context = self.execution_context
+        key = (type(self), context.query, context.operation_name,
+               dumps_str(context.variables or {}))
+        cost = self._costs.get(key)
+        if cost is None:
+            cost = query_cost(context.schema._schema, context.graphql_document,
+                              context.operation_name, context.variables,
+                              field_costs=self.field_costs, list_sizes=self.list_sizes,
+                              default_list_size=self.default_list_size)
+            self._costs[key] = cost
+            while len(self._costs) > self.cache_size:
+                self._costs.popitem(last=False)
+        else:
+            self._costs.move_to_end(key)
+        return cost
+
+    def on_validate(self):
+        context = self.execution_context
+        if context.pre_execution_errors is None and context.graphql_document is not None:
+            context.pre_execution_errors = validate_document(
+                context.schema._schema, context.graphql_document, context.validation_rules)
+        if not context.pre_execution_errors and context.graphql_document is not None:
+            self.cost = self._operation_cost()
+            if self.cost > self.max_cost:
+                name = context.operation_name or "anonymous"
+                self.stats.record(name, self.cost, rejected=True)
+                logger.warning("GraphQL operation %r rejected: cost %d exceeds %d",
+                               name, self.cost, self.max_cost)
+                # 不能修改 ValidationCache 缓存的列表
+                context.pre_execution_errors = [GraphQLError(
+                    f"Query cost {self.cost} exceeds the maximum of {self.max_cost}",
+                    extensions={"code": "QUERY_TOO_COSTLY", "cost": self.cost,
+                                "max_cost": self.max_cost})]
+        yield
+
+    def on_execute(self):
+        context = self.execution_context
+        if context.operation_type is OperationType.QUERY:
+            self._deadline = time.monotonic() + self.operation_timeout
+        yield
+        self._deadline = None
+        self.stats.record(context.operation_name or "anonymous", self.cost,
+                          timed_out=self.timed_out)
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        result = _next(root, info, *args, **kwargs)
+        if self._deadline is None or not isawaitable(result):
+            return result
+        return self._bounded(result, info)
+
+    async def _bounded(self, result, info):
+        remaining = self._deadline - time.monotonic()
+        try:
+            return await asyncio.wait_for(result, max(min(self.resolver_timeout, remaining), 0))
+        except asyncio.TimeoutError:
+            self.timed_out = True
+            if remaining <= self.resolver_timeout:
+                message = f"Operation exceeded its deadline of {self.operation_timeout}s"
+            else:
+                message = (f"Resolver {info.parent_type.name}.{info.field_name} "
+                           f"exceeded {self.resolver_timeout}s")
+            raise GraphQLError(message, extensions={"code": "TIMEOUT"}) from None
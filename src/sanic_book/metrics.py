@@ -0,0 +1,292 @@
+"""按路由统计的请求延迟直方图
+
+每个 worker 在进程内累加 HDR 风格（对数-线性分桶）的直方图，只由事件循环线程写入，
+因而无需加锁；后台任务定期把本 worker 的整行数据复制到共享内存中属于它的那一行，
+任一 worker 读取时把所有行相加即得到全局视图。单进程模式（``--single-process``）下
+没有共享内存，改用进程内的数组。
+
+``<路由>:<变体>`` 形式的序列名（如 ``graphql:<操作名>``）每个路由最多 ``max_variants`` 个，
+其余归入 ``<路由>:other``，避免客户端给出的名字占满所有序列。
+
+用法::
+
+    from sanic_book.metrics import setup_metrics, render_metrics
+
+    setup_metrics(app)
+
+    @bp.get("/")
+    async def metrics(request):
+        return text(render_metrics(request.app), content_type=CONTENT_TYPE)
+"""
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 每个 2 的幂区间分成 2**(SUB_BITS - 1) 个子桶，相对误差约 3%
+SUB_BITS = 5
+HALF_BITS = SUB_BITS - 1
+MAX_VALUE_US = (1 << 32) - 1  # 约 71 分钟
+N_BUCKETS = ((MAX_VALUE_US.bit_length() - SUB_BITS) << HALF_BITS) + (1 << SUB_BITS)
+# 每个序列占用的槽：各桶计数 + 总次数 + 总耗时(µs)
+ROW = N_BUCKETS + 2
+NAME_SIZE = 96
+# Prometheus 输出用的桶边界（秒）
+EXPORT_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+OTHER = "other"
+
+
+def bucket_index(value_us: int) -> int:
+    value_us = min(max(value_us, 0), MAX_VALUE_US)
+    shift = value_us.bit_length() - SUB_BITS
+    return value_us if shift <= 0 else (shift << HALF_BITS) + (value_us >> shift)
+
+
+def bucket_bounds(index: int) -> tuple[int, int]:
+    """桶 index 覆盖的取值范围 [low, high)，单位 µs"""
+    if index < (1 << SUB_BITS):
+        return index, index + 1
+    shift = (index >> HALF_BITS) - 1
+    mantissa = index - (shift << HALF_BITS)
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class Histogram:
+    """单个序列的直方图视图（只读，用于汇总与导出）"""
+
+    __slots__ = ("counts", "count", "sum_us")
+
+    def __init__(self, counts: list[int] | None = None, count: int = 0, sum_us: int = 0):
+        self.counts = counts if counts is not None else [0] * N_BUCKETS
+        self.count = count
+        self.sum_us = sum_us
+
+    def merge(self, row: Iterable[int]) -> None:
+        row = list(row)
+        counts = self.counts
+        for i in range(N_BUCKETS):
+            counts[i] += row[i]
+        self.count += row[N_BUCKETS]
+        self.sum_us += row[N_BUCKETS + 1]
+
+    def quantile(self, q: float) -> float:
+        """返回分位数（秒），取所在桶的中点"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                low, high = bucket_bounds(index)
+                return (low + high) / 2 / 1e6
+        return MAX_VALUE_US / 1e6
+
+    def cumulative(self, bounds: Iterable[float]) -> list[int]:
+        """不大于各边界（秒）的累计次数"""
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            limit = bound * 1e6
+            while index < N_BUCKETS and bucket_bounds(index)[1] <= limit:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+
+class Metrics:
+    """一个 worker 的指标记录器
+
+    ``shared`` 为所有 worker 共享的 RawArray，形状为 [worker][series][ROW]；
+    ``names`` 为共享的序列名表，``lock`` 仅在登记新序列名时使用。
+    """
+
+    def __init__(self, shared, names, lock, worker: int, max_series: int,
+                 max_variants: int = 16):
+        self.shared = shared
+        self.names = names
+        self.lock = lock
+        self.worker = worker
+        self.max_series = max_series
+        self.max_variants = max_variants
+        self._slots: dict[str, int] = {}
+        self._rows: list[list[int]] = []
+
+    @classmethod
+    def allocate(cls, max_workers: int, max_series: int) -> dict:
+        """在主进程中分配共享内存，返回值保存到 ``app.shared_ctx``"""
+        names = multiprocessing.RawArray("c", max_series * NAME_SIZE)
+        names[:len(OTHER)] = OTHER.encode()  # 0 号序列固定为 other
+        return {
+            "metrics_data": multiprocessing.RawArray("Q", max_workers * max_series * ROW),
+            "metrics_names": names,
+            "metrics_workers": multiprocessing.RawArray("b", max_workers),
+            "metrics_lock": multiprocessing.Lock(),
+        }
+
+    def _raw_name(self, slot: int) -> bytes:
+        return self.names[slot * NAME_SIZE:(slot + 1) * NAME_SIZE].rstrip(b"\0")
+
+    def _register(self, encoded: bytes, capped: bool = True) -> int:
+        """查找或登记序列名，调用方持有锁"""
+        prefix, sep, _ = encoded.partition(b":")
+        variants = 0
+        for i in range(self.max_series):
+            raw = self._raw_name(i)
+            if raw == encoded:
+                return i
+            if not raw:
+                if sep and capped and variants >= self.max_variants:
+                    return self._register(prefix + b":" + OTHER.encode(), capped=False)
+                self.names[i * NAME_SIZE:i * NAME_SIZE + len(encoded)] = encoded
+                return i
+            if sep and raw.startswith(prefix + b":"):
+                variants += 1
+        return 0  # 序列已满时归入 other
+
+    def _slot(self, name: str) -> int:
+        with self.lock:
+            slot = self._register(name.encode("utf-8")[:NAME_SIZE - 1])
+        self._slots[name] = slot
+        while len(self._rows) <= slot:
+            self._rows.append([0] * ROW)
+        return slot
+
+    def record(self, name: str, elapsed_ns: int) -> None:
+        slot = self._slots.get(name)
+        if slot is None:
+            slot = self._slot(name)
+        row = self._rows[slot]
+        value = elapsed_ns // 1000
+        if value > MAX_VALUE_US:
+            value = MAX_VALUE_US
+        # 与 bucket_index 相同，内联以减少每次请求的开销
+        shift = value.bit_length() - SUB_BITS
+        row[value if shift <= 0 else (shift << HALF_BITS) + (value >> shift)] += 1
+        row[N_BUCKETS] += 1
+        row[N_BUCKETS + 1] += value
+
+    def flush(self) -> None:
+        """把本 worker 的数据写入共享内存（单写者，无需加锁）"""
+        base = self.worker * self.max_series * ROW
+        for slot, row in enumerate(self._rows):
+            if row[N_BUCKETS]:
+                start = base + slot * ROW
+                self.shared[start:start + ROW] = row
+
+    def snapshot(self) -> dict[str, Histogram]:
+        """汇总所有 worker 的数据"""
+        self.flush()
+        result: dict[str, Histogram] = {}
+        per_worker = self.max_series * ROW
+        workers = len(self.shared) // per_worker
+        for slot in range(self.max_series):
+            name = self._raw_name(slot).decode("utf-8", "replace")
+            if not name:
+                break
+            histogram = result.setdefault(name, Histogram())
+            for worker in range(workers):
+                start = worker * per_worker + slot * ROW
+                if self.shared[start + N_BUCKETS]:
+                    histogram.merge(self.shared[start:start + ROW])
+        return result
+
+
+def series_name(request) -> str:
+    """序列名：优先使用处理器设置的 ``request.ctx.metrics_series``，否则为路由名"""
+    name = getattr(request.ctx, "metrics_series", None)
+    if name:
+        return name
+    return request.name or "unmatched"
+
+
+def setup_metrics(app, max_workers: int = 32, max_series: int = 64,
+                  flush_interval: float = 1.0, max_variants: int = 16) -> None:
+    @app.main_process_start
+    async def metrics_allocate(app):
+        for key, value in Metrics.allocate(max_workers, max_series).items():
+            setattr(app.shared_ctx, key, value)
+
+    @app.before_server_start
+    async def metrics_attach(app):
+        shared = vars(app.shared_ctx)
+        if "metrics_data" not in shared:
+            # 单进程模式不执行 main_process_start
+            shared = Metrics.allocate(1, max_series)
+        with shared["metrics_lock"]:
+            try:
+                worker = shared["metrics_workers"][:].index(0)
+            except ValueError:
+                raise RuntimeError(f"At most {max_workers} workers are supported") from None
+            shared["metrics_workers"][worker] = 1
+        app.ctx.metrics_shared = shared
+        app.ctx.metrics = Metrics(shared["metrics_data"], shared["metrics_names"],
+                                  shared["metrics_lock"], worker, max_series, max_variants)
+
+    @app.after_server_start
+    async def metrics_start_flush(app):
+        async def flush():
+            while True:
+                await asyncio.sleep(flush_interval)
+                app.ctx.metrics.flush()
+
+        app.add_task(flush(), name="metrics-flush")
+
+    @app.after_server_stop
+    async def metrics_detach(app):
+        shared = app.ctx.metrics_shared
+        metrics: Metrics = app.ctx.metrics
+        metrics.flush()
+        with shared["metrics_lock"]:
+            shared["metrics_workers"][metrics.worker] = 0
+
+    @app.on_request(priority=1000)
+    async def metrics_start(request):
+        request.ctx.metrics_start = time.perf_counter_ns()
+
+    @app.on_response(priority=-1000)
+    async def metrics_stop(request, response):
+        start = getattr(request.ctx, "metrics_start", None)
+        if start is not None:
+            request.app.ctx.metrics.record(series_name(request),
+                                           time.perf_counter_ns() - start)
+
+
+def _labels(name: str) -> str:
+    # Sanic 的路由名形如 app.blueprint.handler
+    parts = name.split(".")
+    blueprint = parts[1] if len(parts) == 3 else ""
+    name = name.replace("\\", "\\\\").replace('"', '\\"')
+    return f'route="{name}",blueprint="{blueprint}"'
+
+
+def render_metrics(app) -> str:
+    """Prometheus 文本格式"""
+    lines = [
+        "# HELP sanic_request_duration_seconds Request latency by route.",
+        "# TYPE sanic_request_duration_seconds histogram",
+    ]
+    snapshot = app.ctx.metrics.snapshot()
+    quantile_lines = [
+        "# HELP sanic_request_duration_quantile_seconds Estimated latency quantiles by route.",
+        "# TYPE sanic_request_duration_quantile_seconds gauge",
+    ]
+    for name, histogram in sorted(snapshot.items()):
+        labels = _labels(name)
+        for bound, count in zip(EXPORT_BOUNDS, histogram.cumulative(EXPORT_BOUNDS)):
+            lines.append(f'sanic_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'sanic_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"sanic_request_duration_seconds_sum{{{labels}}} {histogram.sum_us / 1e6}")
+        lines.append(f"sanic_request_duration_seconds_count{{{labels}}} {histogram.count}")
+        for q in QUANTILES:
+            quantile_lines.append(
+                f'sanic_request_duration_quantile_seconds{{{labels},quantile="{q}"}} '
+                f"{histogram.quantile(q)}"
+            )
+    return "\n".join(lines + quantile_lines) + "\n"
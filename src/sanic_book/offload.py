@@ -0,0 +1,380 @@
+"""把 CPU 密集的函数放到进程池或线程池中执行
+
+- ``"process"`` 执行池属于整个应用：由 Sanic 的 Worker Manager 按 ``size``（默认为 CPU 数）
+  启动并管理一组进程，各 worker 通过共享任务队列提交，结果经各自的结果队列返回。
+  Sanic worker 是守护进程，不能自己创建 ``ProcessPoolExecutor``。
+- ``"thread"`` 执行池在每个 worker 内各建一个 ``ThreadPoolExecutor``，适合释放 GIL 的调用。
+
+被 :func:`offload` 装饰的函数调用后返回可等待对象。提交到进程池时函数只按
+``模块名 + 限定名`` 引用传递，实际序列化的只有参数（尽量传 bytes/str 等简单类型）；
+序列化在队列的后台线程中进行，不占用事件循环。未调用 :func:`setup_offload`、
+没有同名执行池或以单进程模式运行时改用 ``asyncio.to_thread``，仍不阻塞事件循环。
+
+用法::
+
+    setup_offload(app, {"cpu": ("process", 0), "io": ("thread", 8)})
+
+    @offload("cpu")
+    def sign(payload: dict, secret: str) -> str:
+        ...
+
+    token = await sign(payload, secret)
+"""
+import asyncio
+import importlib
+from abc import ABC, abstractmethod
+import itertools
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, update_wrapper
+from multiprocessing.reduction import ForkingPickler
+
+from sanic.log import logger
+
+from .metrics import EXPORT_BOUNDS
+
+# 每个 worker 每个执行池一行：提交数、完成数、失败数、总耗时、执行耗时（秒）、各延迟桶计数
+SUBMITTED, COMPLETED, FAILED, LATENCY_SUM, RUN_SUM = range(5)
+BUCKETS = RUN_SUM + 1
+ROW = BUCKETS + len(EXPORT_BOUNDS)
+
+# 当前 worker 进程的执行池（一个进程只运行一个 Sanic 应用）
+_pools: dict[str, "Pool"] = {}
+
+
+def _resolve(module: str, qualname: str):
+    obj = importlib.import_module(module)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _call(fn, args, kwargs):
+    """在执行池中运行，同时返回执行耗时"""
+    fn = fn.func if isinstance(fn, Offloaded) else fn
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+class Offloaded:
+    """:func:`offload` 返回的可调用对象；序列化时只传模块名与限定名"""
+
+    def __init__(self, func, pool: str):
+        self.func = func
+        self.pool = pool
+        update_wrapper(self, func)
+
+    def __reduce__(self):
+        return _resolve, (self.__module__, self.__qualname__)
+
+    def __call__(self, *args, **kwargs):
+        return run(self.pool, self, *args, **kwargs)
+
+
+def offload(pool: str = "cpu"):
+    """把模块级同步函数标记为在名为 pool 的执行池中运行"""
+    def decorator(func):
+        return Offloaded(func, pool)
+    return decorator
+
+
+async def run(pool: str, fn, *args, **kwargs):
+    """在名为 pool 的执行池中运行 fn(*args, **kwargs)；没有该执行池时用默认线程池"""
+    target = _pools.get(pool)
+    if target is None:
+        return await asyncio.to_thread(fn.func if isinstance(fn, Offloaded) else fn,
+                                       *args, **kwargs)
+    return await target.submit(fn, args, kwargs)
+
+
+def serve_pool(tasks, results) -> None:
+    """进程池中每个进程的主循环，由 Worker Manager 启动
+
+    任务为 (worker, task_id, fn, args, kwargs)，结果为 (task_id, ok, 执行耗时, 序列化后的返回值或异常)，
+    放入提交者所在 worker 的结果队列。队列在后台线程中序列化，出错时只打印而不通知调用方，
+    因此返回值在这里先序列化。
+    """
+    try:
+        while (task := tasks.get()) is not None:
+            worker, task_id, fn, args, kwargs = task
+            try:
+                elapsed, result = _call(fn, args, kwargs)
+                ok = True
+            except Exception as exc:
+                elapsed, result, ok = 0.0, exc, False
+            try:
+                payload = ForkingPickler.dumps(result)
+            except Exception as exc:  # 返回值或异常无法序列化
+                ok, payload = False, ForkingPickler.dumps(RuntimeError(repr(exc)))
+            results[worker].put((task_id, ok, elapsed, bytes(payload)))
+    except KeyboardInterrupt:  # 主进程停止时发送 SIGINT
+        pass
+
+
+class Pool(ABC):
+    """一个执行池及其指标
+
+    ``shared[offset:offset + ROW]`` 为共享内存中属于本 worker、本执行池的一行，
+    只由本 worker 的事件循环写入。
+    """
+
+    def __init__(self, name: str, size: int, shared, offset: int):
+        self.name = name
+        self.size = size
+        self.shared = shared
+        self.offset = offset
+        self.inflight = 0
+
+    @abstractmethod
+    async def execute(self, fn, args: tuple, kwargs: dict) -> tuple[float, object]:
+        """运行 fn(*args, **kwargs)，返回 (执行耗时, 返回值)"""
+
+    async def submit(self, fn, args: tuple, kwargs: dict):
+        shared, offset = self.shared, self.offset
+        shared[offset + SUBMITTED] += 1
+        self.inflight += 1
+        start = time.perf_counter()
+        try:
+            elapsed, result = await self.execute(fn, args, kwargs)
+        except BaseException:
+            shared[offset + FAILED] += 1
+            raise
+        finally:
+            self.inflight -= 1
+        latency = time.perf_counter() - start
+        shared[offset + COMPLETED] += 1
+        shared[offset + LATENCY_SUM] += latency
+        shared[offset + RUN_SUM] += elapsed
+        for i, bound in enumerate(EXPORT_BOUNDS):
+            if latency <= bound:
+                shared[offset + BUCKETS + i] += 1
+                break
+        return result
+
+    @property
+    def queued(self) -> int:
+        """本 worker 提交、尚在等待空闲执行单元的任务数（估计值）"""
+        return max(self.inflight - self.size, 0)
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class ThreadPool(Pool):
+    def start(self) -> None:
+        self.executor = ThreadPoolExecutor(self.size, thread_name_prefix=f"offload-{self.name}")
+
+    async def execute(self, fn, args, kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(_call, fn, args, kwargs))
+
+    def stop(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessPool(Pool):
+    """应用级进程池的客户端：提交到共享任务队列，后台线程读取本 worker 的结果队列
+
+    结果队列按 worker 槽位复用，任务 ID 带上本进程的 pid：重启后占用同一槽位的 worker
+    会忽略发给旧进程的结果。执行进程在任务中途退出时结果不会到来，等待 ``timeout`` 秒
+    （包括排队时间）后以 :class:`TimeoutError` 失败。
+    """
+
+    def __init__(self, name: str, size: int, shared, offset: int,
+                 tasks, results, worker: int, timeout: float = 60.0):
+        super().__init__(name, size, shared, offset)
+        self.tasks = tasks
+        self.results = results
+        self.worker = worker
+        self.timeout = timeout
+        self._pid = os.getpid()
+        self._ids = itertools.count()
+        self._futures: dict[tuple[int, int], asyncio.Future] = {}
+        self._stopping = False
+
+    @property
+    def queued(self) -> int:
+        """所有 worker 提交、尚未被执行进程取走的任务数"""
+        try:
+            return self.tasks.qsize()
+        except NotImplementedError:  # macOS
+            return super().queued
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._reader = threading.Thread(target=self._read, name=f"offload-{self.name}",
+                                        daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        while True:
+            reply = self.results.get()
+            if reply is None:
+                if self._stopping:
+                    break
+                continue  # 上一个占用该槽位的 worker 停止时留下的
+            task_id, ok, elapsed, payload = reply
+            if task_id[0] != self._pid:
+                continue
+            try:
+                value = pickle.loads(payload)
+            except Exception as exc:
+                ok, value = False, RuntimeError(repr(exc))
+            self._loop.call_soon_threadsafe(self._resolve, task_id, ok, elapsed, value)
+
+    def _resolve(self, task_id: tuple[int, int], ok: bool, elapsed: float, value) -> None:
+        future = self._futures.pop(task_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result((elapsed, value))
+        else:
+            future.set_exception(value)
+
+    async def execute(self, fn, args, kwargs):
+        task_id = (self._pid, next(self._ids))
+        future = self._futures[task_id] = self._loop.create_future()
+        self.tasks.put((self.worker, task_id, fn, args, kwargs))
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Offloaded task {task_id[1]} in pool {self.name!r} "
+                               f"did not finish within {self.timeout}s") from None
+        finally:
+            self._futures.pop(task_id, None)
+
+    def stop(self) -> None:
+        self._stopping = True
+        self.results.put(None)
+        self._reader.join(timeout=1)
+        for future in self._futures.values():
+            future.cancel()
+
+
+def default_size(kind: str) -> int:
+    cpus = os.cpu_count() or 1
+    return cpus if kind == "process" else min(32, cpus + 4)  # 后者与 ThreadPoolExecutor 相同
+
+
+def setup_offload(app, pools: dict[str, tuple[str, int]], max_workers: int = 32,
+                  timeout: float = 60.0) -> None:
+    """``pools`` 为 名称 -> (``"process"`` 或 ``"thread"``, 大小)，大小为 0 时按 CPU 数计算
+
+    进程池的结果队列按 worker 槽位分配，``max_workers`` 为同时运行的 worker 数上限；
+    ``timeout`` 为进程池任务等待结果的最长时间（秒）。
+    """
+    names = list(pools)
+    for kind, _ in pools.values():
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown pool kind: {kind!r}")
+    processes = {name: size or default_size(kind)
+                 for name, (kind, size) in pools.items() if kind == "process"}
+
+    @app.main_process_start
+    async def offload_allocate(app):
+        ctx = app.shared_ctx
+        ctx.offload_data = multiprocessing.RawArray("d", max_workers * len(names) * ROW)
+        ctx.offload_workers = multiprocessing.RawArray("i", max_workers)
+        ctx.offload_lock = multiprocessing.Lock()
+        if processes:
+            ctx.offload_results = tuple(multiprocessing.Queue() for _ in range(max_workers))
+            for name in processes:
+                setattr(ctx, f"offload_{name}_tasks", multiprocessing.Queue())
+
+    @app.main_process_ready
+    async def offload_spawn(app):
+        ctx = app.shared_ctx
+        for name, size in processes.items():
+            app.manager.manage(f"Offload-{name}", serve_pool,
+                               {"tasks": getattr(ctx, f"offload_{name}_tasks"),
+                                "results": ctx.offload_results},
+                               workers=size)
+
+    @app.before_server_start
+    async def offload_start(app):
+        ctx = app.shared_ctx
+        if not hasattr(ctx, "offload_data"):
+            logger.info("Offload pools are disabled in single process mode")
+            return
+        with ctx.offload_lock:
+            try:
+                worker = ctx.offload_workers[:].index(0)
+            except ValueError:
+                raise RuntimeError(f"At most {max_workers} workers are supported") from None
+            ctx.offload_workers[worker] = os.getpid()
+        base = worker * len(names) * ROW
+        ctx.offload_data[base:base + len(names) * ROW] = [0.0] * (len(names) * ROW)
+        for index, (name, (kind, size)) in enumerate(pools.items()):
+            offset = base + index * ROW
+            if kind == "process":
+                pool = ProcessPool(name, processes[name], ctx.offload_data, offset,
+                                   getattr(ctx, f"offload_{name}_tasks"),
+                                   ctx.offload_results[worker], worker, timeout)
+            else:
+                pool = ThreadPool(name, size or default_size(kind), ctx.offload_data, offset)
+            pool.start()
+            _pools[name] = pool
+        app.ctx.offload_worker = worker
+        app.ctx.offload = dict(_pools)
+
+    @app.after_server_stop
+    async def offload_stop(app):
+        pools = getattr(app.ctx, "offload", None)
+        if pools is None:
+            return
+        for pool in pools.values():
+            pool.stop()
+        _pools.clear()
+        with app.shared_ctx.offload_lock:
+            app.shared_ctx.offload_workers[app.ctx.offload_worker] = 0
+
+
+def render_offload(app) -> str:
+    """Prometheus 文本格式，汇总所有 worker"""
+    pools: dict[str, Pool] | None = getattr(app.ctx, "offload", None)
+    if not pools:
+        return ""
+    ctx = app.shared_ctx
+    data = ctx.offload_data
+    workers = [i for i, pid in enumerate(ctx.offload_workers[:]) if pid]
+    pid = os.getpid()
+    depth = ["# HELP sanic_offload_queue_depth Tasks waiting for a free pool slot.",
+             "# TYPE sanic_offload_queue_depth gauge"]
+    tasks = ["# HELP sanic_offload_tasks_total Offloaded tasks by outcome.",
+             "# TYPE sanic_offload_tasks_total counter"]
+    inflight = ["# HELP sanic_offload_tasks_inflight Offloaded tasks submitted but not finished.",
+                "# TYPE sanic_offload_tasks_inflight gauge"]
+    run_time = ["# HELP sanic_offload_run_seconds_total Time spent executing offloaded tasks.",
+                "# TYPE sanic_offload_run_seconds_total counter"]
+    duration = ["# HELP sanic_offload_duration_seconds Offloaded task latency including queueing.",
+                "# TYPE sanic_offload_duration_seconds histogram"]
+    for index, (name, pool) in enumerate(pools.items()):
+        row = [0.0] * ROW
+        for worker in workers:
+            start = (worker * len(pools) + index) * ROW
+            for i, value in enumerate(data[start:start + ROW]):
+                row[i] += value
+        labels = f'pool="{name}"'
+        depth.append(f'sanic_offload_queue_depth{{{labels},pid="{pid}"}} {pool.queued}')
+        for outcome, value in (("completed", row[COMPLETED]), ("failed", row[FAILED])):
+            tasks.append(f'sanic_offload_tasks_total{{{labels},outcome="{outcome}"}} {int(value)}')
+        pending = row[SUBMITTED] - row[COMPLETED] - row[FAILED]
+        inflight.append(f"sanic_offload_tasks_inflight{{{labels}}} {int(pending)}")
+        run_time.append(f"sanic_offload_run_seconds_total{{{labels}}} {row[RUN_SUM]}")
+        seen = 0
+        for i, bound in enumerate(EXPORT_BOUNDS):
+            seen += int(row[BUCKETS + i])
+            duration.append(f'sanic_offload_duration_seconds_bucket{{{labels},le="{bound}"}} {seen}')
+        count = int(row[COMPLETED])
+        duration.append(f'sanic_offload_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        duration.append(f"sanic_offload_duration_seconds_sum{{{labels}}} {row[LATENCY_SUM]}")
+        duration.append(f"sanic_offload_duration_seconds_count{{{labels}}} {count}")
+    return "\n".join(depth + tasks + inflight + run_time + duration) + "\n"
@@ -0,0 +1,162 @@
+"""进程内发布/订阅与跨 worker 转发
+
+:class:`Broker` 按主题把事件（可 JSON 编码的 dict）分发给本 worker 的监听者；
+接入 :class:`SharedRelay` 后，事件同时写入共享内存中的环形缓冲，其他 worker 的
+后台任务轮询序号，取出后再在本地分发，于是任一 worker 发布的事件所有 worker 都能收到。
+
+用法::
+
+    setup_pubsub(app)
+
+    async for event in app.ctx.broker.listen("groups"):
+        ...
+
+    app.ctx.broker.publish("groups", {"kind": "added", "group_id": "1"})
+"""
+import asyncio
+import ctypes
+import multiprocessing
+import os
+import struct
+from collections.abc import AsyncIterator
+
+from sanic.log import logger
+
+from .serialization import dumps, loads
+
+# 环形缓冲中每条事件的头部：发布者 pid
+_HEAD = struct.Struct("!I")
+
+
+class SharedRelay:
+    """共享内存中的事件环形缓冲
+
+    写入方加锁追加并在最后更新序号；读取方比较序号即可知道有无新事件，
+    只在复制条目时加锁。落后超过 ``slots`` 条的事件会丢失并记录警告。
+    """
+
+    def __init__(self, shared: dict):
+        self._seq = shared["pubsub_seq"]
+        self._data = shared["pubsub_data"]
+        self._lengths = shared["pubsub_lengths"]
+        self._lock = shared["pubsub_lock"]
+        self.slots = len(self._lengths)
+        self.slot_size = len(self._data) // self.slots
+        self.seen = self._seq.value
+        self.pid = os.getpid()
+        self.lost = 0
+
+    @staticmethod
+    def allocate(slots: int = 1024, slot_size: int = 4096) -> dict:
+        """在主进程中分配共享内存，返回值保存到 ``app.shared_ctx``"""
+        return {"pubsub_seq": multiprocessing.RawValue("Q", 0),
+                "pubsub_data": multiprocessing.RawArray(ctypes.c_char, slots * slot_size),
+                "pubsub_lengths": multiprocessing.RawArray("I", slots),
+                "pubsub_lock": multiprocessing.Lock()}
+
+    def publish(self, topic: str, event: dict) -> bool:
+        data = _HEAD.pack(self.pid) + dumps([topic, event])
+        if len(data) > self.slot_size:
+            logger.warning("Event on %r is too large to relay (%d bytes)", topic, len(data))
+            return False
+        with self._lock:
+            seq = self._seq.value + 1
+            slot = seq % self.slots
+            start = slot * self.slot_size
+            self._data[start:start + len(data)] = data
+            self._lengths[slot] = len(data)
+            self._seq.value = seq
+        return True
+
+    def poll(self) -> list[tuple[str, dict]]:
+        """返回其他 worker 在上次调用之后发布的事件"""
+        seq = self._seq.value
+        if seq == self.seen:
+            return []
+        first = self.seen + 1
+        if seq - self.seen > self.slots:
+            self.lost += seq - self.seen - self.slots
+            logger.warning("Relay fell behind; %d events lost", seq - self.seen - self.slots)
+            first = seq - self.slots + 1
+        raw = []
+        with self._lock:
+            for i in range(first, seq + 1):
+                slot = i % self.slots
+                start = slot * self.slot_size
+                raw.append(self._data[start:start + self._lengths[slot]])
+        self.seen = seq
+        events = []
+        for data in raw:
+            (pid,) = _HEAD.unpack_from(data)
+            if pid != self.pid:
+                topic, event = loads(data[_HEAD.size:])
+                events.append((topic, event))
+        return events
+
+
+class Broker:
+    """一个 worker 的发布/订阅中心，挂在 ``app.ctx.broker``
+
+    每个监听者有一个容量为 ``max_queue`` 的队列，满时丢弃最旧的事件。
+    """
+
+    def __init__(self, relay: SharedRelay | None = None, max_queue: int = 1024):
+        self.relay = relay
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+
+    def publish(self, topic: str, event: dict) -> None:
+        self.deliver(topic, event)
+        if self.relay is not None:
+            self.relay.publish(topic, event)
+
+    def deliver(self, topic: str, event: dict) -> None:
+        """只在本 worker 内分发"""
+        for queue in self._listeners.get(topic, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    async def listen(self, topic: str) -> AsyncIterator[dict]:
+        queue: asyncio.Queue = asyncio.Queue(self.max_queue)
+        listeners = self._listeners.setdefault(topic, set())
+        listeners.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            listeners.discard(queue)
+            if not listeners:
+                self._listeners.pop(topic, None)
+
+
+def setup_pubsub(app, slots: int = 1024, slot_size: int = 4096,
+                 poll_interval: float = 0.005) -> None:
+    """``poll_interval`` 为读取其他 worker 事件的间隔（秒），决定跨 worker 的额外延迟"""
+
+    @app.main_process_start
+    async def pubsub_allocate(app):
+        for key, value in SharedRelay.allocate(slots, slot_size).items():
+            setattr(app.shared_ctx, key, value)
+
+    @app.before_server_start
+    async def pubsub_attach(app):
+        shared = vars(app.shared_ctx)
+        relay = SharedRelay(shared) if "pubsub_seq" in shared else None
+        app.ctx.broker = Broker(relay)
+
+    @app.after_server_start
+    async def pubsub_start_relay(app):
+        broker: Broker = app.ctx.broker
+        if broker.relay is None:
+            return
+
+        async def relay():
+            while True:
+                await asyncio.sleep(poll_interval)
+                for topic, event in broker.relay.poll():
+                    broker.deliver(topic, event)
+
+        app.add_task(relay(), name="pubsub-relay")
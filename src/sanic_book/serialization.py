@@ -0,0 +1,127 @@
+"""可替换后端的 JSON 序列化
+
+按 orjson → ujson → 标准库的顺序选用已安装的编码器，也可用环境变量
+``SANIC_BOOK_JSON`` 指定。dataclass（含 Strawberry 类型）、``date``/``datetime``、
+UUID、Enum 以及 ``strawberry.UNSET`` 都能直接编码，不必先转换成 dict。
+:func:`dumps` 统一返回 UTF-8 bytes，可直接用作 ``Sanic(dumps=...)``，
+这样所有 ``sanic.response.json()`` 响应都走同一条快速路径。
+
+用法::
+
+    from sanic_book.serialization import Precoded, dumps, loads
+
+    app = Sanic("app", dumps=dumps, loads=loads)
+    FOO = Precoded({"foo": "bar"})  # 只编码一次
+
+    @app.get("/")
+    async def foo(request):
+        return FOO.response()
+"""
+import dataclasses
+import datetime
+import decimal
+import enum
+import json as _json
+import os
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from sanic.response import HTTPResponse, raw
+
+BACKENDS = ("orjson", "ujson", "json")
+JSON_ENV = "SANIC_BOOK_JSON"
+CONTENT_TYPE = "application/json"
+
+# dataclass -> 字段名，避免每次调用 dataclasses.fields
+_fields: dict[type, tuple[str, ...]] = {}
+
+
+def default(obj: Any) -> Any:
+    """编码器不认识的类型转换为可编码的值"""
+    cls = type(obj)
+    names = _fields.get(cls)
+    if names is None and dataclasses.is_dataclass(cls):
+        names = _fields[cls] = tuple(f.name for f in dataclasses.fields(cls))
+    if names is not None:
+        return {name: getattr(obj, name) for name in names}
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (uuid.UUID, decimal.Decimal)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if cls.__name__ == "UnsetType":  # strawberry.UNSET，不必为此导入 strawberry
+        return None
+    raise TypeError(f"Object of type {cls.__name__} is not JSON serializable")
+
+
+def _orjson() -> tuple[Callable[[Any], bytes], Callable]:
+    import orjson
+
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any, **_) -> bytes:
+        return orjson.dumps(obj, default=default, option=option)
+    return dumps, orjson.loads
+
+
+def _ujson() -> tuple[Callable[[Any], bytes], Callable]:
+    import ujson
+
+    def dumps(obj: Any, **_) -> bytes:
+        return ujson.dumps(obj, default=default, ensure_ascii=False,
+                           escape_forward_slashes=False).encode()
+    return dumps, ujson.loads
+
+
+def _stdlib() -> tuple[Callable[[Any], bytes], Callable]:
+    encoder = _json.JSONEncoder(default=default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj: Any, **_) -> bytes:
+        return encoder.encode(obj).encode()
+    return dumps, _json.loads
+
+
+_loaders = {"orjson": _orjson, "ujson": _ujson, "json": _stdlib}
+
+
+def select(name: str | None = None) -> tuple[str, Callable[[Any], bytes], Callable]:
+    """返回 (后端名, dumps, loads)；name 为空时选第一个可用的后端"""
+    for candidate in ([name] if name else BACKENDS):
+        try:
+            return (candidate, *_loaders[candidate]())
+        except ImportError:
+            if name:
+                raise
+    raise RuntimeError("No JSON backend available")
+
+
+backend, dumps, loads = select(os.environ.get(JSON_ENV) or None)
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode()
+
+
+def json(body: Any, status: int = 200, headers: dict[str, str] | None = None,
+         content_type: str = CONTENT_TYPE) -> HTTPResponse:
+    return raw(dumps(body), status=status, headers=headers, content_type=content_type)
+
+
+class Precoded:
+    """只编码一次的常量 JSON 负载
+
+    HTTPResponse 对象会被中间件修改，不能跨请求复用，因此缓存的是编码后的 bytes。
+    """
+
+    __slots__ = ("body", "content_type")
+
+    def __init__(self, payload: Any, content_type: str = CONTENT_TYPE):
+        self.body = dumps(payload)
+        self.content_type = content_type
+
+    def response(self, status: int = 200, headers: dict[str, str] | None = None) -> HTTPResponse:
+        return raw(self.body, status=status, headers=headers, content_type=self.content_type)
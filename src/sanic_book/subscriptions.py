@@ -0,0 +1,268 @@
+"""GraphQL 订阅：Sanic WebSocket 上的 graphql-transport-ws 协议
+
+Strawberry 的 Sanic 视图不支持 WebSocket，这里直接实现该协议。
+
+- 相同的订阅（query、variables、operationName 都相同）在一个 worker 内只执行一次：
+  :class:`Channel` 运行 ``schema.subscribe``，每个结果只编码一次，再分发给所有订阅者。
+- 每个连接有一个写任务和容量为 ``max_queue`` 帧的队列，``ws.send`` 会等待 TCP
+  缓冲区排空，慢的客户端只会让自己的队列变长；队列写满时以 1013 关闭该连接，
+  内存占用因此有界，也不会拖慢其他订阅者。
+- 通过 WebSocket 发来的 query/mutation 按普通请求执行。
+
+用法::
+
+    subscriptions = SubscriptionServer(schema, context_getter)
+    app.add_websocket_route(subscriptions.handle, "/graphql/ws", subprotocols=[PROTOCOL])
+"""
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+from typing import Any
+
+from graphql import GraphQLError, get_operation_ast, parse
+from sanic.exceptions import WebsocketClosed
+from sanic.log import logger
+from strawberry.types.execution import PreExecutionError
+from websockets.exceptions import ConnectionClosed
+
+from .serialization import dumps_str, loads
+
+PROTOCOL = "graphql-transport-ws"
+
+ACK = '{"type":"connection_ack"}'
+PONG = '{"type":"pong"}'
+
+
+@lru_cache(maxsize=256)
+def operation_type(query: str, operation_name: str | None) -> str | None:
+    """``"query"``、``"mutation"``、``"subscription"``；无法解析时为 None"""
+    try:
+        operation = get_operation_ast(parse(query), operation_name)
+    except GraphQLError:
+        return None
+    return None if operation is None else operation.operation.value
+
+
+def _payload(result) -> dict[str, Any]:
+    payload: dict[str, Any] = {"data": result.data}
+    if result.errors:
+        payload["errors"] = [error.formatted for error in result.errors]
+    return payload
+
+
+class Connection:
+    """一个 WebSocket 连接及其有界发送队列"""
+
+    def __init__(self, app, ws, max_queue: int):
+        self.app = app
+        self.ws = ws
+        self.max_queue = max_queue
+        self.acked = False
+        self.closed = False
+        self.subscriptions: dict[str, "Channel"] = {}
+        self._frames: deque[str] = deque()
+        self._ready = asyncio.Event()
+        self._closing: asyncio.Task | None = None
+
+    def push(self, frame: str) -> None:
+        if self.closed:
+            return
+        if len(self._frames) >= self.max_queue:
+            self.close(1013, "Subscriber too slow")
+            return
+        self._frames.append(frame)
+        self._ready.set()
+
+    def close(self, code: int, reason: str) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._frames.clear()
+        self._ready.set()
+        self._closing = asyncio.create_task(self.ws.close(code, reason))
+
+    async def writer(self) -> None:
+        frames = self._frames
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+                while frames and not self.closed:
+                    await self.ws.send(frames.popleft())
+        except (ConnectionClosed, WebsocketClosed):
+            self.closed = True
+            frames.clear()
+
+
+class Channel:
+    """一个 worker 内所有相同订阅共用的执行"""
+
+    def __init__(self, server: "SubscriptionServer", app, key: tuple, query: str,
+                 variables: dict | None, operation_name: str | None):
+        self.server = server
+        self.app = app
+        self.key = key
+        self.query = query
+        self.variables = variables
+        self.operation_name = operation_name
+        # (连接, 订阅 ID) -> 编码好的订阅 ID
+        self.subscribers: dict[tuple[Connection, str], str] = {}
+        self.task: asyncio.Task | None = None
+
+    def add(self, connection: Connection, sub_id: str) -> None:
+        self.subscribers[(connection, sub_id)] = dumps_str(sub_id)
+        connection.subscriptions[sub_id] = self
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(), name=f"subscription:{self.operation_name}")
+
+    def remove(self, connection: Connection, sub_id: str) -> None:
+        self.subscribers.pop((connection, sub_id), None)
+        connection.subscriptions.pop(sub_id, None)
+        if not self.subscribers:
+            self.close()
+
+    def close(self) -> None:
+        if self.server.channels.get(self.key) is self:
+            del self.server.channels[self.key]
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    def broadcast(self, kind: str, payload: str | None = None) -> None:
+        tail = "}" if payload is None else f',"payload":{payload}}}'
+        for (connection, _), id_json in list(self.subscribers.items()):
+            connection.push(f'{{"id":{id_json},"type":"{kind}"{tail}')
+
+    async def run(self) -> None:
+        server = self.server
+        try:
+            context = await server.context_getter(self.app)
+            results = await server.schema.subscribe(self.query, variable_values=self.variables,
+                                                    context_value=context,
+                                                    operation_name=self.operation_name)
+            async for result in results:
+                if isinstance(result, PreExecutionError):
+                    self.broadcast("error", dumps_str(_payload(result)["errors"]))
+                    break
+                self.broadcast("next", dumps_str(_payload(result)))
+                server.events += 1
+            else:
+                self.broadcast("complete")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("Subscription %r failed", self.operation_name)
+            self.broadcast("error", dumps_str([{"message": str(exc)}]))
+        finally:
+            # 执行已结束：订阅者不再属于本频道
+            if self.server.channels.get(self.key) is self:
+                del self.server.channels[self.key]
+            for connection, sub_id in list(self.subscribers):
+                connection.subscriptions.pop(sub_id, None)
+            self.subscribers.clear()
+
+
+class SubscriptionServer:
+    """``context_getter(app)`` 为协程函数，返回订阅执行时共用的 context"""
+
+    def __init__(self, schema, context_getter: Callable[[Any], Awaitable[Any]],
+                 max_queue: int = 256, init_timeout: float = 3.0):
+        self.schema = schema
+        self.context_getter = context_getter
+        self.max_queue = max_queue
+        self.init_timeout = init_timeout
+        self.channels: dict[tuple, Channel] = {}
+        self.connections = 0
+        self.events = 0  # 已执行的订阅结果数（每个频道每个事件计一次）
+
+    async def handle(self, request, ws) -> None:
+        if ws.subprotocol != PROTOCOL:
+            await ws.close(4406, "Subprotocol not acceptable")
+            return
+        connection = Connection(request.app, ws, self.max_queue)
+        writer = asyncio.create_task(connection.writer())
+        self.connections += 1
+        try:
+            message = await ws.recv(timeout=self.init_timeout)
+            if message is None:
+                await ws.close(4408, "Connection initialisation timeout")
+                return
+            while not connection.closed:
+                await self.on_message(connection, message)
+                message = await ws.recv()
+                if message is None:
+                    break
+        except ConnectionClosed:
+            pass
+        finally:
+            self.connections -= 1
+            for sub_id, channel in list(connection.subscriptions.items()):
+                channel.remove(connection, sub_id)
+            writer.cancel()
+
+    async def on_message(self, connection: Connection, raw: str | bytes) -> None:
+        try:
+            message = loads(raw)
+            kind = message["type"]
+        except (ValueError, TypeError, KeyError):
+            connection.close(4400, "Invalid message")
+            return
+        if kind == "connection_init":
+            if connection.acked:
+                connection.close(4429, "Too many initialisation requests")
+                return
+            connection.acked = True
+            connection.push(ACK)
+        elif kind == "ping":
+            connection.push(PONG)
+        elif kind == "pong":
+            pass
+        elif not connection.acked:
+            connection.close(4401, "Unauthorized")
+        elif kind == "subscribe":
+            await self.subscribe(connection, message)
+        elif kind == "complete":
+            channel = connection.subscriptions.get(message.get("id"))
+            if channel is not None:
+                channel.remove(connection, message["id"])
+        else:
+            connection.close(4400, f"Unknown message type: {kind}")
+
+    async def subscribe(self, connection: Connection, message: dict) -> None:
+        sub_id = message.get("id")
+        payload = message.get("payload")
+        if not isinstance(sub_id, str) or not isinstance(payload, dict):
+            connection.close(4400, "Invalid subscribe message")
+            return
+        query = payload.get("query")
+        variables = payload.get("variables")
+        operation_name = payload.get("operationName")
+        if (not isinstance(query, str) or not isinstance(variables, dict | None)
+                or not isinstance(operation_name, str | None)):
+            connection.close(4400, "Invalid subscribe message")
+            return
+        if sub_id in connection.subscriptions:
+            connection.close(4409, f"Subscriber for {sub_id} already exists")
+            return
+        if operation_type(query, operation_name) != "subscription":
+            await self.execute(connection, sub_id, query, variables, operation_name)
+            return
+        key = (query, dumps_str(variables), operation_name)
+        channel = self.channels.get(key)
+        if channel is None:
+            channel = self.channels[key] = Channel(self, connection.app, key, query,
+                                                          variables, operation_name)
+        channel.add(connection, sub_id)
+
+    async def execute(self, connection: Connection, sub_id: str, query: str,
+                      variables: dict | None, operation_name: str | None) -> None:
+        result = await self.schema.execute(query, variable_values=variables,
+                                           context_value=await self.context_getter(connection.app),
+                                           operation_name=operation_name)
+        id_json = dumps_str(sub_id)
+        if isinstance(result, PreExecutionError):
+            connection.push(f'{{"id":{id_json},"type":"error",'
+                            f'"payload":{dumps_str(_payload(result)["errors"])}}}')
+            return
+        connection.push(f'{{"id":{id_json},"type":"next","payload":{dumps_str(_payload(result))}}}')
+        connection.push(f'{{"id":{id_json},"type":"complete"}}')
@@ -0,0 +1,307 @@
+"""采样式请求追踪
+
+每个被采样的请求生成一棵 span 树：``request`` 为根，下面依次是请求中间件、
+处理器，以及处理器内部用 :func:`span` 标出的片段（模板读取、JWT 校验、
+GraphQL 解析器、DataLoader 批次等）。trace ID 由纳秒时间戳与随机数组成，
+请求 ID 作为根 span 的属性记录。完成的 span 先缓存在内存中，由后台任务按批写入 JSON Lines 或
+OTLP JSON 文件（每个进程一个文件），请求路径上不做任何磁盘 I/O。文件超过
+``max_bytes`` 后轮转，最多保留 ``backups`` 个旧文件。
+
+请求头 ``X-Trace: 1`` 可以强制采样，但只在 ``trust_header=True`` 或请求直接来自
+``trusted_proxies`` 中的地址时生效，否则任何客户端都能绕过采样率。
+
+未被采样的请求中 :func:`span` 返回空操作对象，开销只有一次 ContextVar 读取。
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from collections.abc import Collection
+from contextvars import ContextVar
+from typing import Any
+
+from sanic import Request
+
+TRACE_HEADER = "x-trace"
+
+
+class NanoSecondRequest(Request):
+    @classmethod
+    def generate_id(*_):
+        return time.time_ns()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "error", "_token", "_tracer")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: str | None,
+                 attributes: dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: str | None = None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self._token = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def child(self, name: str, **attributes) -> "Span":
+        return Span(self._tracer, name, self.trace_id, self.span_id, attributes)
+
+    def end(self) -> None:
+        if not self.end_ns:
+            self.end_ns = time.time_ns()
+            self._tracer.finished.append(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.error = repr(exc)
+        _current.reset(self._token)
+        self.end()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent_id, "name": self.name,
+                "start_ns": self.start_ns, "end_ns": self.end_ns,
+                "duration_us": (self.end_ns - self.start_ns) / 1000,
+                "attributes": self.attributes, "error": self.error}
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Span | None] = ContextVar("sanic_book_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+@contextmanager
+def activate(target: Span):
+    """把已创建的 span 设为当前 span，但退出时不结束它"""
+    token = _current.set(target)
+    try:
+        yield target
+    except BaseException as exc:
+        target.error = repr(exc)
+        raise
+    finally:
+        _current.reset(token)
+
+
+def span(name: str, **attributes) -> Span | _NoopSpan:
+    """在当前 span 下创建子 span，作为上下文管理器使用"""
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return parent.child(name, **attributes)
+
+
+class JsonLinesExporter:
+    """每个 span 一行 JSON"""
+
+    suffix = ".jsonl"
+
+    def encode(self, spans: list[Span]) -> str:
+        return "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+
+
+class OtlpFileExporter(JsonLinesExporter):
+    """OTLP 文件格式：每批一行 ExportTraceServiceRequest JSON"""
+
+    suffix = ".otlp.jsonl"
+
+    def __init__(self, service_name: str):
+        self.service_name = service_name
+
+    @staticmethod
+    def _value(value: Any) -> dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def encode(self, spans: list[Span]) -> str:
+        otlp_spans = []
+        for s in spans:
+            item = {"traceId": s.trace_id, "spanId": s.span_id, "name": s.name,
+                    "kind": 2 if s.parent_id is None else 1,
+                    "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns),
+                    "attributes": [{"key": k, "value": self._value(v)}
+                                   for k, v in s.attributes.items()]}
+            if s.parent_id:
+                item["parentSpanId"] = s.parent_id
+            if s.error:
+                item["status"] = {"code": 2, "message": s.error}
+            otlp_spans.append(item)
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": self.service_name}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "sanic_book.tracing"}, "spans": otlp_spans}],
+        }]}
+        return json.dumps(request) + "\n"
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, directory: str,
+                 exporter: JsonLinesExporter, batch_size: int = 512,
+                 max_buffer: int = 65536, trust_header: bool = False,
+                 trusted_proxies: Collection[str] = (), max_bytes: int = 64 << 20,
+                 backups: int = 3):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.path = os.path.join(directory, f"traces-{os.getpid()}{exporter.suffix}")
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.trust_header = trust_header
+        self.trusted_proxies = frozenset(trusted_proxies)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.finished: list[Span] = []
+        self.dropped = 0
+
+    def sampled(self, request: Request) -> bool:
+        if (request.headers.get(TRACE_HEADER) == "1"
+                and (self.trust_header or request.ip in self.trusted_proxies)):
+            return True
+        return random.random() < self.sample_rate
+
+    def start(self, request: Request) -> Span:
+        # 请求 ID 可能来自 X-Request-ID（字符串或 UUID），不用于构造 trace ID
+        trace_id = f"{time.time_ns():016x}{random.getrandbits(64):016x}"
+        return Span(self, "request", trace_id, None,
+                    {"http.method": request.method, "http.target": request.path,
+                     "request.id": request.id})
+
+    def take(self) -> list[Span]:
+        spans, self.finished = self.finished, []
+        if len(spans) > self.max_buffer:
+            # 写盘跟不上时丢弃最旧的 span，避免内存无限增长
+            self.dropped += len(spans) - self.max_buffer
+            spans = spans[-self.max_buffer:]
+        return spans
+
+    def _write(self, data: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            size = f.tell()
+        if size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        """path -> path.1 -> ... -> path.<backups>，最旧的被覆盖"""
+        if not self.backups:
+            os.unlink(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    async def flush(self) -> None:
+        spans = self.take()
+        for i in range(0, len(spans), self.batch_size):
+            await asyncio.to_thread(self._write, self.exporter.encode(spans[i:i + self.batch_size]))
+
+
+def setup_tracing(app, sample_rate: float = 0.01, directory: str = "traces",
+                  fmt: str = "jsonl", flush_interval: float = 1.0,
+                  trust_header: bool = False, trusted_proxies: Collection[str] = (),
+                  max_bytes: int = 64 << 20, backups: int = 3) -> None:
+    """为 app 开启追踪；``fmt`` 为 ``jsonl`` 或 ``otlp``"""
+    from sanic.signals import Event
+
+    @app.before_server_start
+    async def tracing_start(app):
+        os.makedirs(directory, exist_ok=True)
+        exporter = OtlpFileExporter(app.name) if fmt == "otlp" else JsonLinesExporter()
+        app.ctx.tracer = Tracer(sample_rate, directory, exporter, trust_header=trust_header,
+                                trusted_proxies=trusted_proxies, max_bytes=max_bytes,
+                                backups=backups)
+
+    @app.after_server_start
+    async def tracing_flush(app):
+        async def flush():
+            while True:
+                await asyncio.sleep(flush_interval)
+                await app.ctx.tracer.flush()
+
+        app.add_task(flush(), name="tracing-flush")
+
+    @app.after_server_stop
+    async def tracing_stop(app):
+        await app.ctx.tracer.flush()
+
+    # 中间件与信号都在处理请求的同一个任务里依次 await，
+    # 因此直接切换 ContextVar 即可让处理器内部的 span 挂到对应阶段下
+    def next_phase(request, name: str | None, **attributes) -> None:
+        request.ctx.trace_phase.end()
+        if name is None:
+            request.ctx.trace_phase = None
+            _current.set(None)
+        else:
+            phase = request.ctx.trace_phase = request.ctx.trace.child(name, **attributes)
+            _current.set(phase)
+
+    @app.on_request(priority=1001)
+    async def trace_request(request):
+        tracer: Tracer = request.app.ctx.tracer
+        if not tracer.sampled(request):
+            _current.set(None)
+            return
+        root = request.ctx.trace = tracer.start(request)
+        phase = request.ctx.trace_phase = root.child("middleware.request")
+        _current.set(phase)
+
+    @app.signal(Event.HTTP_HANDLER_BEFORE)
+    async def trace_handler_start(request):
+        if getattr(request.ctx, "trace_phase", None) is not None:
+            next_phase(request, "handler", route=request.name or "")
+
+    @app.signal(Event.HTTP_HANDLER_AFTER)
+    async def trace_handler_end(request):
+        if getattr(request.ctx, "trace_phase", None) is not None:
+            next_phase(request, "middleware.response")
+
+    @app.on_response(priority=-1001)
+    async def trace_response(request, response):
+        root: Span | None = getattr(request.ctx, "trace", None)
+        if root is None:
+            return
+        if getattr(request.ctx, "trace_phase", None) is not None:
+            next_phase(request, None)
+        root.set(**{"http.status_code": response.status})
+        response.headers["X-Trace-Id"] = root.trace_id
+        root.end()
@@ -0,0 +1,294 @@
+"""流式接收表单与文件上传
+
+路由以 ``stream=True`` 注册时，Sanic 不会先把请求体读入内存。:func:`receive_form`
+边读边解析 ``multipart/form-data``（:class:`MultipartParser`），文件内容攒够
+``buffer_size`` 字节后交给线程写盘并计算摘要，事件循环同时读取下一段；
+每个上传的内存占用只与 ``buffer_size`` 有关，与文件大小无关。
+
+请求体、单个文件与普通字段的大小都在读取过程中检查，超出即 413，已写入的文件会被删除。
+
+用法::
+
+    @app.post("/upload", stream=True)
+    async def upload(request):
+        form = await receive_form(request, "uploads", max_file=1 << 30, hash_name="sha256")
+        form.fields.get("title"), form.files.getlist("file")
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass, field
+from urllib.parse import parse_qsl
+
+from sanic.exceptions import BadRequest, PayloadTooLarge
+from sanic.headers import parse_content_header
+from sanic.request import RequestParameters
+
+# 每个分段头部的最大字节数
+MAX_HEADER_SIZE = 16384
+
+
+class MultipartParser:
+    """增量解析 multipart 请求体
+
+    :meth:`feed` 返回事件列表：``("headers", dict)`` 表示新分段开始，
+    ``("data", bytes)`` 为分段内容（可能分多次给出），``("end", None)`` 表示分段结束。
+    """
+
+    def __init__(self, boundary: bytes):
+        self.delimiter = b"\r\n--" + boundary
+        # 第一个分隔符前没有 CRLF，补上后即可统一处理
+        self._buffer = bytearray(b"\r\n")
+        self._state = "preamble"
+
+    @property
+    def finished(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, data: bytes) -> list[tuple[str, object]]:
+        buffer = self._buffer
+        buffer += data
+        delimiter = self.delimiter
+        events: list[tuple[str, object]] = []
+        while True:
+            state = self._state
+            if state == "done":
+                buffer.clear()  # 忽略结尾之后的内容
+                break
+            if state == "headers":
+                end = buffer.find(b"\r\n\r\n")
+                if end < 0:
+                    if len(buffer) > MAX_HEADER_SIZE:
+                        raise BadRequest("Multipart headers too large")
+                    break
+                events.append(("headers", self._headers(bytes(buffer[:end]))))
+                del buffer[:end + 4]
+                self._state = "body"
+            elif state == "boundary":
+                # 分隔符之后：``--`` 表示结束，否则跳过本行余下内容
+                if len(buffer) < 2:
+                    break
+                if buffer.startswith(b"--"):
+                    self._state = "done"
+                    continue
+                end = buffer.find(b"\r\n")
+                if end < 0:
+                    if len(buffer) > 1024:
+                        raise BadRequest("Malformed multipart boundary")
+                    break
+                del buffer[:end + 2]
+                self._state = "headers"
+            else:
+                index = buffer.find(delimiter)
+                if index < 0:
+                    # 末尾可能是分隔符的前半部分，保留下来
+                    keep = len(delimiter) - 1
+                    if len(buffer) > keep:
+                        if state == "body":
+                            events.append(("data", bytes(buffer[:-keep])))
+                        del buffer[:-keep]
+                    break
+                if state == "body":
+                    if index:
+                        events.append(("data", bytes(buffer[:index])))
+                    events.append(("end", None))
+                del buffer[:index + len(delimiter)]
+                self._state = "boundary"
+        return events
+
+    @staticmethod
+    def _headers(raw: bytes) -> dict[str, str]:
+        headers = {}
+        for line in raw.decode("utf-8", "replace").split("\r\n"):
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise BadRequest("Malformed multipart headers")
+            headers[name.strip().lower()] = value.strip()
+        return headers
+
+
+@dataclass(slots=True)
+class Upload:
+    name: str
+    filename: str
+    content_type: str
+    path: str  # 服务端保存的路径，不使用客户端给出的文件名
+    size: int = 0
+    digest: str | None = None  # 十六进制摘要，未开启时为 None
+
+
+@dataclass(slots=True)
+class Form:
+    fields: RequestParameters = field(default_factory=RequestParameters)
+    files: RequestParameters = field(default_factory=RequestParameters)
+
+    def uploads(self) -> list[Upload]:
+        return [upload for uploads in self.files.values() for upload in uploads]
+
+    async def remove(self) -> None:
+        """删除所有已保存的文件"""
+        await asyncio.to_thread(_unlink, [upload.path for upload in self.uploads()])
+
+
+def _unlink(paths: list[str]) -> None:
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class _Sink:
+    """把一个文件分段写入磁盘
+
+    数据先攒到 ``buffer_size`` 字节，再交给线程写入并更新摘要；同一时刻最多有
+    一次写入在进行，与下一段的读取重叠，内存占用约为两个缓冲区。
+    """
+
+    def __init__(self, upload: Upload, hash_name: str | None, buffer_size: int):
+        self.upload = upload
+        self.buffer_size = buffer_size
+        self._hash = hashlib.new(hash_name) if hash_name else None
+        self._buffer = bytearray()
+        self._pending: asyncio.Future | None = None
+        self._fp = None
+
+    async def open(self, directory: str) -> None:
+        fd, self.upload.path = await asyncio.to_thread(
+            tempfile.mkstemp, dir=directory, prefix="upload-")
+        self._fp = os.fdopen(fd, "wb", buffering=0)
+
+    async def write(self, data: bytes) -> None:
+        self._buffer += data
+        if len(self._buffer) >= self.buffer_size:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if self._pending is not None:
+            await self._pending
+        chunk, self._buffer = self._buffer, bytearray()
+        self._pending = asyncio.ensure_future(asyncio.to_thread(self._write, chunk))
+
+    def _write(self, chunk: bytearray) -> None:
+        self._fp.write(chunk)
+        if self._hash is not None:
+            self._hash.update(chunk)
+
+    async def close(self) -> None:
+        if self._buffer:
+            await self._flush()
+        if self._pending is not None:
+            await self._pending
+        await asyncio.to_thread(self._fp.close)
+        if self._hash is not None:
+            self.upload.digest = self._hash.hexdigest()
+
+    async def abort(self) -> None:
+        if self._pending is not None:
+            try:
+                await self._pending
+            except OSError:
+                pass
+        await asyncio.to_thread(self._fp.close)
+        await asyncio.to_thread(_unlink, [self.upload.path])
+
+
+async def _chunks(request):
+    if request.body:  # 非流式路由：请求体已读入内存
+        yield request.body
+        return
+    async for chunk in request.stream:
+        yield chunk
+
+
+async def receive_form(request, directory: str, *,
+                       max_body: int | None = None,
+                       max_file: int = 1 << 30,
+                       max_fields_size: int = 1 << 20,
+                       max_parts: int = 256,
+                       hash_name: str | None = None,
+                       buffer_size: int = 1 << 20) -> Form:
+    """读取 ``multipart/form-data`` 或 ``application/x-www-form-urlencoded`` 请求体
+
+    文件写入 ``directory``，其余字段放入内存，总大小不超过 ``max_fields_size``。
+    ``max_body`` 为整个请求体的上限，默认沿用 ``REQUEST_MAX_SIZE``；
+    ``hash_name`` 为 :mod:`hashlib` 中的算法名，为 None 时不计算摘要。
+    """
+    if max_body is not None and request.stream is not None:
+        # 流式路由的请求体大小由 Sanic 在读取时检查（包括 chunked 编码）
+        request.stream.request_max_size = max_body
+    content_type, options = parse_content_header(request.headers.get("content-type", ""))
+    form = Form()
+    if content_type == "application/x-www-form-urlencoded":
+        body = bytearray()
+        async for chunk in _chunks(request):
+            body += chunk
+            if len(body) > max_fields_size:
+                raise PayloadTooLarge("Form fields exceed the size limit")
+        for name, value in parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True):
+            form.fields.setdefault(name, []).append(value)
+        return form
+    boundary = options.get("boundary")
+    if content_type != "multipart/form-data" or not boundary:
+        raise BadRequest("Expected multipart/form-data or application/x-www-form-urlencoded")
+
+    parser = MultipartParser(boundary.encode("latin-1"))
+    sink: _Sink | None = None
+    value: bytearray | None = None  # 当前普通字段的内容
+    name = ""
+    fields_size = parts = 0
+    made_directory = False
+    try:
+        async for chunk in _chunks(request):
+            for event, data in parser.feed(chunk):
+                if event == "data":
+                    if sink is not None:
+                        sink.upload.size += len(data)
+                        if sink.upload.size > max_file:
+                            raise PayloadTooLarge(
+                                f"File {sink.upload.filename!r} exceeds the size limit")
+                        await sink.write(data)
+                    else:
+                        fields_size += len(data)
+                        if fields_size > max_fields_size:
+                            raise PayloadTooLarge("Form fields exceed the size limit")
+                        value += data
+                elif event == "headers":
+                    parts += 1
+                    if parts > max_parts:
+                        raise PayloadTooLarge("Too many form parts")
+                    disposition, params = parse_content_header(
+                        data.get("content-disposition", ""))
+                    name = params.get("name")
+                    if disposition != "form-data" or name is None:
+                        raise BadRequest("Invalid Content-Disposition in multipart part")
+                    filename = params.get("filename")
+                    if filename is None:
+                        value = bytearray()
+                        continue
+                    if not made_directory:
+                        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+                        made_directory = True
+                    upload = Upload(name=name, filename=filename,
+                                    content_type=data.get("content-type",
+                                                          "application/octet-stream"),
+                                    path="")
+                    sink = _Sink(upload, hash_name, buffer_size)
+                    await sink.open(directory)
+                else:  # end
+                    if sink is not None:
+                        await sink.close()
+                        form.files.setdefault(name, []).append(sink.upload)
+                        sink = None
+                    else:
+                        form.fields.setdefault(name, []).append(value.decode("utf-8", "replace"))
+                        value = None
+        if not parser.finished:
+            raise BadRequest("Incomplete multipart body")
+    except BaseException:
+        if sink is not None:
+            await asyncio.shield(sink.abort())
+        await asyncio.shield(form.remove())
+        raise
+    return form
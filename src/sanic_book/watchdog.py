@@ -0,0 +1,270 @@
+"""事件循环延迟监测与阻塞调用检测
+
+后台任务每隔 ``interval`` 秒 ``sleep`` 一次，实际醒来比预期晚多少即为当前的
+事件循环延迟（loop lag）。延迟持续偏高说明有阻塞调用或负载超出处理能力。
+
+:class:`BlockingDetector` 在独立线程中观察采样任务：事件循环超过 ``threshold``
+秒没有运行时，抓取事件循环线程此刻的调用栈（也就是阻塞它的代码），写一条结构化日志，
+并计入指标，阻塞的热点因此能自动暴露出来。
+
+用法::
+
+    from sanic_book.watchdog import render_watchdog, setup_watchdog
+
+    setup_watchdog(app, threshold=0.1)
+
+    @bp.get("/")
+    async def metrics(request):
+        return text(render_watchdog(request.app), content_type=CONTENT_TYPE)
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+
+from sanic.log import logger
+
+from .serialization import dumps_str
+
+# 共享内存中每个 worker 一行：当前延迟、最大延迟、阻塞次数、阻塞总时长（秒）
+FIELDS = 4
+# 日志中保留的栈帧数（从最内层算起）
+STACK_LIMIT = 30
+
+
+class LagMonitor:
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lag = 0.0  # 最近一次测得的延迟（秒）
+        self.max_lag = 0.0
+        self._slept_at = time.perf_counter()
+        self._task: asyncio.Task | None = None
+
+    async def run(self) -> None:
+        interval = self.interval
+        while True:
+            start = self._slept_at = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(time.perf_counter() - start - interval, 0.0)
+            self.lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def current(self) -> float:
+        """当前延迟；若采样任务本身迟迟没有运行，按已过去的时间估计"""
+        if self._task is None:
+            return self.lag
+        # 阻塞结束后，其他回调可能先于采样任务运行
+        return max(self.lag, time.perf_counter() - self._slept_at - self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(), name="loop-lag")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def lag_monitor(app) -> LagMonitor:
+    """本 worker 共用的 LagMonitor（准入控制与看门狗共用一个采样任务）"""
+    monitor = getattr(app.ctx, "lag_monitor", None)
+    if monitor is None:
+        monitor = app.ctx.lag_monitor = LagMonitor()
+    monitor.start()
+    return monitor
+
+
+def format_stack(frame, limit: int = STACK_LIMIT) -> list[str]:
+    """最内层在后，形如 ``path:line in func``"""
+    return [f"{f.filename}:{f.lineno} in {f.name}"
+            for f in traceback.extract_stack(frame)[-limit:]]
+
+
+class BlockingDetector:
+    """在独立线程中检测事件循环阻塞
+
+    每次阻塞只在超过 ``threshold`` 时抓取一次调用栈，恢复后再记录总时长。
+    纯 Python 的阻塞代码会周期性释放 GIL，检测线程可以及时运行；不释放 GIL 的
+    C 扩展调用要等它返回后才会被发现，此时只能记录时长。
+    """
+
+    def __init__(self, monitor: LagMonitor, threshold: float = 0.1,
+                 check_interval: float | None = None):
+        self.monitor = monitor
+        self.threshold = threshold
+        self.check_interval = check_interval or max(threshold / 4, 0.005)
+        self.blocks = 0
+        self.blocked_seconds = 0.0
+        self.last_stack: list[str] = []
+        self._loop_thread = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """须在事件循环线程中调用"""
+        if self._thread is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        monitor = self.monitor
+        blocked_at = None  # 本次阻塞所对应的采样时刻
+        stalled = 0.0
+        while not self._stop.wait(self.check_interval):
+            if monitor._task is None:  # 采样任务已停止
+                blocked_at = None
+                continue
+            slept_at = monitor._slept_at
+            elapsed = time.perf_counter() - slept_at - monitor.interval
+            if blocked_at is not None and slept_at != blocked_at:
+                self._unblocked(stalled)
+                blocked_at = None
+            if elapsed > self.threshold and blocked_at is None:
+                blocked_at = slept_at
+                self._blocked(elapsed)
+            stalled = elapsed
+
+    def _blocked(self, elapsed: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        self.last_stack = format_stack(frame) if frame is not None else []
+        self.blocks += 1
+        logger.warning("Event loop blocked: %s", dumps_str({
+            "event": "loop_blocked", "pid": os.getpid(),
+            "blocked_ms": round(elapsed * 1e3, 1), "threshold_ms": self.threshold * 1e3,
+            "stack": self.last_stack,
+        }))
+
+    def _unblocked(self, stalled: float) -> None:
+        duration = max(stalled, self.monitor.lag)
+        self.blocked_seconds += duration
+        logger.warning("Event loop unblocked: %s", dumps_str({
+            "event": "loop_unblocked", "pid": os.getpid(),
+            "blocked_ms": round(duration * 1e3, 1),
+            "where": self.last_stack[-1] if self.last_stack else None,
+        }))
+
+
+class Watchdog:
+    """一个 worker 的看门狗，挂在 ``app.ctx.watchdog``
+
+    ``shared`` 为所有 worker 共享的 RawArray，形状为 [worker][FIELDS]，
+    每个 worker 只写自己的一行。
+    """
+
+    def __init__(self, monitor: LagMonitor, detector: BlockingDetector,
+                 shared, workers, lock):
+        self.monitor = monitor
+        self.detector = detector
+        self.shared = shared
+        self.workers = workers
+        self.lock = lock
+        with lock:
+            try:
+                self.worker = workers[:].index(0)
+            except ValueError:
+                raise RuntimeError(f"At most {len(workers)} workers are supported") from None
+            workers[self.worker] = os.getpid()
+
+    @staticmethod
+    def allocate(max_workers: int) -> dict:
+        """在主进程中分配共享内存，返回值保存到 ``app.shared_ctx``"""
+        return {"watchdog_data": multiprocessing.RawArray("d", max_workers * FIELDS),
+                "watchdog_workers": multiprocessing.RawArray("i", max_workers),
+                "watchdog_lock": multiprocessing.Lock()}
+
+    def flush(self) -> None:
+        start = self.worker * FIELDS
+        self.shared[start:start + FIELDS] = [
+            self.monitor.lag, self.monitor.max_lag,
+            float(self.detector.blocks), self.detector.blocked_seconds,
+        ]
+
+    def release(self) -> None:
+        self.flush()
+        with self.lock:
+            self.workers[self.worker] = 0
+
+    def snapshot(self) -> dict[int, list[float]]:
+        """pid -> [lag, max_lag, blocks, blocked_seconds]"""
+        self.flush()
+        return {pid: list(self.shared[i * FIELDS:(i + 1) * FIELDS])
+                for i, pid in enumerate(self.workers[:]) if pid}
+
+
+def setup_watchdog(app, threshold: float = 0.1, interval: float = 0.05,
+                   max_workers: int = 32, flush_interval: float = 1.0) -> None:
+    """``threshold`` 为判定阻塞的秒数，``interval`` 为延迟采样间隔"""
+
+    @app.main_process_start
+    async def watchdog_allocate(app):
+        for key, value in Watchdog.allocate(max_workers).items():
+            setattr(app.shared_ctx, key, value)
+
+    @app.before_server_start
+    async def watchdog_attach(app):
+        if getattr(app.ctx, "lag_monitor", None) is None:
+            app.ctx.lag_monitor = LagMonitor(interval)
+        monitor = lag_monitor(app)
+        detector = BlockingDetector(monitor, threshold)
+        detector.start()
+        shared = vars(app.shared_ctx)
+        if "watchdog_data" not in shared:
+            # 单进程模式不执行 main_process_start
+            shared = Watchdog.allocate(1)
+        app.ctx.watchdog = Watchdog(monitor, detector, shared["watchdog_data"],
+                                    shared["watchdog_workers"], shared["watchdog_lock"])
+
+    @app.after_server_start
+    async def watchdog_start_flush(app):
+        async def flush():
+            while True:
+                await asyncio.sleep(flush_interval)
+                app.ctx.watchdog.flush()
+
+        app.add_task(flush(), name="watchdog-flush")
+
+    @app.after_server_stop
+    async def watchdog_detach(app):
+        watchdog: Watchdog = app.ctx.watchdog
+        watchdog.detector.stop()
+        watchdog.release()
+        await watchdog.monitor.stop()
+
+
+def render_watchdog(app) -> str:
+    """Prometheus 文本格式，每个 worker 一组序列"""
+    watchdog: Watchdog | None = getattr(app.ctx, "watchdog", None)
+    if watchdog is None:
+        return ""
+    series = (
+        ("sanic_loop_lag_seconds", "gauge", "Most recent event loop lag."),
+        ("sanic_loop_lag_max_seconds", "gauge", "Largest event loop lag since start."),
+        ("sanic_loop_blocked_total", "counter", "Times the event loop was blocked past the threshold."),
+        ("sanic_loop_blocked_seconds_total", "counter", "Time the event loop spent blocked."),
+    )
+    snapshot = watchdog.snapshot()
+    lines = []
+    for index, (name, kind, help_text) in enumerate(series):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for pid, row in sorted(snapshot.items()):
+            lines.append(f'{name}{{pid="{pid}"}} {row[index]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+# sanic_book 以及 Strawberry 示例中的 api 包
+sys.path[:0] = [str(ROOT / "src"), str(ROOT / "doc/integrations/GraphQL/Strawberry/tests")]
+# 示例应用的 login、utils；放在最后，避免 app/api 遮住 Strawberry 示例的 api
+sys.path.append(str(ROOT / "app"))
+# 示例 schema 在导入时创建存储，测试中只用内存
+os.environ.setdefault("GROUP_STORE", "memory://")
+os.environ.setdefault("GROUP_STORE_CACHE", "0")
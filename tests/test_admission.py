@@ -0,0 +1,21 @@
+import pytest
+
+from sanic_book.admission import SharedTokenBucket
+
+
+def test_bucket_without_shared_tables():
+    # 单进程模式下 shared_ctx 中没有预先分配的表
+    bucket = SharedTokenBucket({}, "ip", rate=1.0, burst=2, slots=16)
+    assert bucket.acquire("a", now=100.0) == 0
+    assert bucket.acquire("a", now=100.0) == 0
+    assert bucket.acquire("a", now=100.0) == pytest.approx(1.0)
+    assert bucket.acquire("b", now=100.0) == 0
+    assert bucket.acquire("a", now=101.0) == 0
+
+
+def test_bucket_shares_allocated_tables():
+    shared = SharedTokenBucket.allocate("login", 16)
+    first = SharedTokenBucket(shared, "login", rate=1.0, burst=1)
+    second = SharedTokenBucket(shared, "login", rate=1.0, burst=1)
+    assert first.acquire("a", now=5.0) == 0
+    assert second.acquire("a", now=5.0) > 0
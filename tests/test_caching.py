@@ -0,0 +1,73 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sanic.exceptions import BadRequest
+
+from api.caching import PersistedQueries, result_cache
+from api.schema import make_group_loader, schema
+from api.snowflake import Snowflake
+from api.storage import MemoryGroupStore
+
+GROUPS = "{ groups { group_id } }"
+ADD = 'mutation { add_group(group_id: "%d", name: "%s", number: "%s") { group_id } }'
+
+
+class CountingStore(MemoryGroupStore):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def keys(self):
+        self.reads += 1
+        return await super().keys()
+
+
+def execute(store, query):
+    context = {"request": None, "device_loader": make_group_loader(store), "store": store,
+               "snowflake": Snowflake(), "broker": None}
+    return asyncio.run(schema.execute(query, context_value=context))
+
+
+def test_repeated_query_is_cached_and_mutation_clears_it():
+    result_cache.clear()
+    store = CountingStore()
+    assert execute(store, GROUPS).data == {"groups": []}
+    assert execute(store, GROUPS).data == {"groups": []}
+    assert store.reads == 1
+
+    result = execute(store, ADD % (277218759112916993, uuid.uuid4(), uuid.uuid4()))
+    assert result.errors is None
+    assert execute(store, GROUPS).data == {"groups": [{"group_id": "277218759112916993"}]}
+    assert store.reads == 2
+
+
+def apq_request(data):
+    return SimpleNamespace(json=data, body=json.dumps(data).encode(), parsed_json=data)
+
+
+def test_persisted_query_roundtrip():
+    queries = PersistedQueries()
+    sha256 = queries.hash(GROUPS)
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": sha256}}
+
+    error = queries.apply(apq_request({"extensions": extensions}))
+    assert error["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+    assert queries.apply(apq_request({"query": GROUPS, "extensions": extensions})) is None
+    request = apq_request({"extensions": extensions})
+    assert queries.apply(request) is None
+    assert request.parsed_json["query"] == GROUPS
+
+
+@pytest.mark.parametrize("data", [
+    {"extensions": {"persistedQuery": True}},
+    {"extensions": {"persistedQuery": {"sha256Hash": 1}}},
+    {"extensions": []},
+    {"query": "{ other }", "extensions": {"persistedQuery": {"sha256Hash": "0" * 64}}},
+])
+def test_malformed_persisted_query(data):
+    with pytest.raises(BadRequest):
+        PersistedQueries().apply(apq_request(data))
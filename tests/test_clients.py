@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from sanic_book.clients import COALESCED, FAILURES, REQUESTS, RETRIES, FIELDS, Upstream
+
+
+class Handler(BaseHTTPRequestHandler):
+    """``/slow`` 等待 0.2 秒，``/status/<code>`` 返回该状态码；记录请求数与最大并发数"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[(self.command, self.path, self.headers.get("x-api-key"))] += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.2)
+            status = int(self.path[8:]) if self.path.startswith("/status/") else 200
+            body = self.headers.get("x-api-key", "").encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def upstream(server):
+    server.hits = Counter()
+    server.active = server.peak = 0
+
+    def make(**options):
+        options.setdefault("backoff", 0.0)
+        return Upstream("test", f"http://127.0.0.1:{server.server_port}", **options)
+
+    return make
+
+
+def test_identical_gets_coalesced(server, upstream):
+    async def main():
+        client = upstream()
+        try:
+            responses = await asyncio.gather(*(client.get("/slow") for _ in range(5)))
+        finally:
+            await client.aclose()
+        return responses, client._stats
+
+    responses, stats = asyncio.run(main())
+    assert all(response.status_code == 200 for response in responses)
+    assert server.hits == {("GET", "/slow", None): 1}
+    assert stats[REQUESTS] == 1 and stats[COALESCED] == 4
+
+
+def test_coalescing_keyed_on_all_headers(server, upstream):
+    async def main():
+        client = upstream()
+        try:
+            return await asyncio.gather(client.get("/slow", headers={"X-Api-Key": "a"}),
+                                        client.get("/slow", headers={"X-Api-Key": "b"}),
+                                        client.get("/slow", params={"q": 1}))
+        finally:
+            await client.aclose()
+
+    a, b, _ = asyncio.run(main())
+    assert (a.content, b.content) == (b"a", b"b")
+    assert sum(server.hits.values()) == 3
+
+
+def test_coalescing_disabled(server, upstream):
+    async def main():
+        client = upstream(coalesce=False)
+        try:
+            await asyncio.gather(*(client.get("/slow") for _ in range(3)))
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert server.hits == {("GET", "/slow", None): 3}
+
+
+def test_idempotent_requests_retried(server, upstream):
+    async def main():
+        client = upstream(retries=2)
+        try:
+            return (await client.get("/status/503"), await client.post("/status/503"),
+                    await client.get("/status/500"), client._stats)
+        finally:
+            await client.aclose()
+
+    get, post, error, stats = asyncio.run(main())
+    assert get.status_code == post.status_code == 503 and error.status_code == 500
+    assert server.hits == {("GET", "/status/503", None): 3, ("POST", "/status/503", None): 1,
+                           ("GET", "/status/500", None): 1}
+    assert stats[RETRIES] == 2
+
+
+def test_transport_error_retried_only_when_idempotent():
+    async def main():
+        # 没有监听的端口：连接被拒绝
+        client = Upstream("down", "http://127.0.0.1:9", retries=1, backoff=0.0)
+        try:
+            for method in ("GET", "POST"):
+                with pytest.raises(httpx.ConnectError):
+                    await client.request(method, "/")
+        finally:
+            await client.aclose()
+        return client._stats
+
+    stats = asyncio.run(main())
+    assert stats[REQUESTS] == 3 and stats[RETRIES] == 1 and stats[FAILURES] == 2
+
+
+def test_concurrency_bound(server, upstream):
+    async def main():
+        client = upstream(max_concurrency=2, coalesce=False)
+        try:
+            await asyncio.gather(*(client.get(f"/slow/{i}") for i in range(6)))
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert sum(server.hits.values()) == 6
+    assert server.peak == 2
+
+
+def test_queue_timeout(server, upstream):
+    async def main():
+        client = upstream(max_concurrency=1, queue_timeout=0.05, coalesce=False)
+        try:
+            return await asyncio.gather(client.get("/slow/1"), client.get("/slow/2"),
+                                        return_exceptions=True), client._stats
+        finally:
+            await client.aclose()
+
+    (first, second), stats = asyncio.run(main())
+    assert first.status_code == 200
+    assert isinstance(second, httpx.PoolTimeout)
+    assert stats[FAILURES] == 1 and len(stats) == FIELDS
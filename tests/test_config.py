@@ -0,0 +1,53 @@
+import datetime
+import importlib.util
+import os
+
+from conftest import ROOT
+
+# app/ 下也有 api 包，与 Strawberry 示例重名，因此按路径加载
+_spec = importlib.util.spec_from_file_location("book_config", ROOT / "app/utils/config.py")
+config = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(config)
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_snapshot_json_roundtrip(tmp_path):
+    path = tmp_path / "main.toml"
+    write(path, 'secret = "s"\nday = 2024-01-02\n[db]\nurl = "x"\n')
+    snapshot = config.Snapshot.parse([str(path)])
+    loaded = config.Snapshot.loads(snapshot.dumps())
+    assert dict(loaded.values) == {"SECRET": "s", "DAY": datetime.date(2024, 1, 2),
+                                   "DB": {"URL": "x"}}
+    assert loaded.is_current([str(path)])
+
+
+def test_snapshot_not_loaded_as_sanic_config(tmp_path, monkeypatch):
+    monkeypatch.delenv(config.SNAPSHOT_ENV, raising=False)
+    path = tmp_path / "main.toml"
+    write(path, 'secret = "s"\n')
+    cfg = config.TomlConfig(str(path))
+    try:
+        assert not config.SNAPSHOT_ENV.startswith(config.SANIC_PREFIX)
+        assert not any("SNAPSHOT" in key for key in cfg)
+    finally:
+        os.environ.pop(config.SNAPSHOT_ENV, None)
+
+
+def test_apply_snapshot_removes_deleted_keys(tmp_path, monkeypatch):
+    monkeypatch.delenv(config.SNAPSHOT_ENV, raising=False)
+    path = tmp_path / "main.toml"
+    write(path, 'secret = "s"\naccess_log = false\n')
+    cfg = config.TomlConfig(str(path))
+    try:
+        write(path, 'other = 1\n')
+        cfg.apply_snapshot(config.Snapshot.parse([str(path)]))
+        assert "SECRET" not in cfg
+        assert cfg.OTHER == 1
+        assert cfg.ACCESS_LOG is config.DEFAULT_CONFIG["ACCESS_LOG"]
+    finally:
+        os.environ.pop(config.SNAPSHOT_ENV, None)
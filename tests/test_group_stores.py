@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+
+from api.records import GroupTable
+from api.schema import make_group_loader, schema
+from api.storage import CachedGroupStore, MemoryGroupStore, SQLiteGroupStore
+from api.types import Group
+
+IDS = ["277218759112916993", "277218759112916994", "277218759112916995"]
+
+
+def make_group(group_id, **fields):
+    today = datetime.date.today()
+    return Group(group_id=group_id, number=str(uuid.uuid4()), name=str(uuid.uuid4()),
+                 creation_time=today, update_time=today, **fields)
+
+
+STORES = {
+    "memory": MemoryGroupStore,
+    "sqlite": SQLiteGroupStore,
+    "cached": lambda: CachedGroupStore(SQLiteGroupStore()),
+}
+
+
+@pytest.fixture(params=list(STORES))
+def store(request):
+    store = STORES[request.param]()
+    for group_id in reversed(IDS):
+        asyncio.run(store.put(make_group(group_id)))
+    yield store
+    asyncio.run(store.close())
+
+
+def test_get_many_and_page(store):
+    groups = asyncio.run(store.get_many([IDS[1], "1", IDS[0]]))
+    assert [group and group.group_id for group in groups] == [IDS[1], None, IDS[0]]
+    assert asyncio.run(store.page(None, 2)) == IDS[:2]
+    assert asyncio.run(store.page(int(IDS[0]), 10)) == IDS[1:]
+    assert sorted(asyncio.run(store.keys())) == IDS
+
+
+def test_update_and_delete(store):
+    group = asyncio.run(store.update(IDS[0], device_number=7))
+    assert group.device_number == 7
+    assert asyncio.run(store.get(IDS[0])).device_number == 7
+    assert asyncio.run(store.update("1", device_number=7)) is None
+    assert asyncio.run(store.delete(IDS[0]))
+    assert asyncio.run(store.get(IDS[0])) is None
+    assert not asyncio.run(store.delete(IDS[0]))
+
+
+@pytest.mark.parametrize("bad", ["abc", "", "1e3", str(1 << 70)])
+def test_unparsable_ids_are_missing(store, bad):
+    groups = asyncio.run(store.get_many([bad, IDS[2]]))
+    assert groups[0] is None and groups[1].group_id == IDS[2]
+    assert not asyncio.run(store.delete(bad))
+
+
+def test_table_keeps_non_canonical_values():
+    table = GroupTable([make_group("42", description="d"), make_group(IDS[0])])
+    group = make_group("7")
+    group.number = "not-a-uuid"
+    table.put(group)
+    assert table.get("7").number == "not-a-uuid"
+    assert table.get("42").description == "d"
+    assert table.keys() == ["7", "42", IDS[0]]
+    assert "abc" not in table
+
+
+def run_query(store, query):
+    context = {"request": None, "device_loader": make_group_loader(store), "store": store,
+               "snowflake": None, "broker": None}
+    return asyncio.run(schema.execute(query, context_value=context))
+
+
+def test_invalid_id_does_not_fail_the_batch(store):
+    result = run_query(store, '{ a: group(group_id: "abc") { group_id } '
+                              f'b: group(group_id: "{IDS[0]}") {{ group_id }} }}')
+    # group 不可为空，a 的错误会使 data 整体为 null；b 不应出现在错误里
+    assert [(error.path, error.message) for error in result.errors] == [(["a"], "not found")]
+
+
+def test_mutation_rejects_invalid_id(store):
+    result = run_query(store, 'mutation { delete_group(group_id: "abc") }')
+    assert "expected a snowflake ID" in result.errors[0].message
@@ -0,0 +1,33 @@
+from sanic_book.metrics import Metrics, bucket_bounds, bucket_index
+
+
+def make_metrics(max_series=64, max_variants=16):
+    shared = Metrics.allocate(1, max_series)
+    return Metrics(shared["metrics_data"], shared["metrics_names"], shared["metrics_lock"],
+                   0, max_series, max_variants)
+
+
+def test_bucket_bounds_contain_value():
+    for value in (0, 1, 31, 32, 1000, 123456, 10 ** 9):
+        low, high = bucket_bounds(bucket_index(value))
+        assert low <= value < high
+
+
+def test_variants_are_capped_per_route():
+    metrics = make_metrics(max_variants=3)
+    for i in range(10):
+        metrics.record(f"graphql:op{i}", 1_000_000)
+    metrics.record("app.api.info", 1_000_000)
+    snapshot = metrics.snapshot()
+    assert {name for name in snapshot if name.startswith("graphql:")} == {
+        "graphql:op0", "graphql:op1", "graphql:op2", "graphql:other"}
+    assert snapshot["graphql:other"].count == 7
+    assert snapshot["app.api.info"].count == 1
+
+
+def test_full_table_falls_back_to_other():
+    metrics = make_metrics(max_series=3)
+    for name in ("a", "b", "c", "d"):
+        metrics.record(name, 1000)
+    snapshot = metrics.snapshot()
+    assert snapshot["other"].count == 2
@@ -0,0 +1,179 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+from login import sign_token
+from sanic_book import offload as offload_module
+from sanic_book.offload import (COMPLETED, FAILED, ROW, SUBMITTED, Pool, ProcessPool,
+                                ThreadPool, offload, render_offload, run, serve_pool)
+from utils.render import build_page
+
+TEMPLATE = "<main>$article</main><aside>$aside</aside>"
+
+
+@offload("cpu")
+def current_thread() -> str:
+    return threading.current_thread().name
+
+
+@offload("cpu")
+def fail(message: str):
+    raise ValueError(message)
+
+
+@offload("cpu")
+def unpicklable():
+    return lambda: None
+
+
+def test_fallback_runs_in_thread(monkeypatch):
+    monkeypatch.setattr(offload_module, "_pools", {})
+
+    async def main():
+        token = await sign_token({"sub": "a"}, "secret")
+        assert jwt.decode(token, "secret", algorithms=["HS256"]) == {"sub": "a"}
+        body, rep = await build_page(TEMPLATE, "A", "B", 1.0)
+        assert body == "<main>A</main><aside>B</aside>"
+        assert rep.variants[None] == body.encode()
+        assert await current_thread() != threading.current_thread().name
+        assert await run("missing", len, "abc") == 3
+        with pytest.raises(ValueError, match="boom"):
+            await fail("boom")
+
+    asyncio.run(main())
+
+
+def test_thread_pool(monkeypatch):
+    shared = [0.0] * ROW
+
+    async def main():
+        pool = ThreadPool("cpu", 2, shared, 0)
+        pool.start()
+        monkeypatch.setitem(offload_module._pools, "cpu", pool)
+        try:
+            assert (await current_thread()).startswith("offload-cpu")
+            with pytest.raises(ValueError):
+                await fail("boom")
+        finally:
+            pool.stop()
+
+    asyncio.run(main())
+    assert shared[SUBMITTED] == 2 and shared[COMPLETED] == 1 and shared[FAILED] == 1
+
+
+@pytest.fixture
+def process_pool(monkeypatch):
+    """与 Worker Manager 相同，用 spawn 启动 serve_pool，所有调用都经过序列化"""
+    context = multiprocessing.get_context("spawn")
+    tasks = context.Queue()
+    results = (context.Queue(),)
+    process = context.Process(target=serve_pool, args=(tasks, results), daemon=True)
+    process.start()
+    shared = [0.0] * ROW
+    pool = ProcessPool("cpu", 1, shared, 0, tasks, results[0], 0)
+    monkeypatch.setitem(offload_module._pools, "cpu", pool)
+    yield pool
+    tasks.put(None)
+    process.join(timeout=10)
+    assert process.exitcode == 0
+
+
+def test_process_pool_roundtrip(process_pool):
+    async def main():
+        process_pool.start()
+        try:
+            token = await sign_token({"sub": "a"}, "secret")
+            body, rep = await build_page(TEMPLATE, "A", "B", 1.0)
+            threads = await asyncio.gather(*(current_thread() for _ in range(4)))
+        finally:
+            process_pool.stop()
+        return token, body, rep, threads
+
+    token, body, rep, threads = asyncio.run(main())
+    assert jwt.decode(token, "secret", algorithms=["HS256"]) == {"sub": "a"}
+    assert body == "<main>A</main><aside>B</aside>"
+    assert rep.etag.startswith('"') and rep.last_modified == 1.0
+    assert threads == ["MainThread"] * 4
+    shared = process_pool.shared
+    assert shared[SUBMITTED] == shared[COMPLETED] == 6
+
+
+def test_process_pool_errors(process_pool):
+    async def main():
+        process_pool.start()
+        try:
+            with pytest.raises(ValueError, match="boom"):
+                await fail("boom")
+            # 返回值无法序列化时以 RuntimeError 返回，执行进程继续工作
+            with pytest.raises(RuntimeError):
+                await unpicklable()
+            return await sign_token({}, "secret")
+        finally:
+            process_pool.stop()
+
+    assert asyncio.run(main())
+    assert process_pool.shared[FAILED] == 2
+
+
+def test_pool_is_abstract():
+    with pytest.raises(TypeError):
+        Pool("cpu", 1, [0.0] * ROW, 0)
+
+
+def test_replies_for_previous_worker_ignored(monkeypatch):
+    """重启的 worker 复用槽位时，结果队列里可能还有旧进程的结果与停止标记"""
+    tasks, results = queue.Queue(), queue.Queue()
+    pool = ProcessPool("cpu", 1, [0.0] * ROW, 0, tasks, results, 0)
+    monkeypatch.setitem(offload_module._pools, "cpu", pool)
+
+    async def main():
+        pool.start()
+        try:
+            call = asyncio.ensure_future(current_thread())
+            await asyncio.sleep(0)
+            _, task_id, *_ = tasks.get_nowait()
+            results.put(((os.getpid() + 1, task_id[1]), True, 0.0, pickle.dumps("stale")))
+            results.put(None)
+            results.put((task_id, True, 0.0, pickle.dumps("ok")))
+            return await call
+        finally:
+            pool.stop()
+
+    assert asyncio.run(main()) == "ok"
+
+
+def test_process_pool_timeout(monkeypatch):
+    # 没有执行进程取任务，相当于执行进程在任务中途退出
+    pool = ProcessPool("cpu", 1, [0.0] * ROW, 0, queue.Queue(), queue.Queue(), 0, timeout=0.05)
+    monkeypatch.setitem(offload_module._pools, "cpu", pool)
+
+    async def main():
+        pool.start()
+        try:
+            with pytest.raises(TimeoutError):
+                await current_thread()
+        finally:
+            pool.stop()
+
+    asyncio.run(main())
+    assert pool.shared[FAILED] == 1 and not pool._futures
+
+
+def test_render_offload_inflight_gauge():
+    shared = [0.0] * ROW
+    shared[SUBMITTED], shared[COMPLETED], shared[FAILED] = 5, 2, 1
+    pool = ThreadPool("cpu", 2, shared, 0)
+    app = SimpleNamespace(ctx=SimpleNamespace(offload={"cpu": pool}),
+                          shared_ctx=SimpleNamespace(offload_data=shared, offload_workers=[1]))
+    text = render_offload(app)
+    assert "# TYPE sanic_offload_tasks_inflight gauge" in text
+    assert 'sanic_offload_tasks_inflight{pool="cpu"} 2' in text
+    assert 'sanic_offload_tasks_total{pool="cpu",outcome="completed"} 2' in text
+    assert 'outcome="inflight"' not in text
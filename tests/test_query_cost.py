@@ -0,0 +1,71 @@
+import pytest
+from graphql import build_schema, parse
+
+from sanic_book.graphql import query_cost
+
+SCHEMA = build_schema("""
+    type Query {
+        group(id: ID!): Group
+        groups(limit: Int): [Group!]!
+        page(first: Int = 10): Connection!
+        search: [Result!]!
+    }
+    type Group { id: ID! name: String! devices: [Device!]! }
+    type Device { id: ID! }
+    type Connection { edges: [Edge!]! total: Int! }
+    type Edge { node: Group! }
+    union Result = Group | Device
+""")
+
+
+def cost(query, variables=None, **options):
+    return query_cost(SCHEMA, parse(query), variables=variables, **options)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("{ group(id: 1) { id name } }", 1 + 2),
+    # 叶子字段按元素个数计
+    ("{ groups(limit: 5) { id } }", 1 + 5 * 1),
+    # 未给出参数时用 default_list_size
+    ("{ groups { id } }", 1 + 100 * 1),
+    ("{ groups(limit: 2) { devices { id } } }", 1 + 2 * (1 + 100 * 1)),
+    # 连接对象的分页参数作用于 edges，未给出时用参数默认值
+    ("{ page(first: 3) { total edges { node { id } } } }", 1 + (1 + 1 + 3 * (1 + 1))),
+    ("{ page { edges { node { id } } } }", 1 + (1 + 10 * (1 + 1))),
+    ("{ search { ... on Group { id } ... on Device { id } } }", 1 + 100 * 2),
+    ("{ group(id: 1) { ...F } } fragment F on Group { id name }", 1 + 2),
+    ("{ __typename group(id: 1) { __typename id } }", 1 + 1),
+])
+def test_query_cost(query, expected):
+    assert cost(query) == expected
+
+
+def test_query_cost_variables():
+    query = "query Q($n: Int) { groups(limit: $n) { id } }"
+    assert cost(query, {"n": 7}) == 1 + 7
+    assert cost(query, {"n": "7"}) == 1 + 100
+
+
+def test_query_cost_options():
+    query = "{ groups { id devices { id } } }"
+    assert cost(query, list_sizes={"Query.groups": 2, "Group.devices": 3},
+                field_costs={"Query.groups": 10}) == 10 + 2 * (1 + 1 + 3)
+    assert cost(query, default_list_size=1) == 1 + 1 + 1 + 1
+
+
+def test_query_cost_operation_name():
+    document = parse("query A { group(id: 1) { id } } query B { groups(limit: 4) { id } }")
+    assert query_cost(SCHEMA, document, "B") == 1 + 4
+    assert query_cost(SCHEMA, document) == 0
+    assert query_cost(SCHEMA, document, "C") == 0
+
+
+@pytest.mark.parametrize("query, variables", [
+    ("{ big: groups(limit: 1000) { id } a: groups(limit: -1000) { id } }", None),
+    ("query Q($n: Int) { big: groups(limit: 1000) { id } a: groups(limit: $n) { id } }",
+     {"n": -1000}),
+    ("{ big: groups(limit: 1000) { id } a: page(first: -1000) { edges { node { id } } } }", None),
+])
+def test_negative_sizes_cannot_offset_cost(query, variables):
+    # 负数参数按 0 计：别名字段只计自身，不能抵消 big 的成本
+    assert cost(query, variables) >= cost("{ groups(limit: 1000) { id } }") + 1
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from sanic.compat import Header
+from sanic.response import HTTPResponse, empty
+
+from sanic_book.cache import Entry, LocalCache, ResponseCache, SharedCache
+
+
+def make_request(**headers):
+    return SimpleNamespace(headers=Header(headers), path="/", query_args=[])
+
+
+def test_not_modified_drops_content_encoding():
+    entry = Entry(200, (("ETag", '"v1"'), ("Content-Encoding", "br")), "text/plain",
+                  b"body", time.monotonic(), 60, 0)
+    response = entry.response(make_request(**{"If-None-Match": '"v1"'}), "HIT")
+    assert response.status == 304
+    assert "content-encoding" not in response.headers
+    assert entry.response(make_request(), "HIT").headers["content-encoding"] == "br"
+
+
+def test_stale_entry_revalidates_without_conditional_headers():
+    version = 0
+
+    async def main():
+        nonlocal version
+        cache = ResponseCache(LocalCache())
+
+        def handler_for(request):
+            async def handler():
+                etag = f'"v{version}"'
+                if request.headers.get("if-none-match") == etag:
+                    return empty(status=304, headers={"ETag": etag})
+                return HTTPResponse(f"v{version}", headers={"ETag": etag})
+            return handler
+
+        request = make_request()
+        await cache.serve(request, "k", handler_for(request), ttl=0.01, stale=60)
+        await asyncio.sleep(0.02)
+        # 客户端已经持有新版本的 ETag：处理函数会对它返回 304，后台刷新仍应拿到完整内容
+        version = 1
+        request = make_request(**{"If-None-Match": '"v1"'})
+        response = await cache.serve(request, "k", handler_for(request), ttl=0.01, stale=60)
+        assert response.headers["x-cache"] == "STALE"
+        await asyncio.gather(*cache._tasks)
+        return cache.local.get("k")
+
+    assert asyncio.run(main()).body == b"v1"
+
+
+def make_handler(calls, body=b"v"):
+    async def handler():
+        calls.append(body)
+        await asyncio.sleep(0.01)
+        return HTTPResponse(body)
+    return handler
+
+
+def test_stale_local_entry_prefers_newer_shared_entry():
+    async def main():
+        shared = SharedCache(SharedCache.allocate("test", 16, 4096), "test")
+        a = ResponseCache(LocalCache(), shared)
+        b = ResponseCache(LocalCache(), shared)
+        calls = []
+        await a.serve(make_request(), "k", make_handler(calls, b"v0"), ttl=0.05, stale=60)
+        response = await b.serve(make_request(), "k", make_handler(calls, b"x"), ttl=0.05, stale=60)
+        assert (response.body, response.headers["x-cache"]) == (b"v0", "HIT")
+        await asyncio.sleep(0.06)
+        # a 在后台刷新并写入共享层，b 的本地条目仍是旧的
+        response = await a.serve(make_request(), "k", make_handler(calls, b"v1"), ttl=0.05, stale=60)
+        assert response.headers["x-cache"] == "STALE"
+        await asyncio.gather(*a._tasks)
+        response = await b.serve(make_request(), "k", make_handler(calls, b"x"), ttl=0.05, stale=60)
+        assert (response.body, response.headers["x-cache"]) == (b"v1", "HIT")
+        assert not b._tasks
+        return calls
+
+    assert asyncio.run(main()) == [b"v0", b"v1"]
+
+
+def test_single_flight():
+    async def main():
+        cache = ResponseCache(LocalCache())
+        calls = []
+        responses = await asyncio.gather(*(cache.serve(make_request(), "k", make_handler(calls),
+                                                       ttl=0.05, stale=60) for _ in range(5)))
+        assert [r.headers["x-cache"] for r in responses].count("MISS") == 1
+        await asyncio.sleep(0.06)
+        # 过期后并发请求都拿到旧响应，只有一次后台刷新
+        responses = await asyncio.gather(*(cache.serve(make_request(), "k", make_handler(calls),
+                                                       ttl=0.05, stale=60) for _ in range(5)))
+        assert {r.headers["x-cache"] for r in responses} == {"STALE"}
+        await asyncio.gather(*cache._tasks)
+        return calls, cache
+
+    calls, cache = asyncio.run(main())
+    assert len(calls) == 2
+    assert (cache.misses, cache.hits, cache.stale_hits) == (1, 4, 5)
+
+
+def test_local_cache_evicts_by_bytes():
+    def entry(size):
+        return Entry(200, (), "text/plain", b"x" * size, time.monotonic(), 60, 0)
+
+    cache = LocalCache(max_bytes=1000, max_item=600)
+    for key in "abc":
+        cache.put(key, entry(172))  # 每个条目计 300 字节
+    assert cache.size == 900
+    cache.get("a")  # a 变为最近使用
+    cache.put("d", entry(172))
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.size == 900
+    cache.put("e", entry(1000))  # 超过 max_item，不缓存
+    assert cache.get("e") is None and cache.size == 900
+    cache.put("a", entry(372))  # 替换时先扣除旧条目，再淘汰最久未用的 c
+    assert cache.size == 800 and cache.get("c") is None
+    cache.put("f", entry(172))
+    assert cache.get("d") is None and cache.get("a") is not None
+    assert cache.size == 800
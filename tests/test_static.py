@@ -0,0 +1,50 @@
+import pytest
+
+from utils.conditional import negotiate
+from utils.static import MAX_RANGES, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 100)]),
+    ("bytes=100-", [(100, 1000)]),
+    ("bytes=-100", [(900, 1000)]),
+    ("bytes=-2000", [(0, 1000)]),
+    ("bytes=990-2000", [(990, 1000)]),
+    ("BYTES = 0-0", [(0, 1)]),
+    # 排序并合并重叠、相邻的区间
+    ("bytes=500-599, 0-9, 5-19, 20-29", [(0, 30), (500, 600)]),
+    # 无法满足
+    ("bytes=1000-", []),
+    ("bytes=-0", []),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "items=0-1", "bytes=", "bytes=5", "bytes=a-b", "bytes=9-5", "bytes=0-1,,2-3",
+    "bytes=" + ",".join(f"{i * 10}-{i * 10}" for i in range(MAX_RANGES + 1)),
+])
+def test_parse_range_invalid(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("br, gzip", "br"),
+    ("GZIP;q=0.5, identity", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+    ("gzip;q=x", None),
+    ("deflate", None),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header, {"br": b"", "gzip": b"", None: b""}) == expected
+
+
+def test_negotiate_only_available():
+    assert negotiate("br, gzip", {None: b"", "gzip": b""}) == "gzip"
+    assert negotiate("br", {None: b""}) is None
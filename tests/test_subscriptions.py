@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from sanic_book.subscriptions import Connection, SubscriptionServer
+
+
+class FakeWebsocket:
+    def __init__(self):
+        self.closed_with = None
+
+    async def close(self, code, reason):
+        self.closed_with = code
+
+
+@pytest.mark.parametrize("payload", [
+    '"x"', "[]", "1", "null", "{}",
+    '{"query":1}',
+    '{"query":"subscription { a }","variables":"x"}',
+    '{"query":"subscription { a }","operationName":{}}',
+])
+def test_invalid_subscribe_closes_4400(payload):
+    async def main():
+        ws = FakeWebsocket()
+        connection = Connection(None, ws, 8)
+        connection.acked = True
+        server = SubscriptionServer(None, None)
+        await server.on_message(connection, f'{{"type":"subscribe","id":"1","payload":{payload}}}')
+        await asyncio.sleep(0)
+        return ws.closed_with, server.channels
+
+    assert asyncio.run(main()) == (4400, {})
+
+
+@pytest.mark.parametrize("raw", ["not json", '"x"', "[]", '{"id":"1"}'])
+def test_invalid_message_closes_4400(raw):
+    async def main():
+        ws = FakeWebsocket()
+        await SubscriptionServer(None, None).on_message(Connection(None, ws, 8), raw)
+        await asyncio.sleep(0)
+        return ws.closed_with
+
+    assert asyncio.run(main()) == 4400
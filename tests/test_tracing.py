@@ -0,0 +1,56 @@
+import json
+import os
+import re
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sanic import Sanic
+from sanic.compat import Header
+
+from sanic_book.tracing import JsonLinesExporter, NanoSecondRequest, OtlpFileExporter, Span, Tracer
+
+APP = Sanic("tracing_test", request_class=NanoSecondRequest)
+
+
+def make_request(ip="203.0.113.5", header=True):
+    return SimpleNamespace(headers={"x-trace": "1"} if header else {}, ip=ip)
+
+
+def test_trace_header_ignored_from_untrusted_clients(tmp_path):
+    tracer = Tracer(0.0, str(tmp_path), JsonLinesExporter())
+    assert not tracer.sampled(make_request())
+
+
+def test_trace_header_honoured_when_trusted(tmp_path):
+    tracer = Tracer(0.0, str(tmp_path), JsonLinesExporter(), trusted_proxies=["10.0.0.1"])
+    assert tracer.sampled(make_request(ip="10.0.0.1"))
+    assert not tracer.sampled(make_request())
+    assert Tracer(0.0, str(tmp_path), JsonLinesExporter(), trust_header=True).sampled(make_request())
+
+
+def test_trace_files_rotate(tmp_path):
+    tracer = Tracer(1.0, str(tmp_path), JsonLinesExporter(), max_bytes=1000, backups=2)
+    for _ in range(50):
+        Span(tracer, "request", "0" * 32, None, {"pad": "x" * 100}).end()
+        tracer._write(tracer.exporter.encode(tracer.take()))
+    names = sorted(os.listdir(tmp_path))
+    base = os.path.basename(tracer.path)
+    assert set(names) <= {base, f"{base}.1", f"{base}.2"}
+    assert all(os.path.getsize(tmp_path / name) < 2000 for name in names)
+
+
+@pytest.mark.parametrize("request_id", ["abc", str(uuid.uuid4()), "-5", "9" * 40, None])
+def test_trace_id_from_any_request_id(tmp_path, request_id):
+    headers = Header({"X-Request-ID": request_id} if request_id else {})
+    request = NanoSecondRequest(b"/", headers, "1.1", "GET", None, APP)
+    tracer = Tracer(1.0, str(tmp_path), JsonLinesExporter())
+    root = tracer.start(request)
+    root.end()
+    assert re.fullmatch("[0-9a-f]{32}", root.trace_id)
+    assert tracer.start(request).trace_id != root.trace_id
+    line = json.loads(tracer.exporter.encode(tracer.take()))
+    # Sanic 把 X-Request-ID 转为 UUID 或 int，转不了时保留字符串
+    assert str(line["attributes"]["request.id"]) == str(request.id)
+    otlp = OtlpFileExporter("test").encode([root])
+    assert json.loads(otlp)["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["traceId"] == root.trace_id
@@ -0,0 +1,58 @@
+import pytest
+from sanic.exceptions import BadRequest
+
+from sanic_book.uploads import MAX_HEADER_SIZE, MultipartParser
+
+BODY = (b"--XyZ\r\n"
+        b'Content-Disposition: form-data; name="title"\r\n\r\n'
+        b"hello\r\n"
+        b"--XyZ\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="a.bin"\r\n'
+        b"Content-Type: application/octet-stream\r\n\r\n"
+        b"\r\n--Xy not a boundary\r\n"
+        b"--XyZ--\r\n"
+        b"epilogue")
+
+
+def collect(chunks):
+    parser = MultipartParser(b"XyZ")
+    parts = []
+    for chunk in chunks:
+        for kind, value in parser.feed(chunk):
+            if kind == "headers":
+                parts.append([value, b""])
+            elif kind == "data":
+                parts[-1][1] += value
+    return parser, parts
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(BODY)])
+def test_multipart_chunked(size):
+    parser, parts = collect(BODY[i:i + size] for i in range(0, len(BODY), size))
+    assert parser.finished
+    assert [(headers["content-disposition"], data) for headers, data in parts] == [
+        ('form-data; name="title"', b"hello"),
+        ('form-data; name="file"; filename="a.bin"', b"\r\n--Xy not a boundary"),
+    ]
+    assert parts[1][0]["content-type"] == "application/octet-stream"
+
+
+def test_multipart_preamble_and_empty_part():
+    parser, parts = collect([b"preamble\r\n--XyZ\r\nA: 1\r\n\r\n\r\n--XyZ--"])
+    assert parser.finished
+    assert parts == [[{"a": "1"}, b""]]
+
+
+def test_multipart_unfinished():
+    parser, parts = collect([BODY[:80]])
+    assert not parser.finished
+
+
+def test_multipart_malformed_headers():
+    with pytest.raises(BadRequest):
+        collect([b"--XyZ\r\nno colon\r\n\r\n"])
+
+
+def test_multipart_headers_too_large():
+    with pytest.raises(BadRequest):
+        collect([b"--XyZ\r\n", b"A: " + b"x" * MAX_HEADER_SIZE])